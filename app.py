@@ -15,6 +15,7 @@ Orquesta la creación y configuración de la aplicación Flask, incorporando:
 """
 
 # 1. Standard Library Imports
+import atexit
 import os
 import logging
 import logging.config
@@ -32,6 +33,22 @@ from werkzeug.middleware.proxy_fix import ProxyFix # Para detectar HTTPS detrás
 from flask_wtf.csrf import CSRFProtect
 
 # 3. Local Application Imports
+from proyect.common.jobs import jobs # Cola de análisis en segundo plano (extensión propia)
+from proyect.common.cache import result_cache # Caché de resultados de análisis (extensión propia)
+from proyect.common.db import db # SQLite: historial de uploads (extensión propia)
+from proyect.common.catalog import analysis_catalog # Catálogo persistente de análisis (extensión propia)
+from proyect.common.admission import admission # Presupuestos de concurrencia de los análisis (extensión propia)
+from proyect.common.rendering import chart_renderer # Renderizado offline de gráficos (extensión propia)
+from proyect.common.tables import table_service # Páginas de tablas de resultados (extensión propia)
+from proyect.common.compression import compression # Compresión gzip/brotli/zstd y GET condicional (extensión propia)
+from proyect.common.assets import asset_pipeline # Recursos estáticos con huella en /assets (extensión propia)
+from proyect.common.metrics import metrics # Métricas Prometheus en /metrics (extensión propia)
+from proyect.common.profiling import profiler # Perfilado opt-in de peticiones (extensión propia)
+from proyect.common.tracing import slow_tracer # Trazas de peticiones lentas por muestreo (extensión propia)
+from proyect.common.memory import memory_watchdog # tracemalloc y reciclado de workers por RSS (extensión propia)
+from proyect.common.logs import async_logging # Logging en cola, JSON y con request ID (extensión propia)
+from proyect.common.charts import plotly_payload # Filtro Jinja: figuras Plotly compactas
+from proyect.common.streaming import stream_flush # Global Jinja: puntos de envío en plantillas en streaming
 try:
     # *** CORREGIDO (R4.1 - C1): Importar TODAS las clases de config usadas ***
     from config import (
@@ -226,13 +243,15 @@ def create_app(config_name_override: Optional[str] = None) -> Flask:
 # ==================================
 # (Sin cambios respecto a la versión anterior, ya era robusta)
 def configure_logging(app: Flask):
-    """Asegura que el logger de Flask tenga handlers configurados post-config."""
+    """Asegura que el logger de Flask tenga handlers configurados post-config y los pasa a una cola."""
     logger = app.logger
     if not logger.handlers:
         logger.warning("El logger de Flask no tenía handlers post-config. Configurando logging básico.")
         _setup_basic_logging(app)
     else:
         logger.debug("El logger de Flask ya tiene handlers.")
+    # Handlers (consola/archivo) en un hilo propio: la E/S de logs no bloquea las peticiones
+    async_logging.init_app(app)
 
 def _setup_basic_logging(app: Flask):
     """Configura un logging básico a consola y opcionalmente a archivo."""
@@ -283,6 +302,36 @@ def initialize_extensions(app: Flask):
     try:
         csrf.init_app(app)
         logger.info(" - CSRFProtect inicializado.")
+        jobs.init_app(app)
+        atexit.register(jobs.shutdown, wait=False)
+        logger.info(" - JobManager (análisis en segundo plano) inicializado.")
+        result_cache.init_app(app)
+        logger.info(" - ResultCache (caché de resultados) inicializada.")
+        db.init_app(app)
+        logger.info(" - Base de datos SQLite (historial) inicializada.")
+        analysis_catalog.init_app(app)
+        logger.info(" - Catálogo de análisis inicializado.")
+        admission.init_app(app)
+        logger.info(" - AdmissionControl (presupuestos de análisis, 429/503 con Retry-After) inicializado.")
+        chart_renderer.init_app(app)
+        atexit.register(chart_renderer.shutdown, wait=False)
+        logger.info(" - ChartRenderer (imágenes e informes PDF) inicializado.")
+        table_service.init_app(app)
+        logger.info(" - TableService (tablas paginadas) inicializado.")
+        asset_pipeline.init_app(app)
+        logger.info(" - AssetPipeline (recursos estáticos con huella) inicializado.")
+        profiler.init_app(app)
+        logger.info(" - RequestProfiler (perfilado bajo demanda) inicializado.")
+        slow_tracer.init_app(app)
+        logger.info(" - SlowRequestTracer (trazas de peticiones lentas) inicializado.")
+        memory_watchdog.init_app(app)
+        logger.info(" - MemoryWatchdog (tracemalloc, límite de RSS por worker) inicializado.")
+        # Antes que Compression: su after_request se ejecuta después y registra el estado final (p.ej. 304)
+        metrics.init_app(app)
+        logger.info(" - Metrics (latencias, peticiones en curso, etapas de análisis) inicializadas.")
+        # Registra su after_request antes que los hooks de SECCIÓN 7: se ejecuta el último y comprime la respuesta final
+        compression.init_app(app)
+        logger.info(" - Compression (gzip/brotli/zstd, 304) inicializada.")
         # Inicializar otras extensiones aquí si es necesario
         logger.info("Inicialización de extensiones completada.")
     except Exception as e:
@@ -313,6 +362,9 @@ def register_blueprints(app: Flask):
         from proyect.maxdiff import bp as maxdiff_bp
         from proyect.comstrat import bp as comstrat_bp
         from proyect.moca import bp as moca_bp
+        from proyect.jobs import bp as jobs_bp
+        from proyect.api import bp as api_bp
+        from proyect.admin import bp as admin_bp
         # from proyect.series import bp as series_bp # Descomentar cuando exista
 
         app.register_blueprint(main_bp)
@@ -323,6 +375,12 @@ def register_blueprints(app: Flask):
         logger.info(f" - Blueprint '{comstrat_bp.name}' registrado en '{comstrat_bp.url_prefix}'")
         app.register_blueprint(moca_bp, url_prefix='/moca')
         logger.info(f" - Blueprint '{moca_bp.name}' registrado en '{moca_bp.url_prefix}'")
+        app.register_blueprint(jobs_bp, url_prefix='/jobs')
+        logger.info(f" - Blueprint '{jobs_bp.name}' registrado en '{jobs_bp.url_prefix}'")
+        app.register_blueprint(api_bp)
+        logger.info(f" - Blueprint '{api_bp.name}' registrado en '{api_bp.url_prefix}'")
+        app.register_blueprint(admin_bp)
+        logger.info(f" - Blueprint '{admin_bp.name}' registrado en '{admin_bp.url_prefix}'")
         # Registrar otros blueprints aquí...
 
         logger.info("Registro de Blueprints finalizado.")
@@ -373,11 +431,14 @@ def register_error_handlers(app: Flask):
         logger.log(log_level,
                    f"Error HTTP {e.code} {e.name} para {request.method} {request.path} [IP: {remote_addr}]: {getattr(e, 'description', 'N/A')}",
                    exc_info=(e.code >= 500))
+        # Conserva Retry-After (429/503 del control de admisión)
+        headers = [(name, value) for name, value in e.get_headers() if name == 'Retry-After']
         if request.accept_mimetypes.accept_json and not request.accept_mimetypes.accept_html:
             response = jsonify(error=e.name, message=getattr(e, 'description', "Error HTTP"), code=e.code)
             response.status_code = e.code
+            response.headers.extend(headers)
             return response
-        return render_template('error.html', error_code=e.code, error_name=e.name.replace("'", ""), error_description=getattr(e, 'description', "Ocurrió un error.")), e.code
+        return render_template('error.html', error_code=e.code, error_name=e.name.replace("'", ""), error_description=getattr(e, 'description', "Ocurrió un error.")), e.code, headers
 
     @app.errorhandler(RequestEntityTooLarge)
     def handle_request_entity_too_large(e: RequestEntityTooLarge):
@@ -426,7 +487,8 @@ def register_request_hooks(app: Flask):
         duration_ms = -1
         if hasattr(g, 'request_start_time') and g.request_start_time:
             duration_ms = (time.monotonic() - g.request_start_time) * 1000
-        logger.info(f"{request.method} {request.path} [{request.remote_addr or 'N/A'}] -> {response.status_code} ({duration_ms:.2f} ms)")
+        logger.info(f"{request.method} {request.path} [{request.remote_addr or 'N/A'}] -> {response.status_code} ({duration_ms:.2f} ms)",
+                    extra={'status': response.status_code, 'duration_ms': round(duration_ms, 2)})
         clear_temporary_session_keys(app)
 
         # --- Cabeceras de Seguridad ---
@@ -441,19 +503,22 @@ def register_request_hooks(app: Flask):
         # Una CSP demasiado restrictiva romperá tu sitio. Una demasiado laxa no protege.
         # Herramientas como https://report-uri.com/home/generate o la consola del navegador ayudan.
         # Este ejemplo permite self, inline styles (riesgoso pero común) y un CDN popular.
+        # Plotly, Bootstrap y fuentes se sirven desde /assets (proyect.common.assets); los orígenes de CDN
+        # solo se permiten mientras se usa el CDN de respaldo (desarrollo sin bundles construidos).
         response.headers['Content-Security-Policy'] = (
             "default-src 'self'; " # Por defecto, solo permite recursos del mismo origen
-            "script-src 'self' https://cdn.jsdelivr.net; " # Permite JS propio y de jsdelivr
-            "style-src 'self' 'unsafe-inline' https://cdn.jsdelivr.net; " # Permite CSS propio, inline (¡cuidado!) y de jsdelivr
-            "img-src 'self' data: https://*; " # Permite imágenes propias, data URIs, y de cualquier HTTPS
-            "font-src 'self' https://*; " # Permite fuentes propias y de cualquier HTTPS
+            f"script-src 'self' {asset_pipeline.external_origins('script')}; " # JS propio (y CDN de respaldo)
+            f"style-src 'self' 'unsafe-inline' {asset_pipeline.external_origins('style')}; " # CSS propio, inline (¡cuidado!) y CDN de respaldo
+            "img-src 'self' data: blob: https://*; " # Imágenes propias, data URIs, blobs (descargas de Plotly) y de cualquier HTTPS
+            f"font-src 'self' data: {asset_pipeline.external_origins('font')}; " # Fuentes propias (y CDN de respaldo)
             "object-src 'none'; " # Deshabilita plugins
             "frame-ancestors 'self'; " # Evita clickjacking
             "form-action 'self'; " # Permite enviar formularios solo a self
             "base-uri 'self';"
             # "report-uri /csp-report-endpoint;" # Opcional: para recibir reportes de violaciones CSP
         )
-        logger.debug(f"Cabecera CSP establecida (¡Revisar y ajustar política!): {response.headers['Content-Security-Policy'][:100]}...")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Cabecera CSP establecida (¡Revisar y ajustar política!): {response.headers['Content-Security-Policy'][:100]}...")
 
 
         # HTTP Strict Transport Security (HSTS)
@@ -479,8 +544,8 @@ def clear_temporary_session_keys(app: Flask):
         current_endpoint = request.endpoint
     except RuntimeError: return
 
-    exempt_bp_prefixes = ('maxdiff.', 'comstrat.', 'moca.', 'series.')
-    always_exempt_eps = {'main.dashboard', 'main.upload', 'main.preview', 'main.export_options', 'static'}
+    exempt_bp_prefixes = ('maxdiff.', 'comstrat.', 'moca.', 'series.', 'jobs.', 'api.', 'admin.')
+    always_exempt_eps = {'main.dashboard', 'main.history', 'main.analyses', 'main.upload', 'main.preview', 'main.export_options', 'static', 'assets', 'metrics'}
     is_exempt = current_endpoint in always_exempt_eps or \
                 any(current_endpoint.startswith(pfx) for pfx in exempt_bp_prefixes)
 
@@ -530,6 +595,10 @@ def register_context_processors(app: Flask):
             safe_url_for=_safe_url_for
         )
 
+    # Figuras Plotly codificadas (typed arrays en base64) para incrustar en las plantillas
+    app.add_template_filter(plotly_payload, 'plotly_payload')
+    app.add_template_global(stream_flush, 'stream_flush')
+
     logger.info("Procesadores de contexto registrados.")
 
 
@@ -10,7 +10,7 @@ Incluye validación temprana para variables críticas en producción.
 import os
 import logging
 from pathlib import Path
-from typing import Set, Optional, List
+from typing import Set, Optional, List, Tuple
 from dotenv import load_dotenv
 
 # Carga temprana de.env para que esté disponible al importar este módulo
@@ -42,6 +42,37 @@ INSTANCE_DIR: Path = BASE_DIR / 'instance'
 # Asegúrate de que la carpeta 'instance' exista si la necesitas para SQLite o uploads
 INSTANCE_DIR.mkdir(exist_ok=True)
 
+# --- Funciones Auxiliares ---
+def _env_int(name: str, default: int, minimum: Optional[int] = None) -> int:
+    """Entero de la variable de entorno `name`; si no es válido avisa y usa `default`, si es menor que `minimum` lo ajusta."""
+    raw = os.environ.get(name)
+    if raw is None or not raw.strip():
+        return default
+    try:
+        value = int(raw)
+    except (ValueError, TypeError):
+        config_logger.warning(f"Valor inválido para {name} ('{raw}') en.env. Usando default {default}.")
+        return default
+    if minimum is not None and value < minimum:
+        config_logger.warning(f"Valor inválido para {name} ('{raw}') en.env: debe ser >= {minimum}. Usando {minimum}.")
+        return minimum
+    return value
+
+def _env_float(name: str, default: float, minimum: Optional[float] = None) -> float:
+    """Como _env_int, para valores decimales."""
+    raw = os.environ.get(name)
+    if raw is None or not raw.strip():
+        return default
+    try:
+        value = float(raw)
+    except (ValueError, TypeError):
+        config_logger.warning(f"Valor inválido para {name} ('{raw}') en.env. Usando default {default:g}.")
+        return default
+    if minimum is not None and value < minimum:
+        config_logger.warning(f"Valor inválido para {name} ('{raw}') en.env: debe ser >= {minimum:g}. Usando {minimum:g}.")
+        return minimum
+    return value
+
 # Excepción Personalizada (Opcional, pero útil para errores específicos de config)
 class ConfigError(ValueError):
     """Excepción para errores críticos de configuración."""
@@ -71,6 +102,8 @@ class Config:
         config_logger.warning(f"Valor inválido para MAX_CONTENT_LENGTH ('{os.environ.get('MAX_CONTENT_LENGTH')}') en.env: {e}. Usando default 16MB.")
         MAX_CONTENT_LENGTH: int = 16 * 1024 * 1024
     ALLOWED_EXTENSIONS: Set[str] = {'xlsx', 'xls', 'csv'}
+    # Historial de uploads y demás tablas propias (proyect.common.db)
+    DATABASE_PATH: str = os.environ.get('DATABASE_PATH', str(INSTANCE_DIR / 'pricing_data.db'))
     # DATABASE_URL: Optional[str] = os.environ.get('DATABASE_URL') or f"sqlite:///{INSTANCE_DIR / 'pricing_data.db'}"
     # SQLALCHEMY_DATABASE_URI: Optional[str] = DATABASE_URL
     # SQLALCHEMY_TRACK_MODIFICATIONS: bool = False
@@ -83,6 +116,76 @@ class Config:
         config_logger.warning(f"Valor inválido para PORT ('{os.environ.get('PORT')}') en.env. Usando default 5000.")
         PORT: int = 5000
     APP_VERSION: str = os.environ.get('APP_VERSION', '0.1.0-dev')
+    # --- Análisis en segundo plano (proyect.common.jobs) ---
+    JOBS_FOLDER: str = os.environ.get('JOBS_FOLDER', str(INSTANCE_DIR / 'jobs'))
+    JOB_MAX_WORKERS: int = _env_int('JOB_MAX_WORKERS', 2, minimum=1)   # Procesos de análisis simultáneos
+    JOB_MAX_PENDING: int = _env_int('JOB_MAX_PENDING', 16, minimum=1)  # Trabajos sin terminar admitidos
+    JOB_START_METHOD: str = os.environ.get('JOB_START_METHOD', 'spawn')
+    JOB_RSS_LIMIT_MB: int = _env_int('JOB_RSS_LIMIT_MB', 0, minimum=0)  # >0: RSS tras un trabajo que hace sustituir el pool
+    JOB_RETENTION: int = _env_int('JOB_RETENTION', 7 * 24 * 3600, minimum=0)  # Segundos que se conservan los trabajos terminados (0: siempre)
+    # Procesos de Shapley (importancia derivada) dentro de cada trabajo: por defecto, CPUs repartidas entre los JOB_MAX_WORKERS
+    SHAPLEY_MAX_WORKERS: int = _env_int('SHAPLEY_MAX_WORKERS', max(1, (os.cpu_count() or 1) // JOB_MAX_WORKERS), minimum=1)
+    # --- Control de admisión de análisis (proyect.common.admission) ---
+    ADMISSION_ENABLED: bool = os.environ.get('ADMISSION_ENABLED', 'True').lower() in ('true', '1', 't')
+    ADMISSION_BUDGETS: str = os.environ.get('ADMISSION_BUDGETS', '')                # Por tipo: "maxdiff=4,comstrat=4,moca=2"
+    ADMISSION_DEFAULT_BUDGET: int = _env_int('ADMISSION_DEFAULT_BUDGET', 4, minimum=1)  # Unidades de peso simultáneas
+    ADMISSION_WEIGHT_UNIT_MB: int = _env_int('ADMISSION_WEIGHT_UNIT_MB', 10, minimum=1)  # Peso = 1 + MB de entrada / unidad
+    ADMISSION_MAX_WAITING: int = _env_int('ADMISSION_MAX_WAITING', 4, minimum=0)  # Más en espera: 429 inmediato
+    ADMISSION_WAIT_TIMEOUT: float = _env_float('ADMISSION_WAIT_TIMEOUT', 5.0, minimum=0)  # Segundos de espera antes del 503
+    ADMISSION_RETRY_AFTER: int = _env_int('ADMISSION_RETRY_AFTER', 30, minimum=0)  # Cabecera Retry-After (segundos)
+    ADMISSION_LEASE_TTL: int = _env_int('ADMISSION_LEASE_TTL', 3600, minimum=1)   # Concesiones más antiguas: perdidas
+    # --- Catálogo de análisis: artefactos de cada ejecución (proyect.common.catalog) ---
+    ARTIFACTS_FOLDER: str = os.environ.get('ARTIFACTS_FOLDER', str(INSTANCE_DIR / 'artifacts'))
+    ARTIFACTS_MAX_BYTES: int = _env_int('ARTIFACTS_MAX_BYTES', 2 * 1024 * 1024 * 1024, minimum=0)  # Tope total (0: sin límite)
+    ARTIFACTS_RETENTION: int = _env_int('ARTIFACTS_RETENTION', 90 * 24 * 3600, minimum=0)  # Segundos conservados (0: siempre)
+    # --- Caché de resultados (proyect.common.cache) ---
+    RESULT_CACHE_FOLDER: str = os.environ.get('RESULT_CACHE_FOLDER', str(INSTANCE_DIR / 'result_cache'))
+    RESULT_CACHE_MEMORY_ITEMS: int = _env_int('RESULT_CACHE_MEMORY_ITEMS', 32, minimum=0)       # Entradas en memoria por proceso
+    RESULT_CACHE_MAX_BYTES: int = _env_int('RESULT_CACHE_MAX_BYTES', 512 * 1024 * 1024, minimum=0)  # Tope del nivel de disco
+    # --- Renderizado offline de gráficos e informes PDF (proyect.common.rendering) ---
+    REPORT_RENDER_FOLDER: str = os.environ.get('REPORT_RENDER_FOLDER', str(INSTANCE_DIR / 'render_cache'))
+    REPORT_RENDER_WORKERS: int = _env_int('REPORT_RENDER_WORKERS', 2, minimum=1)  # Procesos kaleido de larga vida
+    REPORT_RENDER_TIMEOUT: int = _env_int('REPORT_RENDER_TIMEOUT', 120, minimum=1)  # Segundos por lote
+    REPORT_RENDER_CACHE_MAX_BYTES: int = _env_int('REPORT_RENDER_CACHE_MAX_BYTES', 256 * 1024 * 1024, minimum=0)
+    # --- Páginas HTML en streaming (proyect.common.streaming) ---
+    STREAM_TEMPLATES: bool = os.environ.get('STREAM_TEMPLATES', 'True').lower() in ('true', '1', 't')
+    STREAM_BUFFER_BYTES: int = _env_int('STREAM_BUFFER_BYTES', 16 * 1024, minimum=0)  # Bloque mínimo enviado entre puntos de envío
+    # --- Recursos estáticos con huella (proyect.common.assets) ---
+    ASSETS_FOLDER: Optional[str] = os.environ.get('ASSETS_FOLDER') or None  # Por defecto <app>/static/dist
+    ASSETS_CDN_FALLBACK: bool = os.environ.get('ASSETS_CDN_FALLBACK', 'False').lower() in ('true', '1', 't')  # CDN si no hay bundles
+    # --- Compresión de respuestas (proyect.common.compression) ---
+    COMPRESS_ENABLED: bool = os.environ.get('COMPRESS_ENABLED', 'True').lower() in ('true', '1', 't')
+    COMPRESS_MIN_BYTES: int = _env_int('COMPRESS_MIN_BYTES', 1024, minimum=0)  # Respuestas menores se envían sin comprimir
+    COMPRESS_ALGORITHMS: str = os.environ.get('COMPRESS_ALGORITHMS', 'br,zstd,gzip')  # Orden de preferencia; br/zstd si están instalados
+    # --- Tablas de resultados paginadas (proyect.common.tables) ---
+    TABLE_INDEX_ITEMS: int = _env_int('TABLE_INDEX_ITEMS', 16, minimum=1)        # Tablas indexadas en memoria por proceso
+    TABLE_PAGE_MAX_ROWS: int = _env_int('TABLE_PAGE_MAX_ROWS', 1000, minimum=1)  # Tope de filas por página
+    # --- Métricas Prometheus (proyect.common.metrics) ---
+    # Con varios procesos, exportar PROMETHEUS_MULTIPROC_DIR (directorio vacío) antes de arrancar el servidor
+    METRICS_ENABLED: bool = os.environ.get('METRICS_ENABLED', 'True').lower() in ('true', '1', 't')
+    METRICS_PATH: str = os.environ.get('METRICS_PATH', '/metrics')
+    METRICS_TOKEN: Optional[str] = os.environ.get('METRICS_TOKEN') or None  # Si se define, /metrics exige 'Authorization: Bearer <token>'
+    # --- Perfilado bajo demanda (proyect.common.profiling; token: `flask profiling-token`) ---
+    PROFILING_ENABLED: bool = os.environ.get('PROFILING_ENABLED', 'False').lower() in ('true', '1', 't')  # Desactivado: sin hooks
+    PROFILING_FOLDER: Optional[str] = os.environ.get('PROFILING_FOLDER') or None  # Por defecto <instance>/profiles
+    PROFILING_KEEP: int = _env_int('PROFILING_KEEP', 50, minimum=1)                       # Perfiles conservados
+    PROFILING_TOKEN_MAX_AGE: int = _env_int('PROFILING_TOKEN_MAX_AGE', 24 * 3600, minimum=1)  # Validez del token (s)
+    # --- Trazas de peticiones lentas (proyect.common.tracing) ---
+    SLOW_TRACE_ENABLED: bool = os.environ.get('SLOW_TRACE_ENABLED', 'True').lower() in ('true', '1', 't')
+    SLOW_TRACE_THRESHOLD: float = _env_float('SLOW_TRACE_THRESHOLD', 5.0, minimum=0)  # Segundos: por encima se guarda la traza
+    SLOW_TRACE_INTERVAL: float = _env_float('SLOW_TRACE_INTERVAL', 0.05, minimum=0.001)   # Segundos entre muestras de pila
+    SLOW_TRACE_KEEP: int = _env_int('SLOW_TRACE_KEEP', 100, minimum=1)                 # Trazas conservadas
+    SLOW_TRACE_FOLDER: Optional[str] = os.environ.get('SLOW_TRACE_FOLDER') or None       # Por defecto <instance>/slow_requests
+    SLOW_TRACE_EXEMPT_ENDPOINTS: Tuple[str, ...] = tuple(                                # Endpoints SSE/long-poll sin traza
+        e.strip() for e in os.environ.get('SLOW_TRACE_EXEMPT_ENDPOINTS', 'jobs.events').split(',') if e.strip())
+    # --- Memoria: métricas por petición/etapa y reciclado de workers (proyect.common.memory) ---
+    MEMORY_TRACEMALLOC: bool = os.environ.get('MEMORY_TRACEMALLOC', 'False').lower() in ('true', '1', 't')  # Pico trazado (con coste)
+    MEMORY_RSS_LIMIT_MB: int = _env_int('MEMORY_RSS_LIMIT_MB', 0, minimum=0)  # >0: el worker se retira tras la petición que lo supera
+    # --- Logging asíncrono y estructurado (proyect.common.logs) ---
+    LOG_ASYNC: bool = os.environ.get('LOG_ASYNC', 'True').lower() in ('true', '1', 't')    # Handlers en un hilo propio
+    LOG_QUEUE_SIZE: int = _env_int('LOG_QUEUE_SIZE', 10000, minimum=1)                 # Llena: se descartan DEBUG-WARNING
+    LOG_JSON: bool = os.environ.get('LOG_JSON', 'False').lower() in ('true', '1', 't')     # Una línea JSON por registro
+    LOG_LEVELS: str = os.environ.get('LOG_LEVELS', '')  # Niveles por módulo: "proyect.moca.utils=WARNING,werkzeug=INFO"
     REQUIRED_VARS: List[str] = [] # Base class has no required vars itself
 
     @classmethod
@@ -123,6 +226,8 @@ class DevelopmentConfig(Config):
     except (ValueError, TypeError):
         config_logger.warning(f"Valor inválido para DEV_PORT ('{os.environ.get('DEV_PORT')}') en.env. Usando puerto {Config.PORT}.")
         PORT = Config.PORT
+    # Sin bundles construidos (python -m proyect.common.assets), usar el CDN versionado
+    ASSETS_CDN_FALLBACK = os.environ.get('ASSETS_CDN_FALLBACK', 'True').lower() in ('true', '1', 't')
     REQUIRED_VARS = [] # No specific vars strictly required to *start* in dev
 
 # Configuración de Pruebas
@@ -152,6 +257,8 @@ class ProductionConfig(Config):
     # --- Enhanced Security for Production ---
     SESSION_COOKIE_SECURE = True  # Require HTTPS
     SESSION_COOKIE_SAMESITE = 'Strict'
+    # --- Logging: JSON para el agregador de logs ---
+    LOG_JSON = os.environ.get('LOG_JSON', 'True').lower() in ('true', '1', 't')
     # --- WSGI Server Configuration ---
     HOST = os.environ.get('HOST', '0.0.0.0') # Listen on all available interfaces
     try:
@@ -0,0 +1,11 @@
+# proyect/admin/__init__.py
+"""
+Inicialización del Blueprint 'admin'.
+Importa el objeto Blueprint desde routes.py para su registro.
+"""
+
+# Importa únicamente el objeto Blueprint definido en routes.py
+from .routes import bp
+
+# Controla qué se exporta con "from proyect.admin import *"
+__all__ = ['bp']
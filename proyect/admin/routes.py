@@ -0,0 +1,44 @@
+# proyect/admin/routes.py
+"""
+Páginas de administración (diagnóstico de rendimiento).
+
+- /admin/profiles                Perfiles de peticiones y análisis recientes (ver proyect.common.profiling).
+- /admin/profiles/<profile_id>   Descarga del artefacto (speedscope o pstats).
+
+Solo existen con PROFILING_ENABLED y exigen el token de perfilado (cabecera
+'X-Profile-Token' o parámetro '_profile'); sin él responden 404/403.
+"""
+
+from flask import Blueprint, render_template, abort, send_file
+
+from proyect.common.profiling import profiler, PROFILE_TOKEN_PARAM
+
+# --- Definición única de Blueprint con prefijo y nombre consistente ---
+bp = Blueprint('admin', __name__, url_prefix='/admin')
+
+
+@bp.before_request
+def require_profiling_token():
+    """Las páginas de administración solo se sirven con el perfilado activo y un token válido."""
+    if not profiler.enabled:
+        abort(404)
+    if not profiler.verify_token(profiler.request_token()):
+        abort(403)
+
+
+@bp.route('/profiles', endpoint='profiles')
+def profiles():
+    """Listado de perfiles guardados, del más reciente al más antiguo."""
+    return render_template('admin/profiles.html', profiles=profiler.list_profiles(),
+                           token_param=PROFILE_TOKEN_PARAM, token=profiler.request_token())
+
+
+@bp.route('/profiles/<profile_id>', endpoint='profile_artifact')
+def profile_artifact(profile_id: str):
+    """Descarga del artefacto de un perfil."""
+    path = profiler.artifact_path(profile_id)
+    if path is None:
+        abort(404)
+    response = send_file(path, as_attachment=True, download_name=path.name, max_age=0)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
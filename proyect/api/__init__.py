@@ -0,0 +1,11 @@
+# proyect/api/__init__.py
+"""
+Inicialización del Blueprint 'api' (API JSON versionada de resultados).
+Importa el objeto Blueprint desde routes.py para su registro.
+"""
+
+# Importa únicamente el objeto Blueprint definido en routes.py
+from .routes import bp
+
+# Controla qué se exporta con "from proyect.api import *"
+__all__ = ['bp']
@@ -0,0 +1,144 @@
+# proyect/api/routes.py
+"""
+API JSON versionada de resultados de análisis (/api/v1).
+
+Las páginas de resultados se sirven como un armazón ligero y piden cada
+figura y tabla a estos endpoints en paralelo, tras el primer pintado.
+
+- /api/v1/results/<source_ref>                  Manifiesto: figuras y tablas disponibles con sus URLs.
+- /api/v1/results/<source_ref>/figures/<name>   Figura Plotly codificada (typed arrays, ver charts.encode_figure).
+- /api/v1/results/<source_ref>/tables/<name>    Página de una tabla (ver common.tables): ?offset, limit,
+                                                sort, order=asc|desc, q (búsqueda) y filter.<columna>.
+
+`source_ref` es un job_id o una clave de caché: su contenido no cambia, así que
+las respuestas llevan un ETag fuerte derivado de la referencia y de la versión
+de la aplicación, y `Cache-Control: immutable`. Un If-None-Match que coincide
+se responde con 304 sin cargar el resultado.
+"""
+
+import hashlib
+import json
+import math
+from typing import Any, Callable, Dict
+
+from flask import Blueprint, Response, abort, current_app, jsonify, request, url_for
+
+from proyect.common.charts import PAYLOAD_ENCODING, encode_figure
+from proyect.common.export import result_charts, result_tables
+from proyect.common.results import load_analysis_results
+from proyect.common.tables import DEFAULT_PAGE_ROWS, table_service
+
+# --- Constantes y Configuraciones ---
+API_VERSION = 'v1'
+IMMUTABLE_CACHE_CONTROL = 'private, max-age=31536000, immutable'  # Datos del usuario: solo caché del navegador
+TABLE_FILTER_PREFIX = 'filter.'                                    # ?filter.<columna>=<expresión>
+
+# --- Definición única de Blueprint con prefijo y nombre consistente ---
+bp = Blueprint('api', __name__, url_prefix=f'/api/{API_VERSION}')
+
+
+@bp.route('/results/<source_ref>', endpoint='result_manifest')
+def result_manifest(source_ref: str):
+    """Figuras y tablas de un resultado, con las URLs de cada recurso."""
+    def build() -> Dict[str, Any]:
+        results, meta = _load_or_404(source_ref)
+        tables = result_tables(results)
+        return {
+            'source_ref': source_ref,
+            'analysis_type': meta.get('analysis_type'),
+            'filename': meta.get('filename'),
+            'figures': [{'name': name, 'url': url_for('api.figure', source_ref=source_ref, name=name)}
+                        for name in result_charts(results)],
+            'tables': [{'name': name, 'rows': int(len(df)), 'columns': [str(col) for col in df.columns],
+                        'url': url_for('api.table', source_ref=source_ref, name=name)}
+                       for name, df in tables.items()],
+        }
+    return _immutable_json(('manifest', source_ref), lambda: _dumps(build()))
+
+
+@bp.route('/results/<source_ref>/figures/<name>', endpoint='figure')
+def figure(source_ref: str, name: str):
+    """Una figura Plotly del resultado, codificada para hydratePlotlyFigure."""
+    def build() -> str:
+        results, _ = _load_or_404(source_ref)
+        charts = result_charts(results)
+        if name not in charts:
+            abort(404, description=f"Figura '{name}' no encontrada.")
+        return _dumps(encode_figure(charts[name]))
+    return _immutable_json(('figure', source_ref, name, PAYLOAD_ENCODING), build)
+
+
+@bp.route('/results/<source_ref>/tables/<name>', endpoint='table')
+def table(source_ref: str, name: str):
+    """Una página de una tabla del resultado, con orden, filtros y búsqueda aplicados en el servidor."""
+    try:
+        query = {
+            'offset': int(request.args.get('offset', 0)),
+            'limit': int(request.args.get('limit', DEFAULT_PAGE_ROWS)),
+            'sort': request.args.get('sort') or None,
+            'order': request.args.get('order', 'asc'),
+            'search': request.args.get('q', ''),
+            'filters': {key[len(TABLE_FILTER_PREFIX):]: value for key, value in request.args.items()
+                        if key.startswith(TABLE_FILTER_PREFIX) and value.strip()},
+        }
+    except ValueError:
+        abort(400, description="'offset' y 'limit' deben ser enteros.")
+
+    def build() -> str:
+        def load_table():
+            results, _ = _load_or_404(source_ref)
+            tables = result_tables(results)
+            if name not in tables:
+                abort(404, description=f"Tabla '{name}' no encontrada.")
+            return tables[name]
+        try:
+            page = table_service.page((source_ref, name), load_table, **query)
+        except ValueError as e:
+            abort(400, description=str(e))
+        return _dumps(page)
+    identity = ('table', source_ref, name) + tuple(f'{key}={value}' for key, value in sorted(request.args.items()))
+    return _immutable_json(identity, build)
+
+
+@bp.errorhandler(400)
+@bp.errorhandler(404)
+def api_error(error):
+    """Los errores de la API se devuelven en JSON, no con las páginas de error HTML."""
+    return jsonify({'error': error.name.lower().replace(' ', '_'), 'message': error.description}), error.code
+
+
+# --- Funciones Auxiliares ---
+
+def _load_or_404(source_ref: str):
+    loaded = load_analysis_results(source_ref)
+    if loaded is None:
+        abort(404, description='Resultado no encontrado o aún no disponible.')
+    return loaded
+
+def _immutable_json(identity: tuple, build: Callable[[], str]) -> Response:
+    """Respuesta JSON con ETag fuerte e immutable; 304 antes de construir el cuerpo si el cliente ya la tiene."""
+    material = '|'.join((API_VERSION, str(current_app.config.get('APP_VERSION', '')),) + tuple(map(str, identity)))
+    etag = hashlib.sha256(material.encode('utf-8')).hexdigest()[:32]
+    if request.if_none_match.contains_weak(etag):  # Débil: la compresión convierte el ETag en W/"..."
+        response = Response(status=304)
+    else:
+        response = current_app.response_class(build(), mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+def _dumps(payload: Any) -> str:
+    """JSON compacto y válido (NaN/Inf -> null; JSON.parse no los acepta)."""
+    try:
+        return json.dumps(payload, separators=(',', ':'), ensure_ascii=False, allow_nan=False)
+    except ValueError:
+        return json.dumps(_finite(payload), separators=(',', ':'), ensure_ascii=False)
+
+def _finite(value: Any) -> Any:
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(item) for item in value]
+    return value
@@ -1,5 +1,6 @@
 from .utils import (
     allowed_file,
+    iter_data_file_chunks,
     read_data_file,
     update_history_status,
     validate_dataframe,
@@ -7,6 +8,7 @@ from .utils import (
 
 __all__ = [
     "allowed_file",
+    "iter_data_file_chunks",
     "read_data_file",
     "update_history_status",
     "validate_dataframe",
@@ -0,0 +1,281 @@
+# pricing_dashboard/proyect/common/admission.py
+# -*- coding: utf-8 -*-
+"""
+Control de admisión de los análisis (los endpoints `/process`).
+
+Cada tipo de análisis tiene un presupuesto de concurrencia (ADMISSION_BUDGETS,
+p.ej. "maxdiff=4,comstrat=4,moca=2") compartido por todos los workers web: los
+análisis admitidos son concesiones en la tabla admission_leases de SQLite. Cada
+análisis consume un peso según el tamaño del archivo: 1 + una unidad por cada
+ADMISSION_WEIGHT_UNIT_MB (como mucho, el presupuesto entero: un archivo enorme se
+ejecuta solo).
+
+- Con presupuesto: se admite y se encola el trabajo (proyect.common.jobs).
+- Sin presupuesto: la petición espera su turno (por orden de llegada y tipo)
+  hasta ADMISSION_WAIT_TIMEOUT segundos; si vence, 503. Si ya hay
+  ADMISSION_MAX_WAITING peticiones esperando, 429 inmediato. Ambas respuestas
+  llevan Retry-After (ADMISSION_RETRY_AFTER).
+- La concesión se libera al terminar el trabajo. Las de workers que ya no existen
+  (o más antiguas que ADMISSION_LEASE_TTL) se recuperan en la siguiente admisión.
+
+La espera ocupa el hilo de la petición: ADMISSION_WAIT_TIMEOUT debe ser corto
+(segundos) y ADMISSION_MAX_WAITING menor que los hilos del servidor, para que las
+páginas ligeras (dashboard, preview, estado de trabajos) nunca esperen detrás de
+los análisis: estas no pasan por el control de admisión.
+
+Uso (igual que otras extensiones Flask):
+    admission.init_app(app)                 # en initialize_extensions (tras db y jobs)
+    job_id = admission.submit('moca', process_moca_file, filepath, filename=filename)
+"""
+
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Union
+
+from werkzeug.exceptions import ServiceUnavailable, TooManyRequests
+
+from proyect.common.db import connect, register_schema
+from proyect.common.jobs import jobs, JOB_FINAL_STATES
+from proyect.common.metrics import ADMISSION_WAIT
+
+logger = logging.getLogger(__name__)
+
+# --- Constantes y Configuraciones ---
+DEFAULT_ADMISSION_BUDGET = 4          # Unidades de peso simultáneas por tipo de análisis
+DEFAULT_WEIGHT_UNIT_MB = 10           # Cada N MB de entrada suman una unidad de peso
+DEFAULT_MAX_WAITING = 4               # Peticiones esperando turno por tipo de análisis
+DEFAULT_WAIT_TIMEOUT = 5.0            # Segundos máximos de espera en la petición
+DEFAULT_RETRY_AFTER = 30              # Segundos sugeridos al cliente (cabecera Retry-After)
+DEFAULT_LEASE_TTL = 3600              # Segundos tras los que una concesión se da por perdida
+POLL_INTERVAL = 0.2                   # Segundos entre comprobaciones de turno
+LEASE_WAITING = 'waiting'
+LEASE_RUNNING = 'running'
+
+ADMISSION_SCHEMA = """
+CREATE TABLE IF NOT EXISTS admission_leases (
+    id            TEXT PRIMARY KEY,
+    analysis_type TEXT NOT NULL,
+    weight        INTEGER NOT NULL,
+    state         TEXT NOT NULL,               -- waiting | running
+    pid           INTEGER NOT NULL,            -- Worker web que la obtuvo
+    job_id        TEXT,
+    created_at    REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_admission_type_state ON admission_leases (analysis_type, state, created_at);
+CREATE INDEX IF NOT EXISTS ix_admission_job ON admission_leases (job_id);
+"""
+register_schema(ADMISSION_SCHEMA)
+
+
+class AdmissionControl:
+    """Presupuestos de concurrencia por tipo de análisis, compartidos entre workers vía SQLite (extensión Flask)."""
+
+    def __init__(self, app=None):
+        self.enabled = True
+        self.db_path: Optional[str] = None
+        self.budgets: Dict[str, int] = {}
+        self.default_budget = DEFAULT_ADMISSION_BUDGET
+        self.weight_unit = DEFAULT_WEIGHT_UNIT_MB * 1024 * 1024
+        self.max_waiting = DEFAULT_MAX_WAITING
+        self.wait_timeout = DEFAULT_WAIT_TIMEOUT
+        self.retry_after = DEFAULT_RETRY_AFTER
+        self.lease_ttl = DEFAULT_LEASE_TTL
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        """Lee la configuración (ADMISSION_*) y se suscribe al fin de los trabajos (db.init_app y jobs.init_app antes)."""
+        db_extension = app.extensions.get('db')
+        if db_extension is None or 'jobs' not in app.extensions:
+            raise RuntimeError("AdmissionControl requiere db.init_app(app) y jobs.init_app(app) previos.")
+        self.enabled = bool(app.config.get('ADMISSION_ENABLED', True))
+        self.db_path = db_extension.path
+        self.budgets = _parse_budgets(app.config.get('ADMISSION_BUDGETS') or '')
+        self.default_budget = int(app.config.get('ADMISSION_DEFAULT_BUDGET', DEFAULT_ADMISSION_BUDGET))
+        self.weight_unit = int(app.config.get('ADMISSION_WEIGHT_UNIT_MB', DEFAULT_WEIGHT_UNIT_MB)) * 1024 * 1024
+        self.max_waiting = int(app.config.get('ADMISSION_MAX_WAITING', DEFAULT_MAX_WAITING))
+        self.wait_timeout = float(app.config.get('ADMISSION_WAIT_TIMEOUT', DEFAULT_WAIT_TIMEOUT))
+        self.retry_after = int(app.config.get('ADMISSION_RETRY_AFTER', DEFAULT_RETRY_AFTER))
+        self.lease_ttl = int(app.config.get('ADMISSION_LEASE_TTL', DEFAULT_LEASE_TTL))
+        app.extensions['admission'] = self
+        if not self.enabled:
+            logger.info("AdmissionControl desactivado (ADMISSION_ENABLED=False).")
+            return
+        jobs.add_finish_listener(self._release_finished_job)
+        logger.info(f"AdmissionControl inicializado: presupuestos {self.budgets or {}} (por defecto {self.default_budget}), "
+                    f"1 unidad cada {self.weight_unit // (1024 * 1024)} MB, máx. {self.max_waiting} en espera "
+                    f"durante {self.wait_timeout:g} s.")
+
+    # --- API pública (contexto de petición) ---
+
+    def submit(self, analysis_type: str, func: Callable[..., Any], filepath: Union[str, Path], *args: Any,
+               filename: Optional[str] = None, **kwargs: Any) -> str:
+        """
+        Admite el análisis según el tamaño de `filepath` y lo encola con jobs.submit.
+
+        Raises:
+            TooManyRequests: Ya hay ADMISSION_MAX_WAITING peticiones esperando turno (429).
+            ServiceUnavailable: No hubo presupuesto en ADMISSION_WAIT_TIMEOUT segundos (503).
+            JobQueueFullError: Como jobs.submit (la concesión se libera).
+        """
+        if not self.enabled:
+            return jobs.submit(analysis_type, func, filepath, *args, filename=filename, **kwargs)
+        lease_id = self.acquire(analysis_type, self.weight_for(filepath))
+        try:
+            job_id = jobs.submit(analysis_type, func, filepath, *args, filename=filename, **kwargs)
+        except BaseException:
+            self.release(lease_id)
+            raise
+        self._execute("UPDATE admission_leases SET job_id = ? WHERE id = ?", (job_id, lease_id))
+        if (jobs.get_status(job_id) or {}).get('status') in JOB_FINAL_STATES:  # Terminó antes de asociar la concesión
+            self.release(lease_id)
+        return job_id
+
+    def weight_for(self, filepath: Union[str, Path]) -> int:
+        """Peso de un análisis: 1 + una unidad por cada ADMISSION_WEIGHT_UNIT_MB del archivo de entrada."""
+        try:
+            size = os.path.getsize(filepath)
+        except OSError:
+            size = 0
+        return 1 + size // self.weight_unit if self.weight_unit > 0 else 1
+
+    def acquire(self, analysis_type: str, weight: int) -> str:
+        """Obtiene una concesión de `weight` unidades, esperando turno como mucho `wait_timeout` segundos."""
+        budget = self.budgets.get(analysis_type, self.default_budget)
+        weight = max(1, min(weight, budget))
+        lease_id, started = uuid.uuid4().hex, time.monotonic()
+        conn = connect(self.db_path)
+        queued = admitted = False
+        try:
+            with _immediate(conn):
+                self._reclaim_stale(conn)
+                admitted = self._try_admit(conn, lease_id, analysis_type, weight, budget, waiting=False)
+                if not admitted:
+                    waiting = conn.execute("SELECT COUNT(*) FROM admission_leases WHERE analysis_type = ? AND state = ?",
+                                           (analysis_type, LEASE_WAITING)).fetchone()[0]
+                    queued = waiting < self.max_waiting
+                    if queued:
+                        conn.execute("INSERT INTO admission_leases (id, analysis_type, weight, state, pid, created_at) "
+                                     "VALUES (?, ?, ?, ?, ?, ?)",
+                                     (lease_id, analysis_type, weight, LEASE_WAITING, os.getpid(), time.time()))
+            if not admitted and not queued:
+                ADMISSION_WAIT.labels(analysis_type, 'rejected').observe(0.0)
+                logger.warning(f"Admisión: '{analysis_type}' sin presupuesto y {waiting} peticiones en espera (429).")
+                raise TooManyRequests(f"Hay demasiados análisis {analysis_type} en curso. "
+                                      f"Inténtalo de nuevo en {self.retry_after} segundos.", retry_after=self.retry_after)
+
+            deadline = started + self.wait_timeout
+            while not admitted and time.monotonic() < deadline:
+                time.sleep(POLL_INTERVAL)
+                with _immediate(conn):
+                    admitted = self._try_admit(conn, lease_id, analysis_type, weight, budget, waiting=True)
+        finally:
+            if queued and not admitted:  # Timeout o interrupción: no bloquear a los siguientes en la cola
+                with conn:
+                    conn.execute("DELETE FROM admission_leases WHERE id = ?", (lease_id,))
+            conn.close()
+
+        if admitted:
+            ADMISSION_WAIT.labels(analysis_type, 'admitted').observe(time.monotonic() - started)
+            return lease_id
+        ADMISSION_WAIT.labels(analysis_type, 'timeout').observe(time.monotonic() - started)
+        logger.warning(f"Admisión: '{analysis_type}' (peso {weight}) sin turno tras {self.wait_timeout:g} s (503).")
+        raise ServiceUnavailable(f"El servidor está procesando muchos análisis {analysis_type}. "
+                                 f"Inténtalo de nuevo en {self.retry_after} segundos.", retry_after=self.retry_after)
+
+    def release(self, lease_id: str) -> None:
+        self._execute("DELETE FROM admission_leases WHERE id = ?", (lease_id,))
+
+    # --- Internos ---
+
+    def _try_admit(self, conn: sqlite3.Connection, lease_id: str, analysis_type: str, weight: int,
+                   budget: int, waiting: bool) -> bool:
+        """Admite si cabe en el presupuesto y no hay peticiones anteriores esperando (dentro de una transacción)."""
+        in_use = conn.execute("SELECT COALESCE(SUM(weight), 0) FROM admission_leases WHERE analysis_type = ? AND state = ?",
+                              (analysis_type, LEASE_RUNNING)).fetchone()[0]
+        if in_use + weight > budget:
+            return False
+        head = conn.execute("SELECT id FROM admission_leases WHERE analysis_type = ? AND state = ? "
+                            "ORDER BY created_at, id LIMIT 1", (analysis_type, LEASE_WAITING)).fetchone()
+        if waiting:
+            if head is None or head['id'] != lease_id:
+                return False
+            conn.execute("UPDATE admission_leases SET state = ?, created_at = ? WHERE id = ?",
+                         (LEASE_RUNNING, time.time(), lease_id))
+            return True
+        if head is not None:  # Respeta el orden de llegada
+            return False
+        conn.execute("INSERT INTO admission_leases (id, analysis_type, weight, state, pid, created_at) "
+                     "VALUES (?, ?, ?, ?, ?, ?)", (lease_id, analysis_type, weight, LEASE_RUNNING, os.getpid(), time.time()))
+        return True
+
+    def _reclaim_stale(self, conn: sqlite3.Connection) -> None:
+        """Borra concesiones de workers que ya no existen o más antiguas que `lease_ttl`."""
+        conn.execute("DELETE FROM admission_leases WHERE created_at < ?", (time.time() - self.lease_ttl,))
+        pids = [row['pid'] for row in conn.execute("SELECT DISTINCT pid FROM admission_leases")]
+        dead = [pid for pid in pids if not _pid_alive(pid)]
+        if dead:
+            conn.executemany("DELETE FROM admission_leases WHERE pid = ?", [(pid,) for pid in dead])
+            logger.warning(f"Admisión: recuperadas concesiones de workers terminados {dead}.")
+
+    def _release_finished_job(self, job_id: str, status: Dict[str, Any]) -> None:
+        """Listener de fin de trabajo (hilo del pool, sin contexto de Flask)."""
+        self._execute("DELETE FROM admission_leases WHERE job_id = ?", (job_id,))
+
+    def _execute(self, sql: str, params: tuple) -> None:
+        conn = connect(self.db_path)
+        try:
+            with conn:
+                conn.execute(sql, params)
+        finally:
+            conn.close()
+
+
+# Instancia global (inicialización diferida con init_app)
+admission = AdmissionControl()
+
+
+# --- Funciones Auxiliares ---
+
+class _immediate:
+    """Transacción BEGIN IMMEDIATE: lectura del presupuesto y escritura de la concesión sin carreras entre procesos."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.conn.commit()
+        else:
+            self.conn.rollback()
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _parse_budgets(spec: str) -> Dict[str, int]:
+    """'maxdiff=4,moca=2' -> {'maxdiff': 4, 'moca': 2}. Lanza ValueError si un presupuesto no es un entero positivo."""
+    budgets = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        name, _, value = item.partition('=')
+        try:
+            budget = int(value)
+        except ValueError:
+            budget = 0
+        if budget < 1:
+            raise ValueError(f"Presupuesto no válido en ADMISSION_BUDGETS: '{item}'.")
+        budgets[name.strip()] = budget
+    return budgets
@@ -0,0 +1,110 @@
+# pricing_dashboard/proyect/common/artifacts.py
+# -*- coding: utf-8 -*-
+"""
+Serialización en disco de los resultados de un análisis.
+
+Un resultado (normalmente el dict devuelto por run_*/process_*_file) se guarda
+como un directorio con un manifest.json y una parte por llave: DataFrames en
+Parquet (si hay motor disponible), JSON de gráficos comprimido con gzip y el
+resto con pickle. Lo usan la caché de resultados y el catálogo de análisis.
+
+El manifest de un resultado dict incluye su índice (proyect.common.export.result_index):
+las páginas de resultados lo leen con read_result_index sin deserializar las partes.
+"""
+
+import gzip
+import json
+import logging
+import pickle
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import pandas as pd
+
+from proyect.common.export import result_index
+
+logger = logging.getLogger(__name__)
+
+# --- Constantes y Configuraciones ---
+MANIFEST_FILENAME = 'manifest.json'
+PART_PARQUET = 'parquet'
+PART_JSON_GZ = 'json.gz'
+PART_PICKLE = 'pkl'
+
+
+def write_result_artifacts(directory: Path, value: Any, meta: Dict[str, Any]) -> None:
+    """Escribe `value` y `meta` en `directory` (debe existir). El manifest se escribe al final."""
+    if isinstance(value, dict):
+        parts = {name: _write_part(directory, f"part{i}", part) for i, (name, part) in enumerate(value.items())}
+        manifest = {'kind': 'dict', 'parts': parts, 'meta': meta, 'index': result_index(value)}
+    else:
+        manifest = {'kind': 'value', 'parts': {'value': _write_part(directory, 'part0', value)}, 'meta': meta}
+    with open(directory / MANIFEST_FILENAME, 'w', encoding='utf-8') as fh:
+        json.dump(manifest, fh, ensure_ascii=False, default=str)
+
+def read_result_artifacts(directory: Path) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Lee un resultado escrito con write_result_artifacts y devuelve (valor, meta).
+
+    Raises:
+        FileNotFoundError: Si el directorio no tiene manifest.
+    """
+    with open(directory / MANIFEST_FILENAME, 'r', encoding='utf-8') as fh:
+        manifest = json.load(fh)
+    parts = {name: _read_part(directory, spec) for name, spec in manifest['parts'].items()}
+    value = parts if manifest.get('kind') == 'dict' else parts.get('value')
+    return value, manifest.get('meta') or {}
+
+def read_result_index(directory: Path) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
+    """
+    (índice, meta) desde el manifest, sin leer las partes. Índice None si el
+    resultado no es un dict o el manifest es anterior al índice.
+
+    Raises:
+        FileNotFoundError: Si el directorio no tiene manifest.
+    """
+    with open(directory / MANIFEST_FILENAME, 'r', encoding='utf-8') as fh:
+        manifest = json.load(fh)
+    return manifest.get('index'), manifest.get('meta') or {}
+
+def artifacts_size(directory: Path) -> int:
+    """Bytes ocupados por las partes de un resultado."""
+    return sum(f.stat().st_size for f in directory.iterdir() if f.is_file())
+
+
+# --- Funciones Auxiliares ---
+
+def _write_part(directory: Path, stem: str, value: Any) -> Dict[str, str]:
+    """Guarda una parte del resultado en el formato más adecuado y devuelve su descriptor."""
+    if isinstance(value, pd.DataFrame):
+        path = directory / f"{stem}.{PART_PARQUET}"
+        try:
+            value.to_parquet(path)
+            return {'file': path.name, 'format': PART_PARQUET}
+        except Exception as e:  # Sin motor Parquet, columnas no str, tipos mixtos...
+            logger.debug(f"Parte '{stem}' no serializable en Parquet ({e}); se usa pickle.")
+            path.unlink(missing_ok=True)
+    elif isinstance(value, (dict, list, str, int, float, bool)) or value is None:
+        try:
+            data = json.dumps(value, ensure_ascii=False, allow_nan=True).encode('utf-8')
+        except (TypeError, ValueError):
+            data = None  # Contiene tipos no JSON (p.ej. escalares numpy): se usa pickle
+        if data is not None:
+            path = directory / f"{stem}.{PART_JSON_GZ}"
+            with gzip.open(path, 'wb', compresslevel=6) as fh:
+                fh.write(data)
+            return {'file': path.name, 'format': PART_JSON_GZ}
+    path = directory / f"{stem}.{PART_PICKLE}"
+    with open(path, 'wb') as fh:
+        pickle.dump(value, fh, protocol=pickle.HIGHEST_PROTOCOL)
+    return {'file': path.name, 'format': PART_PICKLE}
+
+def _read_part(directory: Path, spec: Dict[str, str]) -> Any:
+    path = directory / spec['file']
+    if spec['format'] == PART_PARQUET:
+        return pd.read_parquet(path)
+    if spec['format'] == PART_JSON_GZ:
+        with gzip.open(path, 'rb') as fh:
+            return json.loads(fh.read().decode('utf-8'))
+    with open(path, 'rb') as fh:
+        return pickle.load(fh)
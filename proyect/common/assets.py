@@ -0,0 +1,310 @@
+# pricing_dashboard/proyect/common/assets.py
+# -*- coding: utf-8 -*-
+"""
+Recursos estáticos propios (Plotly, Bootstrap, Font Awesome, fuentes) con huella
+de contenido.
+
+La red de producción no tiene acceso a los CDN: las páginas esperaban al timeout
+de cdn.plot.ly, y `plotly-latest` no tiene versión, así que no se puede cachear a
+largo plazo. Este módulo construye y sirve los bundles desde el propio servidor.
+
+Construcción (`python -m proyect.common.assets`):
+- Lee los archivos de terceros de assets/vendor/ (--source; ver ASSET_BUNDLES
+  para las rutas esperadas) y escribe en static/dist/ (--output, ASSETS_FOLDER
+  al servir) un archivo por bundle con el hash del contenido en el nombre
+  (`plotly.3f9a12c4e0b1.js`), sus variantes precomprimidas `.gz` y `.br` (si está
+  instalado `brotli`) y `manifest.json` (nombre lógico -> archivo).
+- Las url(...) relativas de los CSS (fuentes de Font Awesome y Source Sans 3) se
+  copian con huella junto al CSS y se reescriben.
+- Plotly es un bundle parcial con solo las trazas que usamos (bar, scatter,
+  scattergl), generado desde el repositorio de plotly.js:
+      npm ci && npm run custom-bundle -- --traces bar,scatter,scattergl --out pricing
+  y copiado como assets/vendor/plotly/plotly-pricing.min.js.
+
+Servicio:
+- /assets/<archivo>: el archivo con huella, `Cache-Control: immutable` de un año y
+  la variante precomprimida que acepte el cliente (br, gzip).
+- `asset_url('plotly.js')` (global Jinja) devuelve la URL del manifiesto. Sin
+  bundles construidos y con ASSETS_CDN_FALLBACK=True (desarrollo) devuelve la URL
+  versionada del CDN; la CSP solo permite los orígenes de CDN en ese caso.
+- Fuera de debug/testing y sin ASSETS_CDN_FALLBACK, init_app falla si falta el
+  manifiesto o algún bundle: la aplicación no arranca sin Bootstrap ni Plotly.
+
+Uso (igual que otras extensiones Flask):
+    asset_pipeline = AssetPipeline()        # instancia global (este módulo)
+    asset_pipeline.init_app(app)            # en initialize_extensions
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Union
+from urllib.parse import urlsplit
+
+from flask import abort, request, send_file, url_for
+from markupsafe import Markup
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # Opcional: pip install brotli (variantes .br)
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# --- Constantes y Configuraciones ---
+MANIFEST_FILENAME = 'manifest.json'
+ASSETS_URL_PREFIX = '/assets'
+ASSET_MAX_AGE = 365 * 24 * 3600
+ASSET_CACHE_CONTROL = f'public, max-age={ASSET_MAX_AGE}, immutable'
+FINGERPRINT_LENGTH = 12
+PRECOMPRESS_EXTENSIONS = {'.js', '.css', '.svg', '.ttf', '.otf', '.eot', '.json', '.map'}  # woff/woff2 ya van comprimidos
+PRECOMPRESSED_VARIANTS = (('br', '.br'), ('gzip', '.gz'))  # Orden de preferencia al servir
+_CSS_URL_RE = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+# Bundles: nombre lógico -> archivos de assets/vendor/ (concatenados en orden)
+# y URL versionada del CDN (solo con ASSETS_CDN_FALLBACK, sin bundles construidos).
+ASSET_BUNDLES: Dict[str, Dict[str, object]] = {
+    'bootstrap.css': {
+        'files': ['bootstrap/bootstrap.min.css'],
+        'cdn': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/dist/css/bootstrap.min.css',
+        'integrity': 'sha384-QWTKZyjpPEjISv5WaRU9OFeRpok6YctnYmDr5pNlyT2bRjXh0JMhjY6hW+ALEwIH',
+    },
+    'bootstrap.js': {
+        'files': ['bootstrap/bootstrap.bundle.min.js'],
+        'cdn': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/dist/js/bootstrap.bundle.min.js',
+        'integrity': 'sha384-YvpcrYf0tY3lHB60NNkmXc5s9fDVZLESaAA55NDzOxhy9GkcIdslK1eN7N6jIeHz',
+    },
+    'fontawesome.css': {
+        'files': ['fontawesome/css/all.min.css'],
+        'cdn': 'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.5.2/css/all.min.css',
+        'integrity': 'sha512-SnH5WK+bZxgPHs44uWIX+LLJAJ9/2PkPKZ5QiAj6Ta86w+fsb2TkcmfRyVX3pBnMFcV7oQPJkl9QevSCWr3W6A==',
+    },
+    'fonts.css': {
+        'files': ['source-sans-3/source-sans-3.css'],
+        'cdn': 'https://fonts.googleapis.com/css2?family=Source+Sans+3:ital,wght@0,300;0,400;0,600;0,700;1,400&display=swap',
+        'font_origins': ['https://fonts.gstatic.com'],
+    },
+    'plotly.js': {
+        'files': ['plotly/plotly-pricing.min.js'],  # Parcial: bar, scatter, scattergl
+        'cdn': 'https://cdn.plot.ly/plotly-2.35.2.min.js',
+    },
+}
+
+
+class AssetPipeline:
+    """Sirve los bundles con huella de static/dist (o el CDN de respaldo) y resuelve sus URLs."""
+
+    def __init__(self, app=None):
+        self.output_dir: Optional[Path] = None
+        self.cdn_fallback = False
+        self.manifest: Dict[str, str] = {}
+        self._manifest_mtime: Optional[float] = None
+        self._reload = False
+        self._warned: Set[str] = set()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        """Lee la configuración (ASSETS_FOLDER, ASSETS_CDN_FALLBACK), carga el manifiesto y registra /assets."""
+        self.output_dir = Path(app.config.get('ASSETS_FOLDER') or Path(app.root_path) / 'static' / 'dist')
+        self.cdn_fallback = bool(app.config.get('ASSETS_CDN_FALLBACK', False))
+        self._reload = bool(app.debug)
+        self._load_manifest()
+        app.add_url_rule(f'{ASSETS_URL_PREFIX}/<path:filename>', endpoint='assets', view_func=self._serve)
+        app.add_template_global(self.asset_url, 'asset_url')
+        app.add_template_global(self.asset_attrs, 'asset_attrs')
+        app.extensions['asset_pipeline'] = self
+        missing = self.missing_bundles()
+        if missing and not self.cdn_fallback and not (app.debug or app.testing):
+            raise RuntimeError(f"Recursos estáticos sin construir en '{self.output_dir}' ({', '.join(missing)}) "
+                               f"y ASSETS_CDN_FALLBACK desactivado. Ejecuta 'python -m proyect.common.assets'.")
+        if missing:
+            logger.warning(f"Recursos estáticos sin construir ({', '.join(missing)}): "
+                           f"{'se usará el CDN' if self.cdn_fallback else 'las páginas no los cargarán'}. "
+                           f"Ejecuta 'python -m proyect.common.assets'.")
+        logger.info(f"AssetPipeline inicializado: {len(self.manifest)} bundles en '{self.output_dir}'.")
+
+    def missing_bundles(self) -> List[str]:
+        """Bundles sin entrada en el manifiesto o cuyo archivo con huella no existe."""
+        return sorted(name for name in ASSET_BUNDLES
+                      if not self.manifest.get(name) or not (self.output_dir / self.manifest[name]).is_file())
+
+    def asset_url(self, name: str) -> str:
+        """URL del bundle `name` ('plotly.js', 'bootstrap.css', ...): con huella, o del CDN de respaldo."""
+        if self._reload:
+            self._load_manifest()
+        filename = self.manifest.get(name)
+        if filename:
+            return url_for('assets', filename=filename)
+        if name not in ASSET_BUNDLES:
+            raise ValueError(f"Recurso estático desconocido: '{name}'.")
+        if self.cdn_fallback:
+            return str(ASSET_BUNDLES[name]['cdn'])
+        if name not in self._warned:
+            self._warned.add(name)
+            logger.error(f"Recurso '{name}' no construido y ASSETS_CDN_FALLBACK desactivado.")
+        return url_for('assets', filename=name)
+
+    def asset_attrs(self, name: str) -> Markup:
+        """Atributos SRI (integrity + crossorigin) cuando el recurso sale del CDN; vacío si es propio."""
+        integrity = ASSET_BUNDLES.get(name, {}).get('integrity')
+        if name in self.manifest or not self.cdn_fallback or not integrity:
+            return Markup('')
+        return Markup(' integrity="{}" crossorigin="anonymous"').format(integrity)
+
+    def external_origins(self, kind: str) -> str:
+        """Orígenes de CDN que la CSP debe permitir para `kind` ('script', 'style', 'font'); '' si todo es propio."""
+        if not self.cdn_fallback:
+            return ''
+        origins: List[str] = []
+        for name, spec in ASSET_BUNDLES.items():
+            if name in self.manifest:
+                continue
+            parts = urlsplit(str(spec['cdn']))
+            origin = f'{parts.scheme}://{parts.netloc}'
+            if (kind == 'script' and name.endswith('.js')) or (kind in ('style', 'font') and name.endswith('.css')):
+                origins.append(origin)
+            if kind == 'font':
+                origins.extend(spec.get('font_origins', []))
+        return ' '.join(dict.fromkeys(origins))
+
+    def _load_manifest(self) -> None:
+        path = self.output_dir / MANIFEST_FILENAME
+        try:
+            mtime = path.stat().st_mtime
+        except OSError:
+            self.manifest, self._manifest_mtime = {}, None
+            return
+        if mtime == self._manifest_mtime:
+            return
+        try:
+            self.manifest = json.loads(path.read_text(encoding='utf-8'))
+            self._manifest_mtime = mtime
+        except (OSError, ValueError) as e:
+            logger.error(f"Manifiesto de recursos ilegible '{path}': {e}")
+            self.manifest = {}
+
+    def _serve(self, filename: str):
+        """Archivo con huella (inmutable), en la variante precomprimida que acepte el cliente."""
+        path = safe_join(str(self.output_dir), filename)
+        if path is None or filename == MANIFEST_FILENAME or not os.path.isfile(path):
+            abort(404)
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        encoding = None
+        for candidate, suffix in PRECOMPRESSED_VARIANTS:
+            if request.accept_encodings[candidate] and os.path.isfile(path + suffix):
+                path, encoding = path + suffix, candidate
+                break
+        response = send_file(path, mimetype=mimetype, max_age=ASSET_MAX_AGE, conditional=True, etag=True)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if Path(filename).suffix in PRECOMPRESS_EXTENSIONS:
+            response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = ASSET_CACHE_CONTROL
+        return response
+
+
+# Instancia global (inicialización diferida con init_app)
+asset_pipeline = AssetPipeline()
+
+
+def build_assets(source_dir: Union[str, Path], output_dir: Union[str, Path]) -> Dict[str, str]:
+    """
+    Construye los bundles de ASSET_BUNDLES desde `source_dir` en `output_dir` (ver
+    docstring del módulo) y devuelve el manifiesto. Lanza FileNotFoundError si falta
+    algún archivo de origen. Los archivos de construcciones anteriores se eliminan.
+    """
+    source_dir, output_dir = Path(source_dir).resolve(), Path(output_dir)
+    missing = [rel for spec in ASSET_BUNDLES.values() for rel in spec['files'] if not (source_dir / rel).is_file()]
+    if missing:
+        raise FileNotFoundError(f"Faltan archivos en '{source_dir}': {', '.join(missing)}")
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    manifest: Dict[str, str] = {}
+    written: Set[str] = set()
+    for name, spec in ASSET_BUNDLES.items():
+        stem, ext = name.rsplit('.', 1)
+        parts = []
+        for rel in spec['files']:
+            source = source_dir / rel
+            data = source.read_bytes()
+            if ext == 'css':
+                data = _rewrite_css_urls(data, source, source_dir, output_dir, written)
+            parts.append(data)
+        manifest[name] = _write_fingerprinted(output_dir, stem, ext, b'\n'.join(parts), written)
+
+    _write_atomic(output_dir / MANIFEST_FILENAME, json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    for stale in output_dir.iterdir():
+        if stale.is_file() and stale.name != MANIFEST_FILENAME and stale.name not in written:
+            stale.unlink()
+    logger.info(f"Recursos construidos en '{output_dir}': {', '.join(sorted(manifest.values()))}")
+    return manifest
+
+
+# --- Funciones Auxiliares ---
+
+def _write_fingerprinted(output_dir: Path, stem: str, ext: str, content: bytes, written: Set[str]) -> str:
+    """Escribe `<stem>.<hash>.<ext>` y sus variantes .gz/.br; devuelve el nombre del archivo."""
+    digest = hashlib.sha256(content).hexdigest()[:FINGERPRINT_LENGTH]
+    filename = f'{stem}.{digest}.{ext}'
+    target = output_dir / filename
+    if not target.exists():
+        _write_atomic(target, content)
+    written.add(filename)
+    if f'.{ext}' in PRECOMPRESS_EXTENSIONS:
+        variants = [('.gz', lambda: gzip.compress(content, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.append(('.br', lambda: brotli.compress(content, quality=11)))
+        for suffix, compress in variants:
+            if not (output_dir / (filename + suffix)).exists():
+                _write_atomic(output_dir / (filename + suffix), compress())
+            written.add(filename + suffix)
+    return filename
+
+def _rewrite_css_urls(data: bytes, source: Path, source_dir: Path, output_dir: Path, written: Set[str]) -> bytes:
+    """Copia con huella los archivos referenciados por url(...) relativas y reescribe las referencias."""
+    def replace(match: 're.Match') -> str:
+        reference = match.group(2).strip()
+        if reference.startswith(('data:', 'http:', 'https:', '//', '#', '/')):
+            return match.group(0)
+        query = re.search(r'[?#]', reference)  # p.ej. 'fa-solid-900.eot?#iefix'
+        path_part, tail = (reference[:query.start()], reference[query.start():]) if query else (reference, '')
+        referenced = (source.parent / path_part).resolve()
+        if source_dir not in referenced.parents or not referenced.is_file():
+            logger.warning(f"url({reference}) en '{source.name}' no encontrada en '{source_dir}'; se deja tal cual.")
+            return match.group(0)
+        stem, _, ext = referenced.name.rpartition('.')
+        filename = _write_fingerprinted(output_dir, stem, ext, referenced.read_bytes(), written)
+        return f'url({filename}{tail})'
+    return _CSS_URL_RE.sub(replace, data.decode('utf-8')).encode('utf-8')
+
+def _write_atomic(path: Path, content: bytes) -> None:
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(content)
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
+if __name__ == '__main__':
+    root = Path(__file__).resolve().parents[2]
+    parser = argparse.ArgumentParser(description='Construye los recursos estáticos con huella (static/dist).')
+    parser.add_argument('--source', default=str(root / 'assets' / 'vendor'), help='Archivos de terceros (assets/vendor)')
+    parser.add_argument('--output', default=str(root / 'static' / 'dist'), help='Destino (static/dist)')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s %(message)s')
+    try:
+        build_assets(args.source, args.output)
+    except FileNotFoundError as e:
+        raise SystemExit(f"ERROR: {e}")
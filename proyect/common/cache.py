@@ -0,0 +1,263 @@
+# pricing_dashboard/proyect/common/cache.py
+# -*- coding: utf-8 -*-
+"""
+Caché de resultados de análisis.
+
+La clave es el hash de (contenido del archivo, tipo de análisis, parámetros,
+versión del código), de modo que volver a abrir un estudio ya procesado no
+repite la lectura ni el pipeline run_*.
+
+Dos niveles:
+- Memoria: LRU acotada por número de entradas (por proceso web).
+- Disco: instance/result_cache/<kk>/<key>/, compartido entre procesos, con el
+  formato de proyect.common.artifacts (DataFrames en Parquet, JSON de gráficos
+  en gzip). Se desalojan las entradas menos usadas recientemente cuando el
+  tamaño total supera RESULT_CACHE_MAX_BYTES.
+
+Uso (igual que otras extensiones Flask):
+    result_cache = ResultCache()            # instancia global (este módulo)
+    result_cache.init_app(app)              # en initialize_extensions
+    key = result_cache.key_for_file(filepath, 'moca', params)
+    result_cache.put(key, results, meta={'filename': filename})
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+
+from proyect.common.artifacts import (MANIFEST_FILENAME, artifacts_size, read_result_artifacts, read_result_index,
+                                      write_result_artifacts)
+from proyect.common.export import result_index
+from proyect.common.metrics import CACHE_EVENTS
+
+logger = logging.getLogger(__name__)
+
+# --- Constantes y Configuraciones ---
+CACHE_FORMAT_VERSION = 1                       # Cambiar si cambia el formato en disco
+DEFAULT_CACHE_MEMORY_ITEMS = 32                # Entradas en la LRU de memoria
+DEFAULT_CACHE_MAX_BYTES = 512 * 1024 * 1024    # Tamaño máximo del nivel de disco
+CACHE_DIRNAME = 'result_cache'
+HASH_CHUNK_BYTES = 1024 * 1024
+_CACHE_KEY_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+class ResultCache:
+    """Caché de dos niveles (LRU en memoria + disco) para los resultados de los análisis."""
+
+    def __init__(self, app=None):
+        self.cache_dir: Optional[Path] = None
+        self.memory_items = DEFAULT_CACHE_MEMORY_ITEMS
+        self.max_bytes = DEFAULT_CACHE_MAX_BYTES
+        self.code_version = ''
+        self._memory: 'OrderedDict[str, Tuple[Any, Dict[str, Any]]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'puts': 0, 'evictions': 0, 'errors': 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        """Lee la configuración (RESULT_CACHE_FOLDER, RESULT_CACHE_MEMORY_ITEMS, RESULT_CACHE_MAX_BYTES, APP_VERSION)."""
+        self.cache_dir = Path(app.config.get('RESULT_CACHE_FOLDER') or Path(app.instance_path) / CACHE_DIRNAME)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.memory_items = int(app.config.get('RESULT_CACHE_MEMORY_ITEMS', DEFAULT_CACHE_MEMORY_ITEMS))
+        self.max_bytes = int(app.config.get('RESULT_CACHE_MAX_BYTES', DEFAULT_CACHE_MAX_BYTES))
+        self.code_version = f"{app.config.get('APP_VERSION', '')}/{CACHE_FORMAT_VERSION}"
+        app.extensions['result_cache'] = self
+        logger.info(f"ResultCache inicializada: {self.memory_items} entradas en memoria, "
+                    f"máx. {self.max_bytes / 1024 ** 2:.0f} MB en disco, dir '{self.cache_dir}'.")
+
+    # --- Claves ---
+
+    def make_key(self, file_hash: str, analysis_type: str, params: Optional[Dict[str, Any]] = None) -> str:
+        """Clave estable para (hash del archivo, tipo de análisis, parámetros, versión del código)."""
+        material = json.dumps({'file': file_hash, 'type': analysis_type, 'params': params or {},
+                               'version': self.code_version}, sort_keys=True, default=str)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def key_for_file(self, filepath: Union[str, Path], analysis_type: str,
+                     params: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """Como make_key, calculando el hash del archivo. None si no se puede leer (sin caché)."""
+        try:
+            return self.make_key(file_sha256(filepath), analysis_type, params)
+        except OSError as e:
+            logger.warning(f"No se pudo calcular el hash de '{filepath}' para la caché: {e}")
+            return None
+
+    # --- API pública ---
+
+    def get(self, key: Optional[str]) -> Optional[Tuple[Any, Dict[str, Any]]]:
+        """(resultado, meta) si la clave está en memoria o en disco; None si no."""
+        if not self._valid_key(key):
+            return None
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self._count('memory_hits')
+                return entry
+
+        entry = self._load_from_disk(key)
+        with self._lock:
+            if entry is None:
+                self._count('misses')
+                return None
+            self._count('disk_hits')
+            self._remember(key, entry)
+        return entry
+
+    def get_index(self, key: Optional[str]) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """(índice, meta) del resultado sin deserializarlo (memoria o manifest en disco); None si no está."""
+        if not self._valid_key(key):
+            return None
+        with self._lock:
+            entry = self._memory.get(key)
+        if entry is not None:
+            return (result_index(entry[0]), entry[1]) if isinstance(entry[0], dict) else None
+        try:
+            index, meta = read_result_index(self._entry_dir(key))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Manifest de la entrada de caché '{key[:12]}' no legible: {e}")
+            return None
+        return (index, meta) if index is not None else None
+
+    def contains(self, key: Optional[str]) -> bool:
+        """Comprobación barata (sin deserializar) de si la clave está en caché."""
+        if not self._valid_key(key):
+            return False
+        with self._lock:
+            if key in self._memory:
+                return True
+        return (self._entry_dir(key) / MANIFEST_FILENAME).is_file()
+
+    def put(self, key: Optional[str], value: Any, meta: Optional[Dict[str, Any]] = None) -> None:
+        """Guarda el resultado en ambos niveles. Los fallos de escritura se registran y no se propagan."""
+        if not self._valid_key(key):
+            return
+        meta = dict(meta or {}, cached_at=time.time())
+        with self._lock:
+            self._remember(key, (value, meta))
+            self._count('puts')
+        try:
+            self._store_on_disk(key, value, meta)
+            self._evict_disk()
+        except Exception as e:
+            with self._lock:
+                self._count('errors')
+            logger.error(f"No se pudo guardar el resultado '{key[:12]}' en la caché de disco: {e}", exc_info=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores de aciertos/fallos (de este proceso; agregados de todos en /metrics) y ocupación de memoria."""
+        with self._lock:
+            stats = dict(self._stats, memory_items=len(self._memory))
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_ratio'] = round((stats['memory_hits'] + stats['disk_hits']) / lookups, 3) if lookups else None
+        return stats
+
+    # --- Internos: memoria ---
+
+    def _valid_key(self, key: Optional[str]) -> bool:
+        return self.cache_dir is not None and bool(key) and bool(_CACHE_KEY_RE.match(key))
+
+    def _count(self, event: str) -> None:
+        """Contador del proceso (stats) y de Prometheus (CACHE_EVENTS, agregado entre procesos)."""
+        self._stats[event] += 1
+        CACHE_EVENTS.labels(event).inc()
+
+    def _remember(self, key: str, entry: Tuple[Any, Dict[str, Any]]) -> None:
+        """Inserta en la LRU de memoria (llamar con el lock tomado)."""
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    # --- Internos: disco ---
+
+    def _entry_dir(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / key
+
+    def _store_on_disk(self, key: str, value: Any, meta: Dict[str, Any]) -> None:
+        """Escribe las partes en un directorio temporal y lo renombra (los lectores nunca ven una entrada a medias)."""
+        final_dir = self._entry_dir(key)
+        if (final_dir / MANIFEST_FILENAME).is_file():
+            return
+        final_dir.parent.mkdir(parents=True, exist_ok=True)
+        tmp_dir = Path(tempfile.mkdtemp(dir=final_dir.parent, prefix=f".{key[:12]}."))
+        try:
+            write_result_artifacts(tmp_dir, value, meta)
+            try:
+                os.replace(tmp_dir, final_dir)
+            except OSError:
+                # Otro proceso guardó la misma entrada a la vez: la suya es equivalente
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+    def _load_from_disk(self, key: str) -> Optional[Tuple[Any, Dict[str, Any]]]:
+        entry_dir = self._entry_dir(key)
+        try:
+            entry = read_result_artifacts(entry_dir)
+            os.utime(entry_dir / MANIFEST_FILENAME)  # Marca de uso reciente para el desalojo LRU en disco
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Entrada de caché '{key[:12]}' ilegible; se descarta: {e}")
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            return None
+        return entry
+
+    def _evict_disk(self) -> None:
+        """Borra las entradas menos usadas recientemente hasta quedar bajo max_bytes."""
+        entries = []
+        total = 0
+        for manifest_path in self.cache_dir.glob(f"*/*/{MANIFEST_FILENAME}"):
+            entry_dir = manifest_path.parent
+            try:
+                size = artifacts_size(entry_dir)
+                entries.append((manifest_path.stat().st_mtime, size, entry_dir))
+            except OSError:
+                continue
+            total += size
+        if total <= self.max_bytes:
+            return
+        for _, size, entry_dir in sorted(entries, key=lambda item: item[0]):
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            with self._lock:
+                self._memory.pop(entry_dir.name, None)
+                self._count('evictions')
+            total -= size
+            logger.info(f"Caché: entrada '{entry_dir.name[:12]}' desalojada ({size / 1024:.0f} KB).")
+            if total <= self.max_bytes:
+                break
+
+
+# Instancia global (inicialización diferida con init_app)
+result_cache = ResultCache()
+
+
+# --- Funciones Auxiliares ---
+
+def file_sha256(filepath: Union[str, Path]) -> str:
+    """SHA-256 del contenido del archivo, leído por bloques (memoizado por ruta, tamaño y mtime)."""
+    stat = os.stat(filepath)
+    return _file_sha256(str(filepath), stat.st_size, stat.st_mtime_ns)
+
+@lru_cache(maxsize=256)
+def _file_sha256(filepath: str, size: int, mtime_ns: int) -> str:
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as fh:
+        for block in iter(lambda: fh.read(HASH_CHUNK_BYTES), b''):
+            digest.update(block)
+    return digest.hexdigest()
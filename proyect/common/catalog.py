@@ -0,0 +1,258 @@
+# pricing_dashboard/proyect/common/catalog.py
+# -*- coding: utf-8 -*-
+"""
+Catálogo persistente de análisis (tabla analysis_catalog en SQLite).
+
+Cada ejecución enviada desde /process queda registrada con el hash del archivo
+de entrada, los parámetros, los tiempos (cola y ejecución) y la ruta de sus
+artefactos (instance/artifacts/<id>/, formato de proyect.common.artifacts).
+Al terminar el trabajo, un listener de JobManager guarda los artefactos y
+actualiza la fila; reabrir un análisis pasado es una consulta de metadatos más
+la carga de sus artefactos, sin recalcular.
+
+Los artefactos son la copia duradera del resultado: una vez escritos se borra el
+result.pkl del trabajo. Se conservan ARTIFACTS_RETENTION segundos y, en total,
+hasta ARTIFACTS_MAX_BYTES; los más antiguos se borran al guardar uno nuevo (la
+fila del catálogo se conserva, sin artefactos).
+
+Uso (igual que otras extensiones Flask; requiere db y jobs inicializados):
+    analysis_catalog.init_app(app)
+    analysis_catalog.record_submission(job_id, 'moca', filename, filepath)
+    page = analysis_catalog.query(page=1, analysis_type='moca', status='done')
+"""
+
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+from proyect.common.artifacts import artifacts_size, read_result_artifacts, read_result_index, write_result_artifacts
+from proyect.common.cache import file_sha256
+from proyect.common.db import DEFAULT_PER_PAGE, Pagination, connect, get_db, paginate, register_schema
+from proyect.common.history import current_owner_id
+from proyect.common.jobs import jobs, JOB_DONE, JOB_FAILED, JOB_QUEUED
+from proyect.common.memory import MB
+
+logger = logging.getLogger(__name__)
+
+# --- Constantes y Configuraciones ---
+ARTIFACTS_DIRNAME = 'artifacts'
+DEFAULT_ARTIFACTS_MAX_BYTES = 2 * 1024 * 1024 * 1024  # Tamaño total de instance/artifacts (0: sin límite)
+DEFAULT_ARTIFACTS_RETENTION = 90 * 24 * 3600          # Segundos que se conservan los artefactos (0: sin límite)
+CATALOG_STATUSES = (JOB_QUEUED, JOB_DONE, JOB_FAILED)
+
+CATALOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS analysis_catalog (
+    id             TEXT PRIMARY KEY,            -- job_id del trabajo en segundo plano
+    owner_id       TEXT NOT NULL,
+    analysis_type  TEXT NOT NULL,
+    filename       TEXT,
+    input_hash     TEXT,
+    params_json    TEXT NOT NULL DEFAULT '{}',
+    cache_key      TEXT,
+    status         TEXT NOT NULL,
+    error          TEXT,
+    created_at     REAL NOT NULL,
+    started_at     REAL,
+    finished_at    REAL,
+    queue_seconds  REAL,
+    run_seconds    REAL,
+    artifact_path  TEXT,
+    artifact_bytes INTEGER
+);
+CREATE INDEX IF NOT EXISTS ix_catalog_owner_time ON analysis_catalog (owner_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS ix_catalog_owner_type_time ON analysis_catalog (owner_id, analysis_type, created_at DESC);
+CREATE INDEX IF NOT EXISTS ix_catalog_owner_status_time ON analysis_catalog (owner_id, status, created_at DESC);
+CREATE INDEX IF NOT EXISTS ix_catalog_input_hash ON analysis_catalog (input_hash);
+"""
+register_schema(CATALOG_SCHEMA)
+
+
+class AnalysisCatalog:
+    """Registro de ejecuciones de análisis con sus artefactos en disco."""
+
+    def __init__(self, app=None):
+        self.artifacts_dir: Optional[Path] = None
+        self.db_path: Optional[str] = None
+        self.max_bytes = DEFAULT_ARTIFACTS_MAX_BYTES
+        self.retention = DEFAULT_ARTIFACTS_RETENTION
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        """Lee ARTIFACTS_FOLDER, ARTIFACTS_MAX_BYTES y ARTIFACTS_RETENTION y se suscribe al fin de los trabajos (db.init_app y jobs.init_app antes)."""
+        db_extension = app.extensions.get('db')
+        if db_extension is None or 'jobs' not in app.extensions:
+            raise RuntimeError("AnalysisCatalog requiere db.init_app(app) y jobs.init_app(app) previos.")
+        self.db_path = db_extension.path
+        self.artifacts_dir = Path(app.config.get('ARTIFACTS_FOLDER') or Path(app.instance_path) / ARTIFACTS_DIRNAME)
+        self.artifacts_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max(0, int(app.config.get('ARTIFACTS_MAX_BYTES', DEFAULT_ARTIFACTS_MAX_BYTES)))
+        self.retention = max(0, int(app.config.get('ARTIFACTS_RETENTION', DEFAULT_ARTIFACTS_RETENTION)))
+        jobs.add_finish_listener(self._record_finished_job)
+        app.extensions['analysis_catalog'] = self
+        logger.info(f"Catálogo de análisis inicializado (artefactos en '{self.artifacts_dir}').")
+
+    # --- API pública (contexto de petición) ---
+
+    def record_submission(self, job_id: str, analysis_type: str, filename: Optional[str],
+                          filepath: Union[str, Path], params: Optional[Dict[str, Any]] = None,
+                          cache_key: Optional[str] = None) -> None:
+        """Registra un análisis recién enviado a la cola. Un fallo aquí no impide el análisis."""
+        try:
+            input_hash = file_sha256(filepath)
+        except OSError:
+            input_hash = None
+        try:
+            conn = get_db()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO analysis_catalog (id, owner_id, analysis_type, filename, input_hash, "
+                    "params_json, cache_key, status, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, current_owner_id(), analysis_type, filename, input_hash,
+                     json.dumps(params or {}, sort_keys=True, default=str), cache_key, JOB_QUEUED, time.time()))
+        except Exception as e:
+            logger.error(f"No se pudo registrar el análisis {job_id} en el catálogo: {e}", exc_info=True)
+
+    def get(self, analysis_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Metadatos de un análisis o None. Devuelve las mismas llaves que el estado de
+        un trabajo (job_id, analysis_type, filename, status, error, cache_key...) y
+        los parámetros también en el nivel superior, para que las rutas de resultados
+        puedan usarlo cuando el estado del trabajo ya no exista.
+        """
+        row = get_db().execute("SELECT * FROM analysis_catalog WHERE id = ?", (analysis_id,)).fetchone()
+        return _row_to_entry(row) if row is not None else None
+
+    def load_results(self, analysis_id: str) -> Optional[Any]:
+        """Resultado desde los artefactos del catálogo; None si no hay artefactos legibles."""
+        entry = self.get(analysis_id)
+        if entry is None or entry['status'] != JOB_DONE or not entry.get('artifact_path'):
+            return None
+        try:
+            results, _ = read_result_artifacts(Path(entry['artifact_path']))
+            return results
+        except Exception as e:
+            logger.warning(f"Artefactos del análisis {analysis_id} no legibles: {e}")
+            return None
+
+    def load_index(self, analysis_id: str) -> Optional[Dict[str, Any]]:
+        """Índice del resultado (tablas, gráficos, insights) desde el manifest de sus artefactos; None si no hay."""
+        entry = self.get(analysis_id)
+        if entry is None or entry['status'] != JOB_DONE or not entry.get('artifact_path'):
+            return None
+        try:
+            return read_result_index(Path(entry['artifact_path']))[0]
+        except Exception as e:
+            logger.warning(f"Manifest del análisis {analysis_id} no legible: {e}")
+            return None
+
+    def query(self, page: int = 1, per_page: int = DEFAULT_PER_PAGE, analysis_type: Optional[str] = None,
+              status: Optional[str] = None, date_from: Optional[datetime] = None,
+              date_to: Optional[datetime] = None) -> Pagination:
+        """Análisis del usuario actual, más recientes primero, con filtros opcionales (usa los índices por owner)."""
+        from_clause = "FROM analysis_catalog WHERE owner_id = ?"
+        params: list = [current_owner_id()]
+        if analysis_type:
+            from_clause += " AND analysis_type = ?"
+            params.append(analysis_type)
+        if status:
+            from_clause += " AND status = ?"
+            params.append(status)
+        if date_from:
+            from_clause += " AND created_at >= ?"
+            params.append(date_from.timestamp())
+        if date_to:
+            from_clause += " AND created_at < ?"
+            params.append(date_to.timestamp())
+        pagination = paginate(get_db(), from_clause, params, page=page, per_page=per_page,
+                              order_by="ORDER BY created_at DESC")
+        pagination.items = [_row_to_entry(row) for row in pagination.items]
+        return pagination
+
+    # --- Listener de fin de trabajo (hilo del pool, sin contexto de Flask) ---
+
+    def _record_finished_job(self, job_id: str, status: Dict[str, Any]) -> None:
+        artifact_path, artifact_bytes = None, None
+        if status.get('status') == JOB_DONE:
+            artifact_path, artifact_bytes = self._store_artifacts(job_id, status)
+        started_at, finished_at, created_at = status.get('started_at'), status.get('finished_at'), status.get('created_at')
+        conn = connect(self.db_path)
+        try:
+            with conn:
+                updated = conn.execute(
+                    "UPDATE analysis_catalog SET status = ?, error = ?, started_at = ?, finished_at = ?, "
+                    "queue_seconds = ?, run_seconds = ?, artifact_path = ?, artifact_bytes = ? WHERE id = ?",
+                    (status.get('status'), status.get('error'), started_at, finished_at,
+                     _elapsed(created_at, started_at), _elapsed(started_at, finished_at),
+                     artifact_path, artifact_bytes, job_id)).rowcount
+            if artifact_path is not None and updated:
+                jobs.discard_result(job_id)  # Los artefactos (ya registrados) pasan a ser la única copia del resultado
+                self._prune_artifacts(conn, keep_id=job_id)
+        finally:
+            conn.close()
+        logger.info(f"Catálogo: análisis {job_id} registrado como '{status.get('status')}'.")
+
+    def _prune_artifacts(self, conn: sqlite3.Connection, keep_id: str) -> None:
+        """Borra los artefactos más antiguos que `retention` y, después, los más antiguos hasta quedar bajo `max_bytes`."""
+        rows = conn.execute("SELECT id, artifact_path, artifact_bytes, finished_at FROM analysis_catalog "
+                            "WHERE artifact_path IS NOT NULL AND id != ? ORDER BY finished_at", (keep_id,)).fetchall()
+        total = sum(row['artifact_bytes'] or 0 for row in rows)
+        total += conn.execute("SELECT COALESCE(artifact_bytes, 0) FROM analysis_catalog WHERE id = ?", (keep_id,)).fetchone()[0]
+        cutoff = time.time() - self.retention if self.retention else None
+        expired = []
+        for row in rows:  # Más antiguos primero
+            too_old = cutoff is not None and (row['finished_at'] or 0) < cutoff
+            if not too_old and (not self.max_bytes or total <= self.max_bytes):
+                break
+            expired.append(row)
+            total -= row['artifact_bytes'] or 0
+        if not expired:
+            return
+        for row in expired:
+            path = Path(row['artifact_path'])
+            if path.parent.resolve() == self.artifacts_dir.resolve():  # Nunca fuera del directorio de artefactos
+                shutil.rmtree(path, ignore_errors=True)
+        with conn:
+            conn.executemany("UPDATE analysis_catalog SET artifact_path = NULL, artifact_bytes = NULL WHERE id = ?",
+                             [(row['id'],) for row in expired])
+        logger.info(f"Catálogo: artefactos de {len(expired)} análisis antiguo(s) borrados "
+                    f"({sum(row['artifact_bytes'] or 0 for row in expired) / MB:.1f} MB).")
+
+    def _store_artifacts(self, job_id: str, status: Dict[str, Any]):
+        """Copia el resultado del trabajo a instance/artifacts/<job_id>/ (escritura atómica por renombrado)."""
+        final_dir = self.artifacts_dir / job_id
+        tmp_dir = Path(tempfile.mkdtemp(dir=self.artifacts_dir, prefix=f".{job_id}."))
+        try:
+            meta = {'analysis_type': status.get('analysis_type'), 'filename': status.get('filename')}
+            write_result_artifacts(tmp_dir, jobs.load_result(job_id), meta)
+            os.replace(tmp_dir, final_dir)
+        except Exception as e:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            logger.error(f"No se pudieron guardar los artefactos del análisis {job_id}: {e}", exc_info=True)
+            return None, None
+        return str(final_dir), artifacts_size(final_dir)
+
+
+# Instancia global (inicialización diferida con init_app)
+analysis_catalog = AnalysisCatalog()
+
+
+# --- Funciones Auxiliares ---
+
+def _row_to_entry(row) -> Dict[str, Any]:
+    entry = dict(row)
+    params = json.loads(entry.pop('params_json') or '{}')
+    entry.pop('owner_id', None)
+    entry = {**params, **entry, 'params': params, 'job_id': entry['id']}
+    entry['created_date'] = datetime.fromtimestamp(entry['created_at'])
+    return entry
+
+def _elapsed(start: Optional[float], end: Optional[float]) -> Optional[float]:
+    return round(end - start, 3) if start is not None and end is not None else None
@@ -0,0 +1,281 @@
+# pricing_dashboard/proyect/common/charts.py
+# -*- coding: utf-8 -*-
+"""
+Helpers compartidos para construir trazas Plotly de mapas de puntos (PVM).
+
+El modo de renderizado se elige según el número de puntos:
+- 'svg':     trazas `scatter` con etiqueta en cada punto (comportamiento original).
+- 'webgl':   trazas `scattergl` sin etiquetas; solo se etiquetan los top-k outliers.
+- 'density': agregación 2D en el servidor (celdas de una rejilla), dibujada con
+             `scattergl` con tamaño proporcional al número de puntos por celda.
+
+Así el tamaño del JSON y el coste de render en el navegador quedan acotados
+aunque el estudio tenga miles de entidades.
+
+Además, encode_figure/plotly_payload codifican las figuras para incrustarlas en
+las páginas: los arrays numéricos largos viajan como typed arrays en base64
+({'dtype': 'f4', 'bdata': ...}, la forma que acepta Plotly.js) y los arrays
+repetidos entre trazas (p.ej. las categorías del eje x) se envían una sola vez
+en 'shared'. hydratePlotlyFigure (layout.html) los reconstruye en el navegador.
+"""
+
+import base64
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from jinja2.utils import htmlsafe_json_dumps
+from markupsafe import Markup
+
+logger = logging.getLogger(__name__)
+
+# --- Constantes y Configuraciones ---
+RENDER_SVG = 'svg'
+RENDER_WEBGL = 'webgl'
+RENDER_DENSITY = 'density'
+
+PVM_SVG_MAX_POINTS = 300       # Hasta aquí: SVG con etiqueta por punto
+PVM_WEBGL_MAX_POINTS = 20_000  # Hasta aquí: WebGL punto a punto; por encima, densidad
+PVM_LABEL_TOP_K = 20           # Outliers etiquetados en modos WebGL/densidad
+PVM_DENSITY_BINS = 60          # Celdas por eje en el modo densidad
+PVM_DENSITY_MAX_MARKER = 28    # Diámetro máximo (px) de una celda en el modo densidad
+
+PAYLOAD_ENCODING = 'typed-v1'  # Marca de figura codificada (la reconoce hydratePlotlyFigure)
+TYPED_ARRAY_MIN_LENGTH = 32    # Arrays numéricos más cortos quedan como lista JSON
+SHARED_ARRAY_MIN_LENGTH = 8    # Longitud mínima para deduplicar un array repetido entre trazas
+TYPED_ARRAY_KEYS = ('x', 'y', 'z', 'marker.size', 'marker.color', 'marker.opacity', 'error_x.array', 'error_y.array')
+SHARED_ARRAY_KEYS = TYPED_ARRAY_KEYS + ('text', 'hovertext', 'customdata', 'labels')
+_MAX_FLOAT32_DECIMALS = 6
+
+
+def select_render_mode(n_points: int) -> str:
+    """Devuelve el modo de renderizado adecuado para `n_points` puntos."""
+    if n_points <= PVM_SVG_MAX_POINTS:
+        return RENDER_SVG
+    if n_points <= PVM_WEBGL_MAX_POINTS:
+        return RENDER_WEBGL
+    return RENDER_DENSITY
+
+
+def top_k_outlier_mask(deviation: np.ndarray, k: int = PVM_LABEL_TOP_K) -> np.ndarray:
+    """Máscara booleana de los k puntos con mayor |desviación| (argpartition, O(n))."""
+    deviation = np.abs(np.asarray(deviation, dtype='float64'))
+    mask = np.zeros(len(deviation), dtype=bool)
+    if k <= 0 or len(deviation) == 0:
+        return mask
+    if k >= len(deviation):
+        mask[:] = True
+        return mask
+    deviation = np.nan_to_num(deviation, nan=-np.inf)
+    mask[np.argpartition(deviation, -k)[-k:]] = True
+    return mask
+
+
+def build_point_traces(x: Sequence[float], y: Sequence[float], labels: Sequence[Any],
+                       deviation: Sequence[float], groups: Sequence[Any],
+                       group_colors: Dict[Any, str], marker_size: int = 10,
+                       mode: Optional[str] = None) -> Tuple[List[Dict[str, Any]], str]:
+    """
+    Construye las trazas de puntos de un mapa Precio-Valor según el modo de render.
+
+    Args:
+        x, y: Coordenadas de cada punto.
+        labels: Etiqueta de cada punto (entidad/atributo).
+        deviation: Desviación usada para elegir los outliers etiquetados (p.ej. Value_Deviation).
+        groups: Grupo de cada punto (zona); cada grupo genera su propia traza/leyenda.
+        group_colors: Orden y color de los grupos a dibujar.
+        marker_size: Tamaño de marcador en modos SVG/WebGL.
+        mode: Fuerza un modo concreto; por defecto se elige con select_render_mode.
+
+    Returns:
+        Tuple[List[Dict], str]: Trazas Plotly y modo de render usado.
+    """
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+    labels = np.asarray(labels, dtype=object)
+    groups = np.asarray(groups, dtype=object)
+    mode = mode or select_render_mode(len(x))
+
+    traces: List[Dict[str, Any]] = []
+    density_edges = _density_edges(x, y) if mode == RENDER_DENSITY else None
+    for group, color in group_colors.items():
+        mask = groups == group
+        if not mask.any():
+            continue
+        if mode == RENDER_SVG:
+            traces.append({
+                'type': 'scatter', 'mode': 'markers+text',
+                'x': x[mask].tolist(), 'y': y[mask].tolist(),
+                'text': labels[mask].tolist(), 'textposition': 'top right',
+                'marker': {'color': color, 'size': marker_size}, 'name': str(group)
+            })
+        elif mode == RENDER_WEBGL:
+            traces.append({
+                'type': 'scattergl', 'mode': 'markers',
+                'x': x[mask].tolist(), 'y': y[mask].tolist(),
+                'hovertext': labels[mask].tolist(), 'hoverinfo': 'text+x+y',
+                'marker': {'color': color, 'size': max(4, marker_size // 2), 'opacity': 0.7},
+                'name': str(group)
+            })
+        else:
+            traces.append(_density_trace(x[mask], y[mask], density_edges, color, str(group)))
+
+    if mode != RENDER_SVG:
+        outliers = top_k_outlier_mask(deviation)
+        if outliers.any():
+            traces.append({
+                'type': 'scatter', 'mode': 'markers+text',
+                'x': x[outliers].tolist(), 'y': y[outliers].tolist(),
+                'text': labels[outliers].tolist(), 'textposition': 'top right',
+                'marker': {'color': 'rgba(0,0,0,0)', 'size': marker_size, 'line': {'color': '#333333', 'width': 1}},
+                'name': f'Top {int(outliers.sum())} desviaciones'
+            })
+
+    logger.debug(f"Trazas de puntos construidas: {len(x)} puntos, modo '{mode}', {len(traces)} trazas.")
+    return traces, mode
+
+
+def _density_edges(x: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Bordes comunes de la rejilla para que todas las zonas compartan celdas."""
+    x_edges = np.linspace(np.nanmin(x), np.nanmax(x), PVM_DENSITY_BINS + 1)
+    y_edges = np.linspace(np.nanmin(y), np.nanmax(y), PVM_DENSITY_BINS + 1)
+    return x_edges, y_edges
+
+
+def _density_trace(x: np.ndarray, y: np.ndarray, edges: Tuple[np.ndarray, np.ndarray],
+                   color: str, name: str) -> Dict[str, Any]:
+    """Agrega puntos en celdas 2D y devuelve una traza con una marca por celda no vacía."""
+    x_edges, y_edges = edges
+    counts, _, _ = np.histogram2d(x, y, bins=[x_edges, y_edges])
+    ix, iy = np.nonzero(counts)
+    cell_counts = counts[ix, iy]
+    x_centers = (x_edges[:-1] + x_edges[1:]) / 2
+    y_centers = (y_edges[:-1] + y_edges[1:]) / 2
+    max_count = float(cell_counts.max()) if len(cell_counts) else 1.0
+    return {
+        'type': 'scattergl', 'mode': 'markers',
+        'x': x_centers[ix].tolist(), 'y': y_centers[iy].tolist(),
+        'hovertext': [f"{name}: {int(c)} puntos" for c in cell_counts], 'hoverinfo': 'text',
+        'marker': {'color': color, 'opacity': 0.6, 'size': cell_counts.tolist(), 'sizemode': 'area',
+                   'sizeref': 2.0 * max_count / PVM_DENSITY_MAX_MARKER ** 2, 'sizemin': 3},
+        'name': name
+    }
+
+
+# --- Codificación compacta de figuras (typed arrays + arrays compartidos) ---
+
+def encode_figure(figure: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Devuelve una copia de la figura con los arrays numéricos largos en base64
+    (float32 si la precisión de los datos lo permite, si no float64; enteros con el
+    tipo más pequeño que los contiene) y los arrays repetidos movidos a 'shared'
+    (referenciados como {'$ref': 'a0'}). Figuras sin 'data' se devuelven tal cual.
+    """
+    if not isinstance(figure, dict) or not isinstance(figure.get('data'), list):
+        return figure
+    shared: Dict[str, Any] = {}
+    refs: Dict[Tuple[str, str], str] = {}
+    counts: Dict[Tuple[str, str], int] = {}
+    encoded_cache: Dict[int, Any] = {}  # Mismo objeto lista en varias trazas -> se codifica una vez
+
+    def encoded(values: Any) -> Tuple[Any, Optional[Tuple[str, str]]]:
+        cached = encoded_cache.get(id(values))
+        if cached is None:
+            spec = encode_array(values)
+            fingerprint = (spec['bdata'] if isinstance(spec, dict) else repr(values))
+            cached = encoded_cache[id(values)] = (spec, (type(spec).__name__, fingerprint))
+        return cached
+
+    # Primer pase: codificar y contar repeticiones
+    traces = []
+    for trace in figure['data']:
+        trace = _copy_nested(trace, SHARED_ARRAY_KEYS)
+        for path in SHARED_ARRAY_KEYS:
+            values = _get_path(trace, path)
+            if not isinstance(values, (list, tuple, np.ndarray)):
+                continue
+            spec, fingerprint = encoded(values) if path in TYPED_ARRAY_KEYS else (list(values), ('list', repr(values)))
+            _set_path(trace, path, spec)
+            if len(values) >= SHARED_ARRAY_MIN_LENGTH:
+                counts[fingerprint] = counts.get(fingerprint, 0) + 1
+                trace.setdefault('__fingerprints__', {})[path] = fingerprint
+        traces.append(trace)
+
+    # Segundo pase: los arrays que aparecen más de una vez se envían una sola vez
+    for trace in traces:
+        for path, fingerprint in trace.pop('__fingerprints__', {}).items():
+            if counts[fingerprint] < 2:
+                continue
+            if fingerprint not in refs:
+                refs[fingerprint] = f"a{len(refs)}"
+                shared[refs[fingerprint]] = _get_path(trace, path)
+            _set_path(trace, path, {'$ref': refs[fingerprint]})
+
+    result = dict(figure, data=traces, encoding=PAYLOAD_ENCODING)
+    if shared:
+        result['shared'] = shared
+    return result
+
+def encode_array(values: Any) -> Any:
+    """Array numérico largo -> {'dtype', 'bdata'}; el resto (cortos, texto, mixtos) -> lista."""
+    if len(values) < TYPED_ARRAY_MIN_LENGTH:
+        return list(values) if not isinstance(values, list) else values
+    try:
+        array = np.asarray(values)
+    except (ValueError, TypeError):
+        return list(values)
+    if array.ndim != 1 or array.dtype.kind not in 'iufb':
+        return values if isinstance(values, list) else array.tolist()
+    array = _compact_dtype(array)
+    return {'dtype': array.dtype.str.lstrip('<>|='), 'bdata': base64.b64encode(array.astype(array.dtype.newbyteorder('<')).tobytes()).decode('ascii')}
+
+def plotly_payload(figure: Optional[Dict[str, Any]]) -> Markup:
+    """Filtro Jinja: figura codificada como JSON seguro para incrustar en <script> (o 'null')."""
+    return htmlsafe_json_dumps(encode_figure(figure) if figure else None, separators=(',', ':'))
+
+
+# --- Funciones Auxiliares de codificación ---
+
+def _compact_dtype(array: np.ndarray) -> np.ndarray:
+    """float32 si conserva los decimales de los datos; enteros al tipo más pequeño soportado por Plotly."""
+    if array.dtype.kind == 'b':
+        return array.astype('u1')
+    if array.dtype.kind in 'iu':
+        if array.size == 0:
+            return array.astype('i4')
+        low, high = int(array.min()), int(array.max())
+        for dtype in ('u1', 'i1', 'u2', 'i2', 'u4', 'i4'):
+            info = np.iinfo(dtype)
+            if info.min <= low and high <= info.max:
+                return array.astype(dtype)
+        return array.astype('f8')
+    array = array.astype('f8')
+    finite = array[np.isfinite(array)]
+    single = finite.astype('f4').astype('f8')
+    for decimals in range(_MAX_FLOAT32_DECIMALS + 1):
+        if np.array_equal(np.round(finite, decimals), finite):
+            # Datos con `decimals` decimales: float32 sirve si al redondear se recuperan exactos
+            return array.astype('f4') if np.array_equal(np.round(single, decimals), finite) else array
+    return array
+
+def _get_path(trace: Dict[str, Any], path: str) -> Any:
+    node: Any = trace
+    for part in path.split('.'):
+        if not isinstance(node, dict):
+            return None
+        node = node.get(part)
+    return node
+
+def _set_path(trace: Dict[str, Any], path: str, value: Any) -> None:
+    *parents, leaf = path.split('.')
+    node = trace
+    for part in parents:
+        node = node[part]
+    node[leaf] = value
+
+def _copy_nested(trace: Dict[str, Any], paths: Sequence[str]) -> Dict[str, Any]:
+    """Copia la traza y los dicts anidados que se van a modificar (la figura original no se toca)."""
+    trace = dict(trace)
+    for parent in {path.split('.')[0] for path in paths if '.' in path}:
+        if isinstance(trace.get(parent), dict):
+            trace[parent] = dict(trace[parent])
+    return trace
@@ -0,0 +1,197 @@
+# pricing_dashboard/proyect/common/compression.py
+# -*- coding: utf-8 -*-
+"""
+Compresión de respuestas y GET condicional.
+
+Compresión (after_request, última en ejecutarse):
+- Codificación según Accept-Encoding del cliente: brotli ('br', si está instalado
+  el paquete `brotli`), zstd (paquete `zstandard`) o gzip (biblioteca estándar).
+- Solo tipos de texto (HTML, JSON, CSV, JS, CSS, SVG) y cuerpos de al menos
+  COMPRESS_MIN_BYTES. Los formatos ya comprimidos (XLSX, ZIP, Parquet, PNG, PDF) y
+  los eventos SSE se envían tal cual.
+- Las respuestas en streaming (render_streamed, exportaciones) se comprimen por
+  bloques con un flush por bloque, sin acumularlas en memoria.
+- Un ETag fuerte pasa a débil al comprimir (la representación cambia); If-None-Match
+  usa comparación débil, así que los 304 siguen funcionando.
+
+GET condicional:
+- Respuestas no streaming con ETag o Last-Modified: `make_conditional` (304).
+- Páginas de resultados: `check_not_modified(...)` en la vista devuelve un 304
+  antes de cargar el resultado si el cliente ya tiene la página; si no, el ETag y
+  Last-Modified se añaden a la respuesta final.
+
+Uso (igual que otras extensiones Flask):
+    compression = Compression()             # instancia global (este módulo)
+    compression.init_app(app)               # en initialize_extensions
+"""
+
+import gzip
+import hashlib
+import logging
+import zlib
+from datetime import datetime, timezone
+from typing import Callable, Iterable, Iterator, Optional, Tuple
+
+from flask import Response, current_app, g, request, session
+
+try:
+    import brotli
+except ImportError:  # Opcional: pip install brotli
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # Opcional: pip install zstandard
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# --- Constantes y Configuraciones ---
+DEFAULT_COMPRESS_MIN_BYTES = 1024            # Por debajo no compensa (cabeceras + CPU)
+DEFAULT_COMPRESS_ALGORITHMS = ('br', 'zstd', 'gzip')  # Preferencia del servidor ante calidades iguales
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5                           # Calidad media: buena relación para respuestas dinámicas
+ZSTD_LEVEL = 3
+COMPRESSIBLE_MIMETYPES = {
+    'text/html', 'text/plain', 'text/css', 'text/csv', 'text/javascript', 'application/javascript',
+    'application/json', 'application/xml', 'image/svg+xml',
+}
+CONDITIONAL_CACHE_CONTROL = 'private, no-cache'  # Revalidar siempre (304 si no ha cambiado)
+
+
+class Compression:
+    """Compresión gzip/brotli/zstd de respuestas de texto y GET condicional (extensión Flask)."""
+
+    def __init__(self, app=None):
+        self.enabled = True
+        self.min_bytes = DEFAULT_COMPRESS_MIN_BYTES
+        self.algorithms: Tuple[str, ...] = ()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        """Lee la configuración (COMPRESS_ENABLED, COMPRESS_MIN_BYTES, COMPRESS_ALGORITHMS) y registra el hook."""
+        self.enabled = bool(app.config.get('COMPRESS_ENABLED', True))
+        self.min_bytes = int(app.config.get('COMPRESS_MIN_BYTES', DEFAULT_COMPRESS_MIN_BYTES))
+        wanted = app.config.get('COMPRESS_ALGORITHMS') or DEFAULT_COMPRESS_ALGORITHMS
+        if isinstance(wanted, str):
+            wanted = [name.strip() for name in wanted.split(',')]
+        self.algorithms = tuple(name for name in wanted if name in _available_encoders())
+        unavailable = [name for name in wanted if name not in self.algorithms]
+        if unavailable:
+            logger.info(f"Compresión: no disponibles {', '.join(unavailable)} (pip install brotli zstandard).")
+        app.after_request(self._after_request)
+        app.extensions['compression'] = self
+        logger.info(f"Compression inicializada: {', '.join(self.algorithms) or 'ninguna'}"
+                    f"{'' if self.enabled else ' (desactivada)'}, umbral {self.min_bytes} bytes.")
+
+    def _after_request(self, response: Response) -> Response:
+        _apply_conditional(response)
+        if response.status_code == 304 or not self.enabled:
+            return response
+        if response.mimetype not in COMPRESSIBLE_MIMETYPES:
+            return response
+        response.vary.add('Accept-Encoding')
+        if (request.method == 'HEAD' or response.status_code < 200 or response.status_code in (204, 206)
+                or response.direct_passthrough or 'Content-Encoding' in response.headers
+                or 'no-transform' in (response.headers.get('Cache-Control') or '')):
+            return response
+        encoding = request.accept_encodings.best_match(self.algorithms)
+        if not encoding:
+            return response
+
+        if response.is_streamed:
+            response.response = _iter_compressed(response.response, encoding)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < self.min_bytes:
+                return response
+            response.set_data(_compress(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+
+# Instancia global (inicialización diferida con init_app)
+compression = Compression()
+
+
+def check_not_modified(*identity: object, last_modified: Optional[float] = None) -> Optional[Response]:
+    """
+    GET condicional de una página cuyo contenido depende solo de `identity` (p.ej.
+    tipo de análisis y source_ref) y de la versión de la aplicación. Devuelve un 304
+    si el cliente ya la tiene; si no, None, y el ETag (y Last-Modified, timestamp)
+    se añaden a la respuesta que devuelva la vista. Con mensajes flash pendientes no
+    se aplica: la página no sería la misma.
+    """
+    if session.get('_flashes'):
+        return None
+    material = '|'.join(map(str, (current_app.config.get('APP_VERSION', ''),) + identity))
+    etag = hashlib.sha256(material.encode('utf-8')).hexdigest()[:32]
+    modified = datetime.fromtimestamp(int(last_modified), tz=timezone.utc) if last_modified else None
+    g._conditional = (etag, modified)
+
+    if request.if_none_match:
+        matched = request.if_none_match.contains_weak(etag)
+    else:
+        matched = bool(modified and request.if_modified_since and modified <= request.if_modified_since)
+    if not matched:
+        return None
+    response = Response(status=304)
+    _apply_conditional(response)
+    return response
+
+
+# --- Funciones Auxiliares ---
+
+def _apply_conditional(response: Response) -> None:
+    """Cabeceras de check_not_modified y 304 para respuestas no streaming con validadores."""
+    conditional = g.pop('_conditional', None)
+    if conditional is not None and response.status_code in (200, 304):
+        etag, modified = conditional
+        response.set_etag(etag)
+        if modified is not None:
+            response.last_modified = modified
+        response.headers['Cache-Control'] = CONDITIONAL_CACHE_CONTROL
+    if (request.method in ('GET', 'HEAD') and response.status_code == 200 and not response.is_streamed
+            and (response.headers.get('ETag') or response.last_modified)):
+        response.make_conditional(request)
+
+def _available_encoders() -> Tuple[str, ...]:
+    return tuple(name for name, module in (('br', brotli), ('zstd', zstandard), ('gzip', gzip)) if module is not None)
+
+def _compress(data: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+def _stream_compressor(encoding: str) -> Tuple[Callable[[bytes], bytes], Callable[[], bytes]]:
+    """(comprimir_bloque, finalizar): cada bloque sale completo (flush) para no retrasar el streaming."""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        return (lambda chunk: compressor.process(chunk) + compressor.flush()), compressor.finish
+    if encoding == 'zstd':
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+        return ((lambda chunk: compressor.compress(chunk) + compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)),
+                compressor.flush)
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # Cabecera gzip
+    return (lambda chunk: compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)), compressor.flush
+
+def _iter_compressed(chunks: Iterable, encoding: str) -> Iterator[bytes]:
+    compress_chunk, finish = _stream_compressor(encoding)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            if chunk:
+                yield compress_chunk(chunk)
+        yield finish()
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
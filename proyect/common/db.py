@@ -0,0 +1,164 @@
+# pricing_dashboard/proyect/common/db.py
+# -*- coding: utf-8 -*-
+"""
+Acceso a la base de datos SQLite de la aplicación (instance/pricing_data.db).
+
+Una conexión por petición (guardada en flask.g y cerrada en teardown), modo WAL
+para que varios procesos web lean mientras otro escribe. Cada módulo que usa
+tablas propias registra su esquema con register_schema() al importarse; los
+esquemas (CREATE ... IF NOT EXISTS) se aplican una vez por proceso y archivo.
+
+Uso (igual que otras extensiones Flask):
+    db.init_app(app)                          # en initialize_extensions
+    rows = get_db().execute('SELECT ...').fetchall()
+    page = paginate(get_db(), 'FROM tabla WHERE ...', params, page=2, per_page=20)
+"""
+
+import logging
+import math
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Set, Union
+
+from flask import g, current_app
+
+logger = logging.getLogger(__name__)
+
+# --- Constantes y Configuraciones ---
+DEFAULT_DB_FILENAME = 'pricing_data.db'
+SQLITE_TIMEOUT_SECONDS = 10.0   # Espera máxima por un lock de escritura de otro proceso
+DEFAULT_PER_PAGE = 20
+MAX_PER_PAGE = 100
+
+_SCHEMAS: List[str] = []
+_initialized_paths: Set[str] = set()
+_schema_lock = threading.Lock()
+
+
+def register_schema(sql: str) -> None:
+    """Registra DDL idempotente (CREATE TABLE/INDEX IF NOT EXISTS) que se aplicará al conectar."""
+    if sql not in _SCHEMAS:
+        _SCHEMAS.append(sql)
+        _initialized_paths.clear()  # Nuevo esquema: se vuelve a aplicar en la próxima conexión
+
+
+class Database:
+    """Extensión mínima: resuelve la ruta del archivo y cierra la conexión al final de cada petición."""
+
+    def __init__(self, app=None):
+        self.path: Optional[str] = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        """Lee DATABASE_PATH (por defecto instance/pricing_data.db) y registra el teardown."""
+        self.path = str(app.config.get('DATABASE_PATH') or Path(app.instance_path) / DEFAULT_DB_FILENAME)
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        app.teardown_appcontext(_close_db)
+        app.extensions['db'] = self
+        logger.info(f"Base de datos SQLite configurada en '{self.path}'.")
+
+
+# Instancia global (inicialización diferida con init_app)
+db = Database()
+
+
+def connect(path: Union[str, Path]) -> sqlite3.Connection:
+    """Abre una conexión configurada (filas como sqlite3.Row, WAL, esquemas aplicados)."""
+    conn = sqlite3.connect(str(path), timeout=SQLITE_TIMEOUT_SECONDS)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    _ensure_schema(conn, str(path))
+    return conn
+
+def get_db() -> sqlite3.Connection:
+    """Conexión de la petición actual (se crea al primer uso)."""
+    if 'db_conn' not in g:
+        extension = current_app.extensions.get('db')
+        if extension is None or extension.path is None:
+            raise RuntimeError("Base de datos no inicializada. Llama a db.init_app(app) primero.")
+        g.db_conn = connect(extension.path)
+    return g.db_conn
+
+def _close_db(exc: Optional[BaseException] = None) -> None:
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        conn.close()
+
+def _ensure_schema(conn: sqlite3.Connection, path: str) -> None:
+    if path in _initialized_paths:
+        return
+    with _schema_lock:
+        if path in _initialized_paths:
+            return
+        with conn:
+            for sql in _SCHEMAS:
+                conn.executescript(sql)
+        _initialized_paths.add(path)
+
+
+# --- Paginación ---
+
+class Pagination:
+    """Página de resultados con la interfaz que usan las plantillas (has_prev, next_num, iter_pages...)."""
+
+    def __init__(self, items: List[Any], page: int, per_page: int, total: int):
+        self.items = items
+        self.page = page
+        self.per_page = per_page
+        self.total = total
+
+    @property
+    def pages(self) -> int:
+        return max(1, math.ceil(self.total / self.per_page)) if self.per_page else 1
+
+    @property
+    def has_prev(self) -> bool:
+        return self.page > 1
+
+    @property
+    def has_next(self) -> bool:
+        return self.page < self.pages
+
+    @property
+    def prev_num(self) -> Optional[int]:
+        return self.page - 1 if self.has_prev else None
+
+    @property
+    def next_num(self) -> Optional[int]:
+        return self.page + 1 if self.has_next else None
+
+    def iter_pages(self, left_edge: int = 2, left_current: int = 2,
+                   right_current: int = 5, right_edge: int = 2) -> Iterator[Optional[int]]:
+        """Números de página a mostrar; None marca un hueco ('...')."""
+        last = 0
+        for num in range(1, self.pages + 1):
+            if (num <= left_edge or self.page - left_current - 1 < num < self.page + right_current
+                    or num > self.pages - right_edge):
+                if last + 1 != num:
+                    yield None
+                yield num
+                last = num
+
+    def to_dict(self, item_serializer: Callable[[Any], Dict[str, Any]] = dict) -> Dict[str, Any]:
+        """Representación JSON para las APIs paginadas."""
+        return {'items': [item_serializer(item) for item in self.items], 'page': self.page,
+                'per_page': self.per_page, 'total': self.total, 'pages': self.pages}
+
+
+def paginate(conn: sqlite3.Connection, from_clause: str, params: Sequence[Any] = (),
+             page: int = 1, per_page: int = DEFAULT_PER_PAGE, columns: str = '*',
+             order_by: str = '') -> Pagination:
+    """
+    Ejecuta `SELECT columns <from_clause> <order_by> LIMIT/OFFSET` y el COUNT correspondiente.
+
+    `from_clause` incluye FROM y WHERE (con placeholders '?'); los valores van en `params`.
+    """
+    per_page = min(max(int(per_page), 1), MAX_PER_PAGE)
+    page = max(int(page), 1)
+    total = conn.execute(f"SELECT COUNT(*) {from_clause}", params).fetchone()[0]
+    rows = conn.execute(f"SELECT {columns} {from_clause} {order_by} LIMIT ? OFFSET ?",
+                        (*params, per_page, (page - 1) * per_page)).fetchall()
+    return Pagination(rows, page, per_page, total)
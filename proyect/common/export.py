@@ -0,0 +1,286 @@
+# pricing_dashboard/proyect/common/export.py
+# -*- coding: utf-8 -*-
+"""
+Exportación de resultados de análisis en streaming.
+
+Cada formato es un generador de bytes pensado para una respuesta Flask en
+streaming (Response(stream_with_context(...))): el cliente empieza a recibir
+datos enseguida y la memoria usada no depende del tamaño de la salida.
+
+- xlsx:    openpyxl en modo write_only (una hoja por tabla; las hojas se
+           escriben a archivos temporales y el libro se envía por bloques).
+- csv:     una tabla, escrita por bloques de filas.
+- json:    documento {"tables": ..., "charts": ..., "insights": ...} emitido
+           por bloques de registros.
+- parquet: una tabla (requiere pyarrow), por grupos de filas.
+- zip:     CSV de todas las tablas + JSON de los gráficos e insights, con
+           zipfile sobre un flujo no posicionable (descriptores de datos).
+
+Las tablas son los DataFrames del resultado; los gráficos, los dicts con
+llave 'data' (JSON Plotly); los insights, los dicts de textos.
+"""
+
+import io
+import json
+import logging
+import re
+import tempfile
+import zipfile
+from datetime import date, datetime
+from typing import Any, Dict, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    from openpyxl import Workbook
+except ImportError:
+    Workbook = None # Marcar como no disponible si falta openpyxl
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None # Parquet no disponible sin pyarrow
+
+logger = logging.getLogger(__name__)
+
+# --- Constantes y Configuraciones ---
+FORMAT_XLSX = 'xlsx'
+FORMAT_CSV = 'csv'
+FORMAT_JSON = 'json'
+FORMAT_PARQUET = 'parquet'
+FORMAT_ZIP = 'zip'
+EXPORT_FORMATS = (FORMAT_XLSX, FORMAT_CSV, FORMAT_JSON, FORMAT_PARQUET, FORMAT_ZIP)
+
+EXPORT_MIMETYPES = {
+    FORMAT_XLSX: 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    FORMAT_CSV: 'text/csv; charset=utf-8',
+    FORMAT_JSON: 'application/json',
+    FORMAT_PARQUET: 'application/vnd.apache.parquet',
+    FORMAT_ZIP: 'application/zip',
+}
+
+EXPORT_CHUNK_ROWS = 10_000        # Filas por bloque en CSV/JSON/Parquet
+STREAM_CHUNK_BYTES = 256 * 1024   # Tamaño de bloque al enviar archivos temporales
+EXCEL_MAX_ROWS = 1_048_575        # Filas de datos por hoja (límite de Excel menos la cabecera)
+EXCEL_SHEET_NAME_MAX = 31
+
+
+# --- Clasificación del resultado ---
+
+def result_tables(results: Dict[str, Any]) -> Dict[str, pd.DataFrame]:
+    """DataFrames del resultado, sin el sufijo '_df' en el nombre."""
+    return {_table_name(key): value for key, value in results.items()
+            if isinstance(value, pd.DataFrame) and not value.empty}
+
+def result_charts(results: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Figuras Plotly (dicts con 'data') del resultado."""
+    return {key: value for key, value in results.items() if isinstance(value, dict) and 'data' in value}
+
+def result_insights(results: Dict[str, Any]) -> Dict[str, Any]:
+    """Textos de interpretación (dicts que no son figuras)."""
+    return {key: value for key, value in results.items()
+            if isinstance(value, dict) and 'data' not in value}
+
+def result_index(results: Dict[str, Any]) -> Dict[str, Any]:
+    """Nombres de tablas y gráficos, e insights: lo que necesitan las páginas de resultados sin cargar los datos."""
+    return {'tables': list(result_tables(results)), 'charts': list(result_charts(results)),
+            'insights': result_insights(results)}
+
+def export_filename(base: str, fmt: str, table: Optional[str] = None) -> str:
+    """Nombre de descarga seguro: <base>[_<tabla>].<fmt>."""
+    stem = re.sub(r'[^A-Za-z0-9_.-]+', '_', f"{base}_{table}" if table else base).strip('._') or 'export'
+    return f"{stem}.{fmt}"
+
+
+# --- Generadores por formato ---
+
+def iter_export(results: Dict[str, Any], fmt: str, table: Optional[str] = None) -> Iterator[bytes]:
+    """
+    Generador de bytes para `fmt`. `table` elige la tabla en los formatos de una
+    sola tabla (csv, parquet); por defecto la primera.
+
+    Raises:
+        ValueError: Formato desconocido, tabla inexistente o resultado sin tablas.
+        RuntimeError: Falta la dependencia opcional del formato (openpyxl/pyarrow).
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Formato de exportación no soportado: '{fmt}'. Opciones: {', '.join(EXPORT_FORMATS)}.")
+    tables = result_tables(results)
+    if fmt == FORMAT_XLSX:
+        return iter_xlsx(tables)
+    if fmt == FORMAT_JSON:
+        return iter_json(tables, result_charts(results), result_insights(results))
+    if fmt == FORMAT_ZIP:
+        return iter_zip(tables, result_charts(results), result_insights(results))
+    df = _pick_table(tables, table)
+    return iter_csv(df) if fmt == FORMAT_CSV else iter_parquet(df)
+
+def iter_csv(df: pd.DataFrame, chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[bytes]:
+    """CSV (UTF-8 con BOM, para Excel) por bloques de filas."""
+    yield '\ufeff'.encode('utf-8')
+    yield df.iloc[0:0].to_csv(index=False).encode('utf-8')
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows].to_csv(index=False, header=False).encode('utf-8')
+
+def iter_json(tables: Dict[str, pd.DataFrame], charts: Dict[str, Any], insights: Dict[str, Any],
+              chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[bytes]:
+    """Documento JSON con tablas (registros), gráficos e insights, emitido por bloques."""
+    # Gráficos e insights se serializan antes del primer bloque: un error aquí no deja una respuesta truncada
+    charts_json = json.dumps(charts, ensure_ascii=False, default=_json_default).encode('utf-8')
+    insights_json = json.dumps(insights, ensure_ascii=False, default=_json_default).encode('utf-8')
+    yield b'{"tables": {'
+    for t_index, (name, df) in enumerate(tables.items()):
+        yield (', ' if t_index else '').encode('utf-8') + json.dumps(name).encode('utf-8') + b': ['
+        for start in range(0, len(df), chunk_rows):
+            records = df.iloc[start:start + chunk_rows].to_json(orient='records', date_format='iso', force_ascii=False)
+            yield (b', ' if start else b'') + records[1:-1].encode('utf-8')  # Sin los corchetes del bloque
+        yield b']'
+    yield b'}, "charts": ' + charts_json
+    yield b', "insights": ' + insights_json + b'}'
+
+def iter_xlsx(tables: Dict[str, pd.DataFrame]) -> Iterator[bytes]:
+    """Libro XLSX multi-hoja en modo write_only; las tablas de más de EXCEL_MAX_ROWS se reparten en varias hojas."""
+    if Workbook is None:
+        raise RuntimeError("La librería 'openpyxl' es necesaria para exportar a Excel (`pip install openpyxl`).")
+    if not tables:
+        raise ValueError("El resultado no contiene tablas para exportar.")
+    workbook = Workbook(write_only=True)
+    used_names = set()
+    for name, df in tables.items():
+        for part, start in enumerate(range(0, max(len(df), 1), EXCEL_MAX_ROWS)):
+            sheet = workbook.create_sheet(_sheet_name(name, part, used_names))
+            sheet.append([str(col) for col in df.columns])
+            for row in df.iloc[start:start + EXCEL_MAX_ROWS].itertuples(index=False, name=None):
+                sheet.append([_excel_value(value) for value in row])
+    with tempfile.TemporaryFile() as tmp:
+        workbook.save(tmp)
+        tmp.seek(0)
+        yield from _iter_file(tmp)
+
+def iter_parquet(df: pd.DataFrame, chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[bytes]:
+    """Parquet de una tabla, escrito por grupos de filas en un archivo temporal y enviado por bloques."""
+    if pq is None:
+        raise RuntimeError("La librería 'pyarrow' es necesaria para exportar a Parquet (`pip install pyarrow`).")
+    with tempfile.TemporaryFile() as tmp:
+        schema = pa.Schema.from_pandas(_string_columns(df.iloc[0:0]), preserve_index=False)
+        with pq.ParquetWriter(tmp, schema) as writer:
+            for start in range(0, len(df), chunk_rows):
+                chunk = _string_columns(df.iloc[start:start + chunk_rows])
+                writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+        tmp.seek(0)
+        yield from _iter_file(tmp)
+
+def iter_zip(tables: Dict[str, pd.DataFrame], charts: Dict[str, Any], insights: Dict[str, Any]) -> Iterator[bytes]:
+    """Paquete ZIP: tables/<tabla>.csv, charts/<grafico>.json, insights.json y manifest.json."""
+    # Como en iter_json: serializar gráficos e insights antes de empezar a enviar
+    charts_json = {name: json.dumps(figure, ensure_ascii=False, default=_json_default) for name, figure in charts.items()}
+    insights_json = json.dumps(insights, ensure_ascii=False, indent=2, default=_json_default)
+    stream = _DrainableStream()
+    manifest = {'tables': {}, 'charts': sorted(charts)}
+    with zipfile.ZipFile(stream, mode='w', compression=zipfile.ZIP_DEFLATED) as bundle:
+        for name, df in tables.items():
+            with bundle.open(f"tables/{name}.csv", mode='w', force_zip64=True) as entry:
+                for block in iter_csv(df):
+                    entry.write(block)
+                    yield stream.drain()
+            manifest['tables'][name] = {'rows': int(len(df)), 'columns': [str(col) for col in df.columns]}
+        for name, figure_json in charts_json.items():
+            bundle.writestr(f"charts/{name}.json", figure_json)
+            yield stream.drain()
+        bundle.writestr('insights.json', insights_json)
+        bundle.writestr('manifest.json', json.dumps(manifest, ensure_ascii=False, indent=2))
+    yield stream.drain()
+
+
+def iter_files_zip(files: Dict[str, bytes]) -> Iterator[bytes]:
+    """ZIP con archivos ya generados en memoria (p.ej. imágenes renderizadas de los gráficos)."""
+    stream = _DrainableStream()
+    with zipfile.ZipFile(stream, mode='w', compression=zipfile.ZIP_DEFLATED) as bundle:
+        for name, data in files.items():
+            bundle.writestr(name, data)
+            yield stream.drain()
+    yield stream.drain()
+
+
+# --- Funciones Auxiliares ---
+
+class _DrainableStream(io.RawIOBase):
+    """Destino no posicionable para zipfile: acumula lo escrito hasta que se drena."""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._offset = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._buffer += data
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._offset
+
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+def _iter_file(fh) -> Iterator[bytes]:
+    for block in iter(lambda: fh.read(STREAM_CHUNK_BYTES), b''):
+        yield block
+
+def _pick_table(tables: Dict[str, pd.DataFrame], table: Optional[str]) -> pd.DataFrame:
+    if not tables:
+        raise ValueError("El resultado no contiene tablas para exportar.")
+    if table is None:
+        return next(iter(tables.values()))
+    if table not in tables:
+        raise ValueError(f"Tabla '{table}' no encontrada. Disponibles: {', '.join(tables)}.")
+    return tables[table]
+
+def _table_name(key: str) -> str:
+    return key[:-3] if key.endswith('_df') else key
+
+def _sheet_name(name: str, part: int, used: set) -> str:
+    """Nombre de hoja válido y único (máx. 31 caracteres, sin []:*?/\\)."""
+    base = re.sub(r'[\[\]:*?/\\]', '_', name)
+    suffix = f" ({part + 1})" if part else ''
+    candidate = base[:EXCEL_SHEET_NAME_MAX - len(suffix)] + suffix
+    counter = 2
+    while candidate in used:
+        tag = f"~{counter}"
+        candidate = base[:EXCEL_SHEET_NAME_MAX - len(suffix) - len(tag)] + tag + suffix
+        counter += 1
+    used.add(candidate)
+    return candidate
+
+def _excel_value(value: Any) -> Any:
+    """Valores aceptados por openpyxl (NaN -> celda vacía, escalares numpy -> Python)."""
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+    if hasattr(value, 'item'):
+        value = value.item()
+        return None if isinstance(value, float) and value != value else value
+    if value is pd.NaT:
+        return None
+    if isinstance(value, (str, int, float, bool, datetime, date)):
+        return value
+    return str(value)
+
+def _string_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Parquet exige nombres de columna str."""
+    if all(isinstance(col, str) for col in df.columns):
+        return df
+    return df.rename(columns=str)
+
+def _json_default(value: Any) -> Any:
+    """Tipos no JSON de los gráficos/insights: arrays (numpy, pandas) a listas, escalares numpy a Python; el resto, str."""
+    if isinstance(value, np.generic):
+        return value.item()
+    if hasattr(value, 'tolist'):  # np.ndarray (de cualquier tamaño), pd.Series, pd.Index
+        return value.tolist()
+    return str(value)
@@ -0,0 +1,131 @@
+# pricing_dashboard/proyect/common/history.py
+# -*- coding: utf-8 -*-
+"""
+Historial de archivos subidos, guardado en SQLite (ver proyect.common.db).
+
+La cookie de sesión solo lleva un identificador opaco (session['sid']); las
+entradas del historial viven en la tabla upload_history, indexada por
+(owner_id, uploaded_at), de modo que el coste de cada petición no crece con
+el número de archivos procesados.
+"""
+
+import logging
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from flask import session
+
+from proyect.common.db import DEFAULT_PER_PAGE, Pagination, get_db, paginate, register_schema
+
+logger = logging.getLogger(__name__)
+
+# --- Constantes y Configuraciones ---
+SESSION_OWNER_KEY = 'sid'
+LEGACY_SESSION_KEY = 'upload_history'  # Lista en la cookie (versiones anteriores)
+ANALYSIS_TYPES = ('maxdiff', 'comstrat', 'moca', 'series')
+
+HISTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS upload_history (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    owner_id      TEXT NOT NULL,
+    filename      TEXT NOT NULL,
+    analysis_type TEXT,
+    status        TEXT NOT NULL,
+    results_url   TEXT,
+    uploaded_at   REAL NOT NULL,
+    updated_at    REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_upload_history_owner_time ON upload_history (owner_id, uploaded_at DESC);
+CREATE INDEX IF NOT EXISTS ix_upload_history_owner_file ON upload_history (owner_id, filename, id DESC);
+"""
+register_schema(HISTORY_SCHEMA)
+
+_INSERT_SQL = ("INSERT INTO upload_history (owner_id, filename, analysis_type, status, results_url, uploaded_at, updated_at) "
+               "VALUES (?, ?, ?, ?, ?, ?, ?)")
+
+
+def current_owner_id() -> str:
+    """Identificador del usuario/sesión; se crea al primer uso y es lo único que guarda la cookie."""
+    owner_id = session.get(SESSION_OWNER_KEY)
+    if not owner_id:
+        owner_id = uuid.uuid4().hex
+        session[SESSION_OWNER_KEY] = owner_id
+    _import_legacy_history(owner_id)
+    return owner_id
+
+def add_history_entry(filename: str, analysis_type: Optional[str], status: str,
+                      results_url: Optional[str] = None) -> int:
+    """Añade una entrada al historial y devuelve su id."""
+    owner_id = current_owner_id()
+    now = time.time()
+    conn = get_db()
+    with conn:
+        cursor = conn.execute(_INSERT_SQL, (owner_id, filename, analysis_type, status, results_url, now, now))
+    return cursor.lastrowid
+
+def set_history_status(filename: str, status: str, results_url: Optional[str] = None,
+                       analysis_type: Optional[str] = None) -> None:
+    """
+    Actualiza la entrada más reciente de `filename`; si no existe (p.ej. subida
+    desde un blueprint de análisis) la crea con `analysis_type`.
+    """
+    owner_id = current_owner_id()
+    conn = get_db()
+    with conn:
+        row = conn.execute("SELECT id FROM upload_history WHERE owner_id = ? AND filename = ? ORDER BY id DESC LIMIT 1",
+                           (owner_id, filename)).fetchone()
+        if row is None:
+            now = time.time()
+            conn.execute(_INSERT_SQL, (owner_id, filename, analysis_type, status, results_url, now, now))
+            logger.debug(f"Historial: nueva entrada para '{filename}' con estado '{status}'.")
+            return
+        conn.execute("UPDATE upload_history SET status = ?, results_url = COALESCE(?, results_url), "
+                     "analysis_type = COALESCE(analysis_type, ?), updated_at = ? WHERE id = ?",
+                     (status, results_url, analysis_type, time.time(), row['id']))
+    logger.debug(f"Historial actualizado para '{filename}' con estado '{status}'.")
+
+def get_history_page(page: int = 1, per_page: int = DEFAULT_PER_PAGE,
+                     analysis_type: Optional[str] = None) -> Pagination:
+    """Historial del usuario actual, más reciente primero, paginado (items como dicts)."""
+    from_clause = "FROM upload_history WHERE owner_id = ?"
+    params = [current_owner_id()]
+    if analysis_type:
+        from_clause += " AND analysis_type = ?"
+        params.append(analysis_type)
+    pagination = paginate(get_db(), from_clause, params, page=page, per_page=per_page,
+                          order_by="ORDER BY uploaded_at DESC, id DESC")
+    pagination.items = [_row_to_entry(row) for row in pagination.items]
+    return pagination
+
+def get_history_stats() -> Dict[str, int]:
+    """Totales para las tarjetas del dashboard (archivos y análisis por tipo)."""
+    rows = get_db().execute("SELECT analysis_type, COUNT(*) AS n FROM upload_history WHERE owner_id = ? "
+                            "GROUP BY analysis_type", (current_owner_id(),)).fetchall()
+    counts = {row['analysis_type']: row['n'] for row in rows}
+    stats = {f"{analysis_type}_analyses": counts.get(analysis_type, 0) for analysis_type in ANALYSIS_TYPES}
+    stats['total_files'] = sum(counts.values())
+    return stats
+
+
+# --- Funciones Auxiliares ---
+
+def _row_to_entry(row) -> Dict[str, Any]:
+    entry = dict(row)
+    entry['upload_date'] = datetime.fromtimestamp(entry['uploaded_at'])
+    entry.pop('owner_id', None)
+    return entry
+
+def _import_legacy_history(owner_id: str) -> None:
+    """Migra (una sola vez) el historial que versiones anteriores guardaban en la cookie."""
+    legacy = session.pop(LEGACY_SESSION_KEY, None)
+    if not legacy:
+        return
+    now = time.time()
+    conn = get_db()
+    with conn:
+        conn.executemany(_INSERT_SQL, [
+            (owner_id, entry.get('filename') or 'N/D', entry.get('analysis_type'), entry.get('status') or 'Subido',
+             entry.get('results_url'), now, now) for entry in legacy if isinstance(entry, dict)])
+    logger.info(f"Historial de la cookie migrado a SQLite ({len(legacy)} entradas).")
@@ -0,0 +1,454 @@
+# pricing_dashboard/proyect/common/jobs.py
+# -*- coding: utf-8 -*-
+"""
+Ejecución de análisis en segundo plano.
+
+Los endpoints `/process` de cada blueprint envían el trabajo a un
+ProcessPoolExecutor acotado y devuelven inmediatamente un job ID. El estado
+y el resultado de cada trabajo se guardan en disco (instance/jobs/<job_id>/),
+de modo que cualquier proceso web (p.ej. varios workers de Gunicorn) puede
+consultar el estado y servir la página de resultados.
+
+Si la función del trabajo acepta un argumento `progress`, recibe un callback del
+protocolo de proyect.common.progress; cada evento (etapa, porcentaje, ETA) se
+guarda en el estado del trabajo y el endpoint SSE de /jobs lo retransmite.
+
+Cada trabajo guarda el RSS de su proceso al terminar ('rss_bytes'). Si supera
+JOB_RSS_LIMIT_MB, el pool se sustituye por uno nuevo: los procesos del anterior
+terminan los trabajos que ya tenían y salen (el montículo fragmentado se libera).
+
+Un trabajo sin terminar cuyo proceso ya no existe (el worker murió o el servidor
+se reinició) se marca como fallido al consultarlo. Los directorios de trabajos
+terminados hace más de JOB_RETENTION segundos se borran en un barrido periódico
+(como mucho cada JOB_SWEEP_INTERVAL segundos, al encolar).
+
+Uso (igual que otras extensiones Flask):
+    jobs = JobManager()          # instancia global (este módulo)
+    jobs.init_app(app)           # en initialize_extensions
+    job_id = jobs.submit('maxdiff', process_maxdiff_file, filepath, filename=filename)
+"""
+
+import inspect
+import json
+import logging
+import multiprocessing
+import os
+import pickle
+import re
+import shutil
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin lock entre procesos para status.json
+    fcntl = None
+
+try:
+    import psutil
+except ImportError:  # Opcional: sin él, /proc/<pid>/stat en Linux
+    psutil = None
+
+from proyect.common.memory import MB, current_rss
+from proyect.common.profiling import profile_call, profiler
+from proyect.common.progress import STAGE_DONE, STAGE_LABELS, estimate_eta, stage_percent
+
+logger = logging.getLogger(__name__)
+
+# --- Constantes y Configuraciones ---
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+JOB_FINAL_STATES = (JOB_DONE, JOB_FAILED)
+
+DEFAULT_JOB_MAX_WORKERS = 2    # Procesos de análisis simultáneos
+DEFAULT_JOB_MAX_PENDING = 16   # Trabajos en cola + en ejecución admitidos por proceso web
+DEFAULT_JOB_START_METHOD = 'spawn' # Evita heredar locks/hilos del proceso web al hacer fork
+DEFAULT_JOB_RETENTION = 7 * 24 * 3600  # Segundos que se conservan los trabajos terminados (0: sin límite)
+JOB_SWEEP_INTERVAL = 300       # Segundos mínimos entre barridos de trabajos caducados/huérfanos
+PID_START_TOLERANCE = 2.0      # Segundos de margen al comparar el arranque de un proceso con el trabajo
+JOBS_DIRNAME = 'jobs'
+STATUS_FILENAME = 'status.json'
+RESULT_FILENAME = 'result.pkl'
+STATUS_LOCK_FILENAME = '.status.lock'  # Serializa las actualizaciones de status.json entre procesos
+PROGRESS_MIN_INTERVAL = 0.5   # Segundos mínimos entre escrituras de progreso dentro de una etapa
+_JOB_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+
+
+class JobQueueFullError(RuntimeError):
+    """Se alcanzó el máximo de trabajos pendientes; el cliente debe reintentar más tarde."""
+    pass
+
+
+class JobManager:
+    """Cola acotada de trabajos de análisis con estado y resultados en disco."""
+
+    def __init__(self, app=None):
+        self.jobs_dir: Optional[Path] = None
+        self.max_workers = DEFAULT_JOB_MAX_WORKERS
+        self.max_pending = DEFAULT_JOB_MAX_PENDING
+        self.start_method = DEFAULT_JOB_START_METHOD
+        self.rss_limit: Optional[int] = None
+        self.retention = DEFAULT_JOB_RETENTION
+        self._last_sweep = 0.0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending: Dict[str, Future] = {}
+        self._finish_listeners: List[Callable[[str, Dict[str, Any]], None]] = []
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        """Lee la configuración (JOB_MAX_WORKERS, JOB_MAX_PENDING, JOB_START_METHOD, JOB_RSS_LIMIT_MB, JOB_RETENTION) y prepara el directorio."""
+        self.jobs_dir = Path(app.config.get('JOBS_FOLDER') or Path(app.instance_path) / JOBS_DIRNAME)
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        self.max_workers = max(1, int(app.config.get('JOB_MAX_WORKERS', DEFAULT_JOB_MAX_WORKERS)))
+        self.max_pending = int(app.config.get('JOB_MAX_PENDING', DEFAULT_JOB_MAX_PENDING))
+        self.start_method = app.config.get('JOB_START_METHOD', DEFAULT_JOB_START_METHOD)
+        rss_limit_mb = int(app.config.get('JOB_RSS_LIMIT_MB', 0) or 0)
+        self.rss_limit = rss_limit_mb * MB if rss_limit_mb > 0 else None
+        self.retention = max(0, int(app.config.get('JOB_RETENTION', DEFAULT_JOB_RETENTION)))
+        app.extensions['jobs'] = self
+        logger.info(f"JobManager inicializado: {self.max_workers} worker(s), máx. {self.max_pending} pendientes, dir '{self.jobs_dir}'.")
+
+    # --- API pública ---
+
+    def submit(self, analysis_type: str, func: Callable[..., Any], *args: Any,
+               filename: Optional[str] = None, meta: Optional[Dict[str, Any]] = None, **kwargs: Any) -> str:
+        """
+        Encola `func(*args, **kwargs)` en el pool y devuelve el job ID.
+
+        `func` debe ser una función de nivel de módulo (se serializa por referencia)
+        y su resultado debe ser serializable con pickle. `meta` (p.ej. cache_key) se
+        guarda en el estado inicial, antes de que el worker pueda escribirlo.
+
+        Raises:
+            JobQueueFullError: Si ya hay `max_pending` trabajos sin terminar.
+        """
+        if self.jobs_dir is None:
+            raise RuntimeError("JobManager no inicializado. Llama a init_app(app) primero.")
+        if time.time() - self._last_sweep >= JOB_SWEEP_INTERVAL:
+            self.sweep()
+        with self._lock:
+            self._pending = {job_id: fut for job_id, fut in self._pending.items() if not fut.done()}
+            if len(self._pending) >= self.max_pending:
+                raise JobQueueFullError(f"Hay {len(self._pending)} análisis en curso; inténtalo de nuevo en unos minutos.")
+
+            job_id = uuid.uuid4().hex
+            job_dir = self.jobs_dir / job_id
+            job_dir.mkdir(parents=True)
+            _write_status(job_dir, {
+                'job_id': job_id, 'analysis_type': analysis_type, 'filename': filename,
+                'status': JOB_QUEUED, 'created_at': time.time(), 'server_pid': os.getpid(),
+                'started_at': None, 'finished_at': None, 'error': None, **(meta or {}),
+            })
+            # Petición perfilada (proyect.common.profiling): el trabajo se perfila también en su proceso
+            executor = self._get_executor()
+            future = executor.submit(_execute_job, str(job_dir), func, args, kwargs, profiler.job_profile_folder())
+            future.add_done_callback(lambda fut, d=job_dir, ex=executor: self._job_finished(d, fut, ex))
+            self._pending[job_id] = future
+        logger.info(f"Trabajo {job_id} ({analysis_type}, '{filename}') encolado.")
+        return job_id
+
+    def add_finish_listener(self, listener: Callable[[str, Dict[str, Any]], None]) -> None:
+        """
+        Registra `listener(job_id, status)`, invocado en el proceso web (hilo del pool)
+        cuando termina cada trabajo enviado desde este proceso, con éxito o no.
+        """
+        self._finish_listeners.append(listener)
+
+    def get_status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Estado del trabajo (dict leído de disco) o None si no existe. Un trabajo en
+        cola o en ejecución cuyo proceso ya no existe se marca antes como fallido.
+        """
+        job_dir = self._job_dir(job_id)
+        if job_dir is None:
+            return None
+        status = _read_status(job_dir)
+        if status is not None and _orphan_reason(status) is not None:
+            status = self._fail_orphan(job_dir) or status
+        return status
+
+    def status_mtime(self, job_id: str) -> Optional[int]:
+        """mtime (ns) del archivo de estado; permite detectar cambios con un simple stat."""
+        job_dir = self._job_dir(job_id)
+        try:
+            return (job_dir / STATUS_FILENAME).stat().st_mtime_ns if job_dir is not None else None
+        except OSError:
+            return None
+
+    def update_status(self, job_id: str, **fields: Any) -> None:
+        """Fusiona `fields` en el estado del trabajo (p.ej. datos añadidos por la ruta)."""
+        job_dir = self._job_dir(job_id)
+        if job_dir is not None:
+            _merge_status(job_dir, fields)
+
+    def load_result(self, job_id: str) -> Any:
+        """
+        Resultado de un trabajo terminado.
+
+        Raises:
+            KeyError: Si el trabajo no existe o no ha terminado con éxito.
+            OSError: Si el resultado ya no está en disco (p.ej. copiado al catálogo, discard_result).
+        """
+        status = self.get_status(job_id)
+        if not status or status.get('status') != JOB_DONE:
+            raise KeyError(job_id)
+        with open(self.jobs_dir / job_id / RESULT_FILENAME, 'rb') as fh:
+            return pickle.load(fh)
+
+    def discard_result(self, job_id: str) -> None:
+        """Borra el resultado en disco de un trabajo (p.ej. ya copiado a otro almacén); el estado se conserva."""
+        job_dir = self._job_dir(job_id)
+        if job_dir is not None:
+            try:
+                (job_dir / RESULT_FILENAME).unlink(missing_ok=True)
+            except OSError as e:
+                logger.warning(f"No se pudo borrar el resultado del trabajo '{job_id}': {e}")
+
+    def sweep(self) -> None:
+        """Marca como fallidos los trabajos huérfanos y borra los terminados hace más de `retention` segundos."""
+        self._last_sweep = time.time()
+        cutoff = self._last_sweep - self.retention if self.retention > 0 else None
+        removed = 0
+        try:
+            job_dirs = [d for d in self.jobs_dir.iterdir() if _JOB_ID_RE.match(d.name) and d.is_dir()]
+        except OSError as e:
+            logger.error(f"No se pudo recorrer el directorio de trabajos '{self.jobs_dir}': {e}")
+            return
+        for job_dir in job_dirs:
+            status = _read_status(job_dir)
+            if status is not None and _orphan_reason(status) is not None:
+                status = self._fail_orphan(job_dir)
+            if cutoff is None or (status is not None and status.get('status') not in JOB_FINAL_STATES):
+                continue
+            try:
+                finished_at = (status or {}).get('finished_at') or job_dir.stat().st_mtime
+            except OSError:
+                continue
+            if finished_at < cutoff:
+                shutil.rmtree(job_dir, ignore_errors=True)
+                removed += 1
+        if removed:
+            logger.info(f"Barrido de trabajos: {removed} directorio(s) caducado(s) borrado(s).")
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Cierra el pool (llamado al terminar el proceso)."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait, cancel_futures=not wait)
+                self._executor = None
+
+    # --- Internos ---
+
+    def _job_finished(self, job_dir: Path, future: Future, executor: ProcessPoolExecutor) -> None:
+        _on_job_finished(job_dir, future)
+        status = _read_status(job_dir) or {'job_id': job_dir.name}
+        if self.rss_limit and (status.get('rss_bytes') or 0) > self.rss_limit:
+            self._recycle_executor(executor, status)
+        self._notify_finished(job_dir.name, status)
+
+    def _notify_finished(self, job_id: str, status: Dict[str, Any]) -> None:
+        for listener in self._finish_listeners:
+            try:
+                listener(job_id, status)
+            except Exception as e:
+                logger.error(f"Listener de fin de trabajo falló para '{job_id}': {e}", exc_info=True)
+
+    def _fail_orphan(self, job_dir: Path) -> Optional[Dict[str, Any]]:
+        """Marca el trabajo como fallido si sigue huérfano (comprobado bajo lock) y avisa a los listeners."""
+        with _status_lock(job_dir):
+            status = _read_status(job_dir)
+            reason = _orphan_reason(status) if status is not None else None
+            if reason is None:
+                return status
+            status.update({'status': JOB_FAILED, 'finished_at': time.time(), 'error': reason})
+            _write_status(job_dir, status)
+        logger.warning(f"Trabajo '{job_dir.name}' marcado como fallido: {reason}")
+        self._notify_finished(job_dir.name, status)
+        return status
+
+    def _job_dir(self, job_id: str) -> Optional[Path]:
+        """Ruta del trabajo; valida el formato del ID para evitar path traversal."""
+        if self.jobs_dir is None or not job_id or not _JOB_ID_RE.match(job_id):
+            return None
+        job_dir = self.jobs_dir / job_id
+        return job_dir if job_dir.is_dir() else None
+
+    def _recycle_executor(self, executor: ProcessPoolExecutor, status: Dict[str, Any]) -> None:
+        """Sustituye el pool (si sigue siendo el actual); el anterior termina sus trabajos y cierra sus procesos."""
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+        logger.warning(f"Proceso de trabajos {status.get('pid')} con RSS {status['rss_bytes'] // MB} MB "
+                       f"(límite {self.rss_limit // MB} MB): se sustituye el pool de procesos.")
+        executor.shutdown(wait=False)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Crea el pool de forma diferida (tras el posible fork del servidor WSGI)."""
+        if self._executor is None:
+            context = multiprocessing.get_context(self.start_method)
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+            logger.info(f"ProcessPoolExecutor creado ({self.max_workers} workers, método '{self.start_method}').")
+        return self._executor
+
+
+# Instancia global (inicialización diferida con init_app)
+jobs = JobManager()
+
+
+# --- Funciones Auxiliares (se ejecutan también en los procesos worker) ---
+
+def _execute_job(job_dir: str, func: Callable[..., Any], args: tuple, kwargs: dict,
+                 profile_folder: Optional[str] = None) -> str:
+    """Ejecuta el trabajo en el proceso worker y persiste estado y resultado (con perfil si `profile_folder`)."""
+    path = Path(job_dir)
+    started_at = time.time()
+    _merge_status(path, {'status': JOB_RUNNING, 'started_at': started_at, 'pid': os.getpid()})
+    progress = _JobProgressWriter(path, started_at)
+    if 'progress' in inspect.signature(func).parameters:
+        kwargs = dict(kwargs, progress=progress)
+    try:
+        if profile_folder:
+            result = profile_call(profile_folder, {'kind': 'job', 'endpoint': func.__name__, 'path': path.name},
+                                  func, *args, **kwargs)
+        else:
+            result = func(*args, **kwargs)
+        _atomic_write_bytes(path / RESULT_FILENAME, pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL))
+        _merge_status(path, {'status': JOB_DONE, 'finished_at': time.time(), 'rss_bytes': current_rss(),
+                             'progress': progress.event(STAGE_DONE, 1.0)})
+        return JOB_DONE
+    except Exception as e:
+        logger.error(f"Trabajo en '{path.name}' falló: {e}", exc_info=True)
+        _merge_status(path, {'status': JOB_FAILED, 'finished_at': time.time(), 'rss_bytes': current_rss(),
+                             'error': f"{type(e).__name__}: {e}", 'traceback': traceback.format_exc()})
+        return JOB_FAILED
+
+class _JobProgressWriter:
+    """Callback de progreso del worker: guarda etapa, porcentaje y ETA en el estado del trabajo."""
+
+    def __init__(self, job_dir: Path, started_at: float):
+        self.job_dir = job_dir
+        self.started_at = started_at
+        self._last_stage: Optional[str] = None
+        self._last_write = 0.0
+
+    def event(self, stage: str, fraction: float = 0.0) -> Dict[str, Any]:
+        percent = stage_percent(stage, fraction)
+        return {'stage': stage, 'label': STAGE_LABELS.get(stage, stage), 'percent': percent,
+                'eta_seconds': estimate_eta(time.time() - self.started_at, percent), 'updated_at': time.time()}
+
+    def __call__(self, stage: str, fraction: float = 0.0) -> None:
+        now = time.monotonic()
+        # Cambios de etapa siempre; avances dentro de una etapa, como mucho cada PROGRESS_MIN_INTERVAL
+        if stage == self._last_stage and now - self._last_write < PROGRESS_MIN_INTERVAL:
+            return
+        self._last_stage, self._last_write = stage, now
+        _merge_status(self.job_dir, {'progress': self.event(stage, fraction)})
+
+def _on_job_finished(job_dir: Path, future: Future) -> None:
+    """Callback en el proceso web: registra fallos del propio pool (p.ej. worker muerto)."""
+    exc = future.exception() if not future.cancelled() else None
+    if future.cancelled() or exc is not None:
+        reason = 'cancelado' if future.cancelled() else f"{type(exc).__name__}: {exc}"
+        logger.error(f"Trabajo '{job_dir.name}' terminó sin resultado: {reason}")
+        _merge_status(job_dir, {'status': JOB_FAILED, 'finished_at': time.time(), 'error': reason})
+
+def _orphan_reason(status: Dict[str, Any]) -> Optional[str]:
+    """
+    Motivo por el que un trabajo en cola o en ejecución ya no puede terminar, o None.
+    En cola depende del proceso web que lo encoló ('server_pid'); en ejecución, del
+    proceso del pool ('pid'). Un pid reutilizado por un proceso posterior no cuenta.
+    """
+    state = status.get('status')
+    if state == JOB_RUNNING:
+        pid, since, owner = status.get('pid'), status.get('started_at'), 'el proceso del trabajo'
+    elif state == JOB_QUEUED:
+        pid, since, owner = status.get('server_pid'), status.get('created_at'), 'el proceso web que lo encoló'
+    else:
+        return None
+    if not pid or since is None or _process_alive(pid, since):
+        return None
+    return f"El análisis se interrumpió: {owner} (pid {pid}) ya no existe (reinicio del servidor o proceso terminado)."
+
+def _process_alive(pid: int, since: float) -> bool:
+    """True si existe el proceso `pid` y ya existía en `since` (si no se puede saber cuándo arrancó, basta con que exista)."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    except OSError:
+        return False
+    started_at = _process_started_at(pid)
+    return started_at is None or started_at <= since + PID_START_TOLERANCE
+
+def _process_started_at(pid: int) -> Optional[float]:
+    """Instante de arranque (epoch) del proceso `pid`: psutil o, en Linux, /proc. None si no se puede medir."""
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).create_time()
+        except psutil.Error:
+            return None
+    try:
+        with open(f'/proc/{pid}/stat', 'rb') as fh:
+            fields = fh.read().rsplit(b')', 1)[1].split()  # El nombre del proceso puede contener espacios
+        with open('/proc/stat', 'rb') as fh:
+            boot_time = next(int(line.split()[1]) for line in fh if line.startswith(b'btime'))
+        return boot_time + int(fields[19]) / os.sysconf('SC_CLK_TCK')  # Campo 22 (starttime), en ticks desde el arranque
+    except (OSError, IndexError, ValueError, StopIteration, AttributeError):
+        return None
+
+def _read_status(job_dir: Path) -> Optional[Dict[str, Any]]:
+    try:
+        with open(job_dir / STATUS_FILENAME, 'r', encoding='utf-8') as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+def _write_status(job_dir: Path, status: Dict[str, Any]) -> None:
+    _atomic_write_bytes(job_dir / STATUS_FILENAME, json.dumps(status, ensure_ascii=False, default=str).encode('utf-8'))
+
+def _merge_status(job_dir: Path, fields: Dict[str, Any]) -> None:
+    """Lectura-modificación-escritura bajo lock: el proceso web y el worker actualizan el mismo archivo."""
+    with _status_lock(job_dir):
+        status = _read_status(job_dir) or {'job_id': job_dir.name}
+        status.update(fields)
+        _write_status(job_dir, status)
+
+@contextmanager
+def _status_lock(job_dir: Path) -> Iterator[None]:
+    if fcntl is None:
+        yield
+        return
+    with open(job_dir / STATUS_LOCK_FILENAME, 'a') as lock_fh:
+        fcntl.flock(lock_fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_fh, fcntl.LOCK_UN)
+
+def _atomic_write_bytes(path: Path, data: bytes) -> None:
+    """Escritura atómica (archivo temporal + os.replace) para que los lectores nunca vean un archivo a medias."""
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
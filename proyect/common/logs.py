@@ -0,0 +1,231 @@
+# pricing_dashboard/proyect/common/logs.py
+# -*- coding: utf-8 -*-
+"""
+Logging asíncrono y estructurado.
+
+Los handlers configurados (logging.conf o _setup_basic_logging: consola y
+archivo) pasan a ejecutarse en un hilo propio (QueueListener). Los hilos de las
+peticiones solo encolan el registro (BoundedQueueHandler), así que un disco lento
+no añade latencia a las peticiones.
+
+- Cola acotada (LOG_QUEUE_SIZE). Con la cola llena se descartan los registros
+  DEBUG/INFO/WARNING; los ERROR/CRITICAL esperan como mucho ERROR_ENQUEUE_TIMEOUT.
+  El número de descartados se informa con un aviso en cuanto hay sitio.
+- Cada registro lleva el contexto de la petición (request_id, method, path,
+  endpoint); la línea de acceso añade status y duration_ms. El request_id se toma
+  de la cabecera X-Request-ID (si es válida) o se genera, y se devuelve en la respuesta.
+- LOG_JSON=True: una línea JSON por registro (JsonFormatter).
+- LOG_LEVELS: niveles por módulo, p.ej. "proyect.moca.utils=WARNING,werkzeug=INFO".
+
+Uso:
+    async_logging = AsyncLogging()          # instancia global (este módulo)
+    async_logging.init_app(app)             # en configure_logging, con los handlers ya definidos
+"""
+
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, List, Optional
+
+from flask import Flask, g, has_request_context, request
+
+logger = logging.getLogger(__name__)
+
+# --- Constantes y Configuraciones ---
+DEFAULT_LOG_QUEUE_SIZE = 10_000
+ERROR_ENQUEUE_TIMEOUT = 0.1          # Segundos que un ERROR/CRITICAL espera sitio en la cola llena
+REQUEST_ID_HEADER = 'X-Request-ID'
+CONTEXT_FIELDS = ('request_id', 'method', 'path', 'endpoint', 'status', 'duration_ms')
+_REQUEST_ID_RE = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+
+class RequestContextFilter(logging.Filter):
+    """Añade el contexto de la petición al registro (en el hilo que lo emite, antes de encolarlo)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if has_request_context():
+            record.request_id = g.get('request_id')
+            record.method = request.method
+            record.path = request.path
+            record.endpoint = request.endpoint
+        else:
+            record.request_id = record.method = record.path = record.endpoint = None
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Una línea JSON por registro: ts, level, logger, message, módulo/línea, contexto y excepción."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            'ts': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'line': record.lineno,
+            'process': record.process,
+            'thread': record.threadName,
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                payload[field] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload['exc'] = record.exc_text
+        if record.stack_info:
+            payload['stack'] = record.stack_info
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    QueueHandler con cola acotada y política de descarte, dueño de su QueueListener.
+    Tras un fork (workers de gunicorn con preload) crea cola e hilo nuevos en el hijo.
+    """
+
+    def __init__(self, handlers: List[logging.Handler], maxsize: int = DEFAULT_LOG_QUEUE_SIZE):
+        self.handlers = handlers
+        self.maxsize = maxsize
+        self.dropped = 0
+        self._listener: Optional[QueueListener] = None
+        self._pid: Optional[int] = None
+        self._start_lock = threading.Lock()
+        super().__init__(queue.Queue(maxsize=maxsize))
+
+    def start(self) -> None:
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid is not None:  # Proceso hijo: la cola y el hilo del padre no sirven
+                self.queue = queue.Queue(maxsize=self.maxsize)
+                self.dropped = 0
+            self._listener = QueueListener(self.queue, *self.handlers, respect_handler_level=True)
+            self._listener.start()
+            self._pid = os.getpid()
+
+    def stop(self) -> None:
+        """Vacía la cola y detiene el hilo (al salir del proceso)."""
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._listener, self._pid = None, None
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Como QueueHandler.prepare, pero conserva los campos del registro (contexto, exc_text) para el formatter
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self._pid != os.getpid():
+            self.start()
+        if self.dropped:
+            self._report_dropped()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if record.levelno >= logging.ERROR:
+                try:
+                    self.queue.put(record, timeout=ERROR_ENQUEUE_TIMEOUT)
+                    return
+                except queue.Full:
+                    pass
+            self.dropped += 1
+
+    def _report_dropped(self) -> None:
+        """Encola un aviso con los registros descartados (antes del registro actual) si hay sitio."""
+        dropped, self.dropped = self.dropped, 0
+        notice = logging.makeLogRecord({'name': __name__, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                                        'msg': f"Cola de logs llena: {dropped} registro(s) descartado(s)."})
+        try:
+            self.queue.put_nowait(notice)
+        except queue.Full:
+            self.dropped += dropped
+
+
+class AsyncLogging:
+    """Handlers de logging detrás de colas acotadas, registros con contexto de petición (extensión Flask)."""
+
+    def __init__(self, app=None):
+        self.queue_handlers: List[BoundedQueueHandler] = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        """Lee la configuración (LOG_ASYNC, LOG_QUEUE_SIZE, LOG_JSON, LOG_LEVELS) y mueve los handlers a colas."""
+        levels = _parse_levels(app.config.get('LOG_LEVELS') or '')
+        for name, level in levels.items():
+            logging.getLogger(name or None).setLevel(level)
+
+        context_filter = RequestContextFilter()
+        use_json = bool(app.config.get('LOG_JSON', False))
+        use_queue = bool(app.config.get('LOG_ASYNC', True))
+        maxsize = int(app.config.get('LOG_QUEUE_SIZE', DEFAULT_LOG_QUEUE_SIZE))
+        for target in (logging.getLogger(), app.logger):
+            handlers = [h for h in target.handlers if not isinstance(h, BoundedQueueHandler)]
+            if not handlers:
+                continue
+            if use_json:
+                for handler in handlers:
+                    handler.setFormatter(JsonFormatter())
+            if not use_queue:
+                for handler in handlers:
+                    handler.addFilter(context_filter)
+                continue
+            queue_handler = BoundedQueueHandler(handlers, maxsize=maxsize)
+            queue_handler.addFilter(context_filter)
+            for handler in handlers:
+                target.removeHandler(handler)
+            target.addHandler(queue_handler)
+            queue_handler.start()
+            atexit.register(queue_handler.stop)
+            self.queue_handlers.append(queue_handler)
+
+        app.before_request(_assign_request_id)
+        app.after_request(_echo_request_id)
+        app.extensions['async_logging'] = self
+        logger.info(f"AsyncLogging inicializado: {'cola de ' + str(maxsize) if use_queue else 'síncrono'}, "
+                    f"formato {'JSON' if use_json else 'texto'}"
+                    f"{', niveles ' + str({k or 'root': logging.getLevelName(v) for k, v in levels.items()}) if levels else ''}.")
+
+
+# Instancia global (inicialización diferida con init_app)
+async_logging = AsyncLogging()
+
+
+# --- Funciones Auxiliares ---
+
+def _assign_request_id() -> None:
+    supplied = request.headers.get(REQUEST_ID_HEADER, '')
+    g.request_id = supplied if _REQUEST_ID_RE.match(supplied) else uuid.uuid4().hex
+
+def _echo_request_id(response):
+    request_id = g.get('request_id')
+    if request_id:
+        response.headers[REQUEST_ID_HEADER] = request_id
+    return response
+
+def _parse_levels(spec: str) -> Dict[str, int]:
+    """'modulo=NIVEL,otro=NIVEL' -> {modulo: nivel}; 'root' es el logger raíz. Lanza ValueError si un nivel no existe."""
+    levels = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        name, _, level_name = item.partition('=')
+        level = logging.getLevelName(level_name.strip().upper())
+        if not isinstance(level, int):
+            raise ValueError(f"Nivel de log no válido en LOG_LEVELS: '{item}'.")
+        levels['' if name.strip() == 'root' else name.strip()] = level
+    return levels
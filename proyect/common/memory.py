@@ -0,0 +1,135 @@
+# pricing_dashboard/proyect/common/memory.py
+# -*- coding: utf-8 -*-
+"""
+Contabilidad de memoria y reciclado de procesos por RSS.
+
+- `current_rss()`: memoria residente del proceso (psutil si está instalado; en
+  Linux, /proc/self/statm). None si no se puede medir.
+- `MemoryProbe`: crecimiento de RSS y pico de memoria trazada (tracemalloc)
+  desde su creación. Lo usan las métricas por petición y por etapa de análisis
+  (proyect.common.metrics). El pico trazado es del proceso: con varios hilos por
+  worker incluye las peticiones concurrentes.
+- tracemalloc (MEMORY_TRACEMALLOC=True): tiene coste en CPU y memoria; se activa
+  en el proceso web y, vía PYTHONTRACEMALLOC, en los procesos de los trabajos.
+- Watchdog (MEMORY_RSS_LIMIT_MB > 0): al cerrar cada respuesta, si el RSS del
+  worker supera el límite, el worker se retira de forma ordenada (SIGTERM a sí
+  mismo en Gunicorn: termina las peticiones en curso y el máster arranca otro).
+  Los procesos de los trabajos tienen su propio límite (JOB_RSS_LIMIT_MB,
+  proyect.common.jobs): el pool se sustituye por uno nuevo.
+
+Uso (igual que otras extensiones Flask):
+    memory_watchdog = MemoryWatchdog()      # instancia global (este módulo)
+    memory_watchdog.init_app(app)           # en initialize_extensions
+"""
+
+import logging
+import os
+import signal
+import tracemalloc
+from typing import Optional, Tuple
+
+from flask import request
+
+try:
+    import psutil
+except ImportError:  # Opcional: pip install psutil (sin él, /proc/self/statm en Linux)
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+# --- Constantes y Configuraciones ---
+MB = 1024 * 1024
+TRACEMALLOC_FRAMES = 1               # Marcos por asignación trazada (más marcos, más coste)
+TRACEMALLOC_ENV_VAR = 'PYTHONTRACEMALLOC'
+_STATM_PATH = '/proc/self/statm'
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def current_rss() -> Optional[int]:
+    """Memoria residente (bytes) del proceso actual, o None si no se puede medir."""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open(_STATM_PATH, 'rb') as fh:
+            return int(fh.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+class MemoryProbe:
+    """Crecimiento de RSS y pico de memoria trazada desde su creación (pico solo con tracemalloc activo)."""
+
+    __slots__ = ('rss', 'traced')
+
+    def __init__(self):
+        self.rss = current_rss()
+        self.traced: Optional[int] = None
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            self.traced = tracemalloc.get_traced_memory()[0]
+
+    def stop(self) -> Tuple[Optional[int], Optional[int], Optional[int]]:
+        """(RSS actual, crecimiento de RSS, pico trazado por encima del inicio); None lo que no se pudo medir."""
+        rss = current_rss()
+        growth = max(rss - self.rss, 0) if rss is not None and self.rss is not None else None
+        peak = None
+        if self.traced is not None and tracemalloc.is_tracing():
+            peak = max(tracemalloc.get_traced_memory()[1] - self.traced, 0)
+        return rss, growth, peak
+
+
+class MemoryWatchdog:
+    """Activa tracemalloc y retira el worker tras la petición que supera el límite de RSS (extensión Flask)."""
+
+    def __init__(self, app=None):
+        self.rss_limit: Optional[int] = None
+        self._retired_pid: Optional[int] = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        """Lee la configuración (MEMORY_TRACEMALLOC, MEMORY_RSS_LIMIT_MB)."""
+        if app.config.get('MEMORY_TRACEMALLOC', False):
+            start_tracing()
+        limit_mb = int(app.config.get('MEMORY_RSS_LIMIT_MB', 0) or 0)
+        self.rss_limit = limit_mb * MB if limit_mb > 0 else None
+        app.extensions['memory_watchdog'] = self
+        if self.rss_limit is not None:
+            app.after_request(self._after_request)
+        if current_rss() is None:
+            logger.warning("No se puede medir el RSS en este sistema (pip install psutil): "
+                           "métricas de memoria y watchdog desactivados.")
+        logger.info(f"MemoryWatchdog inicializado: tracemalloc {'activo' if tracemalloc.is_tracing() else 'inactivo'}, "
+                    f"límite de RSS {str(limit_mb) + ' MB' if self.rss_limit else 'desactivado'}.")
+
+    def _after_request(self, response):
+        server = request.environ.get('SERVER_SOFTWARE', '')
+        response.call_on_close(lambda: self._check(server))  # Tras enviar el cuerpo completo
+        return response
+
+    def _check(self, server: str) -> None:
+        pid = os.getpid()
+        if self._retired_pid == pid:
+            return
+        rss = current_rss()
+        if rss is None or rss <= self.rss_limit:
+            return
+        self._retired_pid = pid
+        if not server.lower().startswith('gunicorn'):
+            logger.warning(f"RSS del proceso {pid} ({rss // MB} MB) supera MEMORY_RSS_LIMIT_MB "
+                           f"({self.rss_limit // MB} MB); '{server or 'servidor desconocido'}' no admite reciclado: reinícialo.")
+            return
+        logger.warning(f"RSS del worker {pid} ({rss // MB} MB) supera MEMORY_RSS_LIMIT_MB "
+                       f"({self.rss_limit // MB} MB): se retira tras las peticiones en curso.")
+        os.kill(pid, signal.SIGTERM)  # Gunicorn: parada ordenada del worker; el máster lo sustituye
+
+
+# Instancia global (inicialización diferida con init_app)
+memory_watchdog = MemoryWatchdog()
+
+
+def start_tracing() -> None:
+    """Activa tracemalloc aquí y en los procesos hijos que se lancen después (trabajos de análisis)."""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+    os.environ.setdefault(TRACEMALLOC_ENV_VAR, str(TRACEMALLOC_FRAMES))
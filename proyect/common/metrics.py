@@ -0,0 +1,272 @@
+# pricing_dashboard/proyect/common/metrics.py
+# -*- coding: utf-8 -*-
+"""
+Métricas de la aplicación en formato Prometheus (endpoint de texto /metrics).
+
+- Peticiones HTTP: histograma de latencia por endpoint y código de estado,
+  peticiones en curso por endpoint y tamaño de las subidas (multipart).
+  La latencia incluye el envío del cuerpo (respuestas en streaming): se mide al
+  cerrar la respuesta.
+- Pipelines de análisis: duración de cada etapa (proyect.common.progress) de
+  run_maxdiff_analysis, run_comstrat_analysis y run_moca_analysis (StageTimer).
+- Lectura de archivos (read_data_file): segundos, filas y bytes por formato.
+- Memoria (proyect.common.memory): crecimiento de RSS y pico de memoria trazada
+  (con MEMORY_TRACEMALLOC) por petición y por etapa, y RSS de cada proceso.
+- Caché de resultados (proyect.common.cache): aciertos en memoria y en disco,
+  fallos, escrituras, desalojos y errores (todos los procesos).
+- Control de admisión (proyect.common.admission): espera de turno por análisis y resultado.
+
+Varios procesos (workers de gunicorn y los procesos de los trabajos en segundo
+plano): modo multiproceso de prometheus_client. La variable de entorno
+PROMETHEUS_MULTIPROC_DIR debe apuntar a un directorio vacío ANTES de arrancar el
+servidor (se lee al importar prometheus_client); cada proceso escribe sus valores
+allí y /metrics los agrega. En gunicorn, añadir al archivo de configuración:
+
+    def child_exit(server, worker):
+        from proyect.common.metrics import mark_process_dead
+        mark_process_dead(worker.pid)
+
+Sin el paquete `prometheus_client` las métricas no hacen nada y /metrics responde 503.
+
+Uso (igual que otras extensiones Flask):
+    metrics = Metrics()                     # instancia global (este módulo)
+    metrics.init_app(app)                   # en initialize_extensions
+"""
+
+import hmac
+import logging
+import os
+import time
+from typing import Optional
+
+from flask import Response, g, request
+
+from proyect.common.memory import MemoryProbe
+from proyect.common.progress import ProgressCallback, report_progress
+
+try:
+    import prometheus_client
+    from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, multiprocess
+except ImportError:  # Opcional: pip install prometheus_client
+    prometheus_client = None
+
+logger = logging.getLogger(__name__)
+
+# --- Constantes y Configuraciones ---
+DEFAULT_METRICS_PATH = '/metrics'
+METRICS_ENDPOINT = 'metrics'
+MULTIPROC_ENV_VAR = 'PROMETHEUS_MULTIPROC_DIR'
+UNMATCHED_ENDPOINT = 'unmatched'     # 404 y similares: no crear una serie por URL
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+SIZE_BUCKETS = tuple(float(2 ** exp) for exp in range(10, 31, 2))          # 1 KB ... 1 GB
+MEMORY_BUCKETS = tuple(float(2 ** exp) for exp in range(20, 33))           # 1 MB ... 4 GB
+ROW_BUCKETS = (10.0, 100.0, 1_000.0, 10_000.0, 100_000.0, 1_000_000.0, 10_000_000.0)
+
+
+class _NullMetric:
+    """Sustituto sin efecto cuando prometheus_client no está instalado."""
+
+    def labels(self, *args, **kwargs) -> '_NullMetric':
+        return self
+
+    def observe(self, *args, **kwargs) -> None:
+        pass
+
+    def inc(self, *args, **kwargs) -> None:
+        pass
+
+    def dec(self, *args, **kwargs) -> None:
+        pass
+
+    def set(self, *args, **kwargs) -> None:
+        pass
+
+
+def _histogram(name: str, documentation: str, labelnames, buckets):
+    if prometheus_client is None:
+        return _NullMetric()
+    return Histogram(name, documentation, labelnames, buckets=buckets)
+
+def _counter(name: str, documentation: str, labelnames):
+    if prometheus_client is None:
+        return _NullMetric()
+    return Counter(name, documentation, labelnames)
+
+def _gauge(name: str, documentation: str, labelnames, multiprocess_mode: str = 'livesum'):
+    if prometheus_client is None:
+        return _NullMetric()
+    return Gauge(name, documentation, labelnames, multiprocess_mode=multiprocess_mode)
+
+
+# Definidas al importar el módulo: también existen en los procesos de los trabajos en segundo plano
+REQUEST_LATENCY = _histogram('pricing_http_request_duration_seconds',
+                             'Latencia de las peticiones HTTP (hasta cerrar la respuesta).',
+                             ['endpoint', 'method', 'status'], LATENCY_BUCKETS)
+REQUESTS_IN_FLIGHT = _gauge('pricing_http_requests_in_flight', 'Peticiones HTTP en curso.', ['endpoint'])
+UPLOAD_SIZE = _histogram('pricing_http_upload_size_bytes', 'Tamaño de las subidas multipart (bytes).',
+                         ['endpoint'], SIZE_BUCKETS)
+STAGE_DURATION = _histogram('pricing_analysis_stage_duration_seconds',
+                            'Duración de cada etapa de los pipelines de análisis.',
+                            ['analysis', 'stage'], STAGE_BUCKETS)
+FILE_READ_DURATION = _histogram('pricing_file_read_duration_seconds', 'Duración de read_data_file.',
+                                ['format'], STAGE_BUCKETS)
+REQUEST_RSS_GROWTH = _histogram('pricing_http_request_rss_growth_bytes',
+                                'Crecimiento del RSS del worker durante la petición.', ['endpoint'], MEMORY_BUCKETS)
+REQUEST_TRACED_PEAK = _histogram('pricing_http_request_traced_peak_bytes',
+                                 'Pico de memoria trazada (tracemalloc) durante la petición.', ['endpoint'], MEMORY_BUCKETS)
+STAGE_RSS_GROWTH = _histogram('pricing_analysis_stage_rss_growth_bytes',
+                              'Crecimiento del RSS en cada etapa de los pipelines de análisis.',
+                              ['analysis', 'stage'], MEMORY_BUCKETS)
+STAGE_TRACED_PEAK = _histogram('pricing_analysis_stage_traced_peak_bytes',
+                               'Pico de memoria trazada (tracemalloc) en cada etapa de los pipelines de análisis.',
+                               ['analysis', 'stage'], MEMORY_BUCKETS)
+PROCESS_RSS = _gauge('pricing_process_rss_bytes', 'RSS del proceso (workers web y de trabajos) tras la última medida.',
+                     [], multiprocess_mode='liveall')
+CACHE_EVENT_NAMES = ('memory_hits', 'disk_hits', 'misses', 'puts', 'evictions', 'errors')
+CACHE_EVENTS = _counter('pricing_result_cache_events', 'Eventos de la caché de resultados (event: ' +
+                        ', '.join(CACHE_EVENT_NAMES) + ').', ['event'])
+for _event in CACHE_EVENT_NAMES:  # Series a 0 desde el arranque (tasas de acierto sin huecos)
+    CACHE_EVENTS.labels(_event)
+ADMISSION_WAIT = _histogram('pricing_admission_wait_seconds',
+                            'Espera de turno en el control de admisión (outcome: admitted, rejected, timeout).',
+                            ['analysis', 'outcome'], LATENCY_BUCKETS)
+FILE_READ_ROWS = _histogram('pricing_file_read_rows', 'Filas leídas por read_data_file.', ['format'], ROW_BUCKETS)
+FILE_READ_BYTES = _histogram('pricing_file_read_bytes', 'Tamaño de los archivos leídos por read_data_file.',
+                             ['format'], SIZE_BUCKETS)
+
+
+class Metrics:
+    """Métricas de peticiones HTTP y endpoint /metrics (extensión Flask)."""
+
+    def __init__(self, app=None):
+        self.enabled = True
+        self.token: Optional[str] = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        """Lee la configuración (METRICS_ENABLED, METRICS_PATH, METRICS_TOKEN) y registra hooks y endpoint."""
+        self.enabled = bool(app.config.get('METRICS_ENABLED', True))
+        self.token = app.config.get('METRICS_TOKEN') or None
+        app.extensions['metrics'] = self
+        if not self.enabled:
+            logger.info("Metrics desactivadas (METRICS_ENABLED=False).")
+            return
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        path = app.config.get('METRICS_PATH', DEFAULT_METRICS_PATH)
+        app.add_url_rule(path, endpoint=METRICS_ENDPOINT, view_func=self._serve)
+
+        if prometheus_client is None:
+            logger.warning("prometheus_client no instalado: métricas desactivadas (pip install prometheus_client).")
+        multiproc_dir = os.environ.get(MULTIPROC_ENV_VAR)
+        logger.info(f"Metrics inicializadas en '{path}' "
+                    f"({'multiproceso: ' + multiproc_dir if multiproc_dir else 'un solo proceso'}).")
+
+    def _before_request(self) -> None:
+        endpoint = request.endpoint or UNMATCHED_ENDPOINT
+        g._metrics = (endpoint, time.perf_counter(), MemoryProbe())
+        REQUESTS_IN_FLIGHT.labels(endpoint).inc()
+        if request.method == 'POST' and request.mimetype == 'multipart/form-data' and request.content_length:
+            UPLOAD_SIZE.labels(endpoint).observe(request.content_length)
+
+    def _after_request(self, response: Response) -> Response:
+        started = g.pop('_metrics', None)
+        if started is None:
+            return response
+        endpoint, start, probe = started
+        method, status = request.method, str(response.status_code)
+
+        def _observe() -> None:  # Sin referencia a `response`: no crear un ciclo respuesta -> callback
+            REQUEST_LATENCY.labels(endpoint, method, status).observe(time.perf_counter() - start)
+            REQUESTS_IN_FLIGHT.labels(endpoint).dec()
+            _observe_memory(probe, REQUEST_RSS_GROWTH.labels(endpoint), REQUEST_TRACED_PEAK.labels(endpoint))
+
+        response.call_on_close(_observe)
+        return response
+
+    def _serve(self) -> Response:
+        if self.token:
+            supplied = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+            if not hmac.compare_digest(supplied.encode('utf-8'), self.token.encode('utf-8')):
+                return Response('No autorizado.\n', status=401, mimetype='text/plain')
+        if prometheus_client is None:
+            return Response('prometheus_client no instalado.\n', status=503, mimetype='text/plain')
+        if os.environ.get(MULTIPROC_ENV_VAR):
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = prometheus_client.REGISTRY
+        response = Response(prometheus_client.generate_latest(registry), mimetype='text/plain')
+        response.headers['Content-Type'] = prometheus_client.CONTENT_TYPE_LATEST
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+
+
+# Instancia global (inicialización diferida con init_app)
+metrics = Metrics()
+
+
+class StageTimer:
+    """
+    Callback de progreso que además mide cada etapa del pipeline `analysis`: una
+    etapa dura desde su primer evento hasta el de la siguiente (o `finish`), con su
+    crecimiento de RSS y pico de memoria trazada. Reenvía los eventos al callback original.
+
+        progress = StageTimer('maxdiff', progress)
+        try:
+            ...
+            report_progress(progress, STAGE_COMPUTE)
+            ...
+        finally:
+            progress.finish()
+    """
+
+    def __init__(self, analysis: str, progress: Optional[ProgressCallback] = None):
+        self.analysis = analysis
+        self.progress = progress
+        self._stage: Optional[str] = None
+        self._started = 0.0
+        self._probe: Optional[MemoryProbe] = None
+
+    def __call__(self, stage: str, fraction: float = 0.0) -> None:
+        if stage != self._stage:
+            self._close_stage()
+            self._stage, self._started, self._probe = stage, time.perf_counter(), MemoryProbe()
+        report_progress(self.progress, stage, fraction)
+
+    def finish(self) -> None:
+        """Cierra la etapa en curso (al terminar el pipeline, también si falla)."""
+        self._close_stage()
+
+    def _close_stage(self) -> None:
+        if self._stage is not None:
+            STAGE_DURATION.labels(self.analysis, self._stage).observe(time.perf_counter() - self._started)
+            _observe_memory(self._probe, STAGE_RSS_GROWTH.labels(self.analysis, self._stage),
+                            STAGE_TRACED_PEAK.labels(self.analysis, self._stage))
+            self._stage = self._probe = None
+
+
+def observe_file_read(file_format: str, seconds: float, rows: int, size_bytes: int) -> None:
+    """Registra una lectura de archivo (read_data_file): duración, filas y bytes por formato."""
+    FILE_READ_DURATION.labels(file_format).observe(seconds)
+    FILE_READ_ROWS.labels(file_format).observe(rows)
+    FILE_READ_BYTES.labels(file_format).observe(size_bytes)
+
+def mark_process_dead(pid: int) -> None:
+    """Hook child_exit de gunicorn en modo multiproceso: descarta los gauges del worker terminado."""
+    if prometheus_client is not None and os.environ.get(MULTIPROC_ENV_VAR):
+        multiprocess.mark_process_dead(pid)
+
+
+# --- Funciones Auxiliares ---
+
+def _observe_memory(probe: MemoryProbe, rss_growth, traced_peak) -> None:
+    rss, growth, peak = probe.stop()
+    if rss is not None:
+        PROCESS_RSS.set(rss)
+    if growth is not None:
+        rss_growth.observe(growth)
+    if peak is not None:
+        traced_peak.observe(peak)
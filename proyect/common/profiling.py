@@ -0,0 +1,243 @@
+# pricing_dashboard/proyect/common/profiling.py
+# -*- coding: utf-8 -*-
+"""
+Perfilado bajo demanda de peticiones (y de los análisis que lanzan).
+
+Con PROFILING_ENABLED=True, una petición que lleve un token firmado (cabecera
+'X-Profile-Token' o parámetro '_profile') se ejecuta bajo un profiler:
+- pyinstrument (muestreo, si está instalado): artefacto speedscope
+  (<id>.speedscope.json, se abre en https://www.speedscope.app).
+- cProfile (biblioteca estándar) en otro caso: artefacto pstats (<id>.pstats,
+  p.ej. `snakeviz` o `python -m pstats`).
+
+El perfil cubre también el envío del cuerpo (plantillas en streaming) y se guarda
+al cerrar la respuesta en PROFILING_FOLDER (por defecto instance/profiles). La
+respuesta incluye 'X-Profile-URL' con la ruta de descarga. Si la petición encola
+un análisis (proyect.common.jobs), el trabajo se perfila también en su proceso.
+El listado está en /admin/profiles (mismo token).
+
+Token: `flask profiling-token` (firmado con SECRET_KEY, caduca a las
+PROFILING_TOKEN_MAX_AGE segundos). Con PROFILING_ENABLED=False no se registra
+ningún hook: coste cero.
+
+Uso (igual que otras extensiones Flask):
+    profiler = RequestProfiler()            # instancia global (este módulo)
+    profiler.init_app(app)                  # en initialize_extensions
+"""
+
+import cProfile
+import json
+import logging
+import re
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from flask import g, has_request_context, request, url_for
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+try:
+    import pyinstrument
+    from pyinstrument.renderers import SpeedscopeRenderer
+except ImportError:  # Opcional: pip install pyinstrument
+    pyinstrument = None
+
+logger = logging.getLogger(__name__)
+
+# --- Constantes y Configuraciones ---
+PROFILE_TOKEN_HEADER = 'X-Profile-Token'
+PROFILE_TOKEN_PARAM = '_profile'
+PROFILE_URL_HEADER = 'X-Profile-URL'
+PROFILE_TOKEN_SALT = 'request-profiling'
+PROFILES_DIRNAME = 'profiles'
+DEFAULT_PROFILING_KEEP = 50                  # Perfiles conservados (se borran los más antiguos)
+DEFAULT_PROFILING_TOKEN_MAX_AGE = 24 * 3600  # Segundos de validez del token
+SAMPLING_INTERVAL = 0.001                    # Segundos entre muestras (pyinstrument)
+ADMIN_BLUEPRINT = 'admin'                    # Sus páginas no se perfilan
+_PROFILE_ID_RE = re.compile(r'^\d{8}T\d{6}-[0-9a-f]{8}$')
+
+
+class RequestProfiler:
+    """Perfilado opt-in de peticiones con token firmado (extensión Flask)."""
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.folder: Optional[Path] = None
+        self.keep = DEFAULT_PROFILING_KEEP
+        self.token_max_age = DEFAULT_PROFILING_TOKEN_MAX_AGE
+        self._serializer: Optional[URLSafeTimedSerializer] = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        """Lee la configuración (PROFILING_ENABLED, PROFILING_FOLDER, PROFILING_KEEP, PROFILING_TOKEN_MAX_AGE)."""
+        self.enabled = bool(app.config.get('PROFILING_ENABLED', False))
+        self.folder = Path(app.config.get('PROFILING_FOLDER') or Path(app.instance_path) / PROFILES_DIRNAME)
+        self.keep = int(app.config.get('PROFILING_KEEP', DEFAULT_PROFILING_KEEP))
+        self.token_max_age = int(app.config.get('PROFILING_TOKEN_MAX_AGE', DEFAULT_PROFILING_TOKEN_MAX_AGE))
+        app.extensions['profiler'] = self
+        if not self.enabled:
+            logger.info("RequestProfiler desactivado (PROFILING_ENABLED=False).")
+            return
+        if not app.secret_key:
+            raise RuntimeError("PROFILING_ENABLED requiere SECRET_KEY para firmar los tokens de perfilado.")
+        self._serializer = URLSafeTimedSerializer(app.secret_key, salt=PROFILE_TOKEN_SALT)
+        self.folder.mkdir(parents=True, exist_ok=True)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+        @app.cli.command('profiling-token')
+        def profiling_token_command():
+            """Imprime un token de perfilado (cabecera X-Profile-Token o parámetro _profile)."""
+            print(self.make_token())
+
+        logger.info(f"RequestProfiler activo: {'pyinstrument' if pyinstrument else 'cProfile'}, "
+                    f"perfiles en '{self.folder}' (máx. {self.keep}).")
+
+    # --- API pública ---
+
+    def make_token(self) -> str:
+        """Token firmado que activa el perfilado de una petición."""
+        if self._serializer is None:
+            raise RuntimeError("El perfilado no está activo (PROFILING_ENABLED=False).")
+        return self._serializer.dumps({'profile': True})
+
+    def verify_token(self, token: Optional[str]) -> bool:
+        if not token or self._serializer is None:
+            return False
+        try:
+            self._serializer.loads(token, max_age=self.token_max_age)
+            return True
+        except BadSignature:
+            return False
+
+    def request_token(self) -> Optional[str]:
+        """Token enviado en la petición actual (cabecera o parámetro), sin validar."""
+        return request.headers.get(PROFILE_TOKEN_HEADER) or request.args.get(PROFILE_TOKEN_PARAM)
+
+    def job_profile_folder(self) -> Optional[str]:
+        """Carpeta de perfiles si la petición actual se está perfilando (para perfilar su trabajo)."""
+        if not self.enabled or not has_request_context():
+            return None
+        return str(self.folder) if g.get('_profiling') is not None else None
+
+    def list_profiles(self) -> List[Dict[str, Any]]:
+        """Metadatos de los perfiles guardados, del más reciente al más antiguo."""
+        if not self.enabled or not self.folder.is_dir():
+            return []
+        profiles = []
+        for meta_path in sorted(self.folder.glob('*.json'), reverse=True):
+            if not _PROFILE_ID_RE.match(meta_path.stem):
+                continue
+            try:
+                profiles.append(json.loads(meta_path.read_text(encoding='utf-8')))
+            except (OSError, ValueError):
+                continue
+        return profiles
+
+    def artifact_path(self, profile_id: str) -> Optional[Path]:
+        """Ruta del artefacto del perfil `profile_id`, o None si no existe."""
+        if not self.enabled or not _PROFILE_ID_RE.match(profile_id):
+            return None
+        try:
+            meta = json.loads((self.folder / f"{profile_id}.json").read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return None
+        path = self.folder / meta.get('artifact', '')
+        return path if path.is_file() else None
+
+    # --- Hooks ---
+
+    def _before_request(self) -> None:
+        token = self.request_token()
+        if not token or request.blueprint == ADMIN_BLUEPRINT:
+            return
+        if not self.verify_token(token):
+            logger.warning(f"Token de perfilado no válido o caducado en {request.method} {request.path}.")
+            return
+        try:
+            active = _start_profiler()
+        except (RuntimeError, ValueError) as e:  # Otro profiler activo en el hilo: la petición sigue sin perfil
+            logger.warning(f"No se pudo iniciar el perfilado de {request.method} {request.path}: {e}")
+            return
+        g._profiling = (active, new_profile_id(), time.perf_counter())
+
+    def _after_request(self, response):
+        profiling = g.pop('_profiling', None)
+        if profiling is None:
+            return response
+        active, profile_id, started = profiling
+        meta = {'kind': 'request', 'method': request.method, 'path': request.path,
+                'endpoint': request.endpoint, 'status': response.status_code}
+        response.headers[PROFILE_URL_HEADER] = url_for(f'{ADMIN_BLUEPRINT}.profile_artifact', profile_id=profile_id)
+
+        def _finish() -> None:  # Al cerrar la respuesta: incluye el cuerpo en streaming
+            meta['duration_ms'] = round((time.perf_counter() - started) * 1000, 1)
+            save_profile(active, self.folder, profile_id, meta)
+            _prune(self.folder, self.keep)
+
+        response.call_on_close(_finish)
+        return response
+
+
+# Instancia global (inicialización diferida con init_app)
+profiler = RequestProfiler()
+
+
+def new_profile_id() -> str:
+    return f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+
+def profile_call(folder: str, meta: Dict[str, Any], func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Ejecuta `func` bajo el profiler y guarda el perfil en `folder` (también si falla). Sin contexto Flask."""
+    try:
+        active = _start_profiler()
+    except (RuntimeError, ValueError) as e:
+        logger.warning(f"No se pudo iniciar el perfilado de '{meta.get('endpoint')}': {e}")
+        return func(*args, **kwargs)
+    profile_id, started = new_profile_id(), time.perf_counter()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        meta = dict(meta, duration_ms=round((time.perf_counter() - started) * 1000, 1))
+        save_profile(active, Path(folder), profile_id, meta)
+
+def save_profile(active: Any, folder: Path, profile_id: str, meta: Dict[str, Any]) -> None:
+    """Detiene el profiler y escribe el artefacto y sus metadatos (<id>.json). Nunca lanza."""
+    try:
+        if pyinstrument is not None and isinstance(active, pyinstrument.Profiler):
+            session = active.stop()
+            artifact, fmt = f"{profile_id}.speedscope.json", 'speedscope'
+            (folder / artifact).write_text(SpeedscopeRenderer().render(session), encoding='utf-8')
+        else:
+            active.disable()
+            artifact, fmt = f"{profile_id}.pstats", 'pstats'
+            active.dump_stats(str(folder / artifact))
+        meta = dict(meta, id=profile_id, artifact=artifact, format=fmt, created_at=time.time())
+        (folder / f"{profile_id}.json").write_text(json.dumps(meta, ensure_ascii=False, default=str), encoding='utf-8')
+        logger.info(f"Perfil '{profile_id}' guardado ({meta.get('kind')}, {meta.get('duration_ms')} ms, {fmt}).")
+    except Exception as e:
+        logger.error(f"No se pudo guardar el perfil '{profile_id}': {e}", exc_info=True)
+
+
+# --- Funciones Auxiliares ---
+
+def _start_profiler() -> Any:
+    if pyinstrument is not None:
+        active = pyinstrument.Profiler(interval=SAMPLING_INTERVAL, async_mode='disabled')
+        active.start()
+    else:
+        active = cProfile.Profile()
+        active.enable()
+    return active
+
+def _prune(folder: Path, keep: int) -> None:
+    """Borra los perfiles más antiguos por encima de `keep` (artefacto y metadatos)."""
+    ids = sorted({path.name.split('.', 1)[0] for path in folder.iterdir() if _PROFILE_ID_RE.match(path.name.split('.', 1)[0])})
+    for profile_id in ids[:max(len(ids) - keep, 0)]:
+        for path in folder.glob(f"{profile_id}.*"):
+            try:
+                path.unlink()
+            except OSError:
+                pass
@@ -0,0 +1,70 @@
+# pricing_dashboard/proyect/common/progress.py
+# -*- coding: utf-8 -*-
+"""
+Protocolo de progreso de los pipelines de análisis.
+
+Los pipelines (run_maxdiff_analysis, run_comstrat_analysis, run_moca_analysis y
+los process_*_file que leen el archivo) aceptan un callback opcional
+`progress(stage, fraction)` y lo invocan al empezar cada etapa:
+
+    read -> validate -> compute -> chart -> hints
+
+`fraction` (0-1) permite informar avance dentro de una etapa larga. Cada etapa
+ocupa un tramo fijo del porcentaje global (STAGE_SPANS); quien recibe los eventos
+(p.ej. el trabajo en segundo plano) calcula el porcentaje y el ETA con stage_percent.
+"""
+
+from typing import Callable, Dict, Optional, Tuple
+
+# --- Constantes y Configuraciones ---
+STAGE_READ = 'read'
+STAGE_VALIDATE = 'validate'
+STAGE_COMPUTE = 'compute'
+STAGE_CHART = 'chart'
+STAGE_HINTS = 'hints'
+STAGE_DONE = 'done'
+
+# Tramo (inicio, fin) del porcentaje global asignado a cada etapa
+STAGE_SPANS: Dict[str, Tuple[float, float]] = {
+    STAGE_READ: (0.0, 25.0),
+    STAGE_VALIDATE: (25.0, 35.0),
+    STAGE_COMPUTE: (35.0, 75.0),
+    STAGE_CHART: (75.0, 92.0),
+    STAGE_HINTS: (92.0, 99.0),
+    STAGE_DONE: (100.0, 100.0),
+}
+
+STAGE_LABELS: Dict[str, str] = {
+    STAGE_READ: 'Leyendo archivo',
+    STAGE_VALIDATE: 'Validando datos',
+    STAGE_COMPUTE: 'Calculando',
+    STAGE_CHART: 'Generando gráficos',
+    STAGE_HINTS: 'Generando conclusiones',
+    STAGE_DONE: 'Completado',
+}
+
+ProgressCallback = Callable[[str, float], None]
+
+
+def report_progress(progress: Optional[ProgressCallback], stage: str, fraction: float = 0.0) -> None:
+    """Invoca el callback si existe. Un fallo al informar progreso nunca interrumpe el análisis."""
+    if progress is None:
+        return
+    try:
+        progress(stage, fraction)
+    except Exception:  # El progreso es informativo: se ignora cualquier error del receptor
+        pass
+
+
+def stage_percent(stage: str, fraction: float = 0.0) -> float:
+    """Porcentaje global (0-100) correspondiente a `fraction` dentro de `stage`."""
+    start, end = STAGE_SPANS.get(stage, (0.0, 0.0))
+    fraction = min(max(float(fraction), 0.0), 1.0)
+    return round(start + (end - start) * fraction, 1)
+
+
+def estimate_eta(elapsed_seconds: float, percent: float) -> Optional[float]:
+    """ETA lineal en segundos a partir del tiempo transcurrido; None si aún no hay avance."""
+    if percent <= 0 or percent >= 100:
+        return None if percent <= 0 else 0.0
+    return round(elapsed_seconds * (100.0 - percent) / percent, 1)
@@ -0,0 +1,257 @@
+# pricing_dashboard/proyect/common/rendering.py
+# -*- coding: utf-8 -*-
+"""
+Renderizado offline de gráficos Plotly a imágenes (PNG/SVG/PDF) e informes PDF.
+
+Los dicts de figura que guardan los análisis (bar_json, stacked_json, moca_json,
+pvm_json...) se convierten a imagen en el servidor con plotly + kaleido, sin
+acceso a red (kaleido trae su propio plotly.js; MathJax se desactiva).
+
+- Pool de renderizadores: ProcessPoolExecutor de procesos de larga vida. Cada
+  worker importa plotly/kaleido y arranca su Chromium headless una sola vez
+  (initializer con una figura de calentamiento); los lotes siguientes solo pagan
+  el renderizado.
+- Caché por hash de figura: instance/render_cache/<kk>/<hash>.<fmt>, con clave
+  sha256(figura canónica, formato, tamaño, escala). Desalojo LRU por tamaño.
+- Informe PDF: una página por figura (PDF vectorial de kaleido), unidas con pypdf.
+
+Dependencias opcionales: plotly y kaleido (imágenes), pypdf (informe multipágina).
+
+Uso (igual que otras extensiones Flask):
+    chart_renderer.init_app(app)
+    png = chart_renderer.render(results['pvm_json'], fmt='png')
+    pdf = chart_renderer.build_pdf_report([fig1, fig2, ...])
+"""
+
+import hashlib
+import importlib.util
+import io
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait as wait_futures
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+try:
+    from pypdf import PdfReader, PdfWriter
+except ImportError:
+    PdfReader = PdfWriter = None # Informe multipágina no disponible sin pypdf
+
+logger = logging.getLogger(__name__)
+
+# --- Constantes y Configuraciones ---
+IMAGE_FORMATS = ('png', 'svg', 'pdf')
+IMAGE_MIMETYPES = {'png': 'image/png', 'svg': 'image/svg+xml', 'pdf': 'application/pdf'}
+RENDER_FORMAT_VERSION = 1                     # Cambiar si cambia la forma de renderizar (invalida la caché)
+DEFAULT_RENDER_WORKERS = 2                    # Procesos renderizadores (cada uno con su Chromium)
+DEFAULT_RENDER_TIMEOUT = 120                  # Segundos máximos por lote
+DEFAULT_RENDER_CACHE_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_IMAGE_WIDTH = 1200
+DEFAULT_IMAGE_HEIGHT = 700
+DEFAULT_IMAGE_SCALE = 1.0
+RENDER_CACHE_DIRNAME = 'render_cache'
+_WARMUP_FIGURE = {'data': [{'type': 'bar', 'x': [0], 'y': [0]}], 'layout': {}}
+
+
+class ChartRenderer:
+    """Pool de procesos renderizadores de figuras Plotly con caché en disco por hash de figura."""
+
+    def __init__(self, app=None):
+        self.cache_dir: Optional[Path] = None
+        self.max_workers = DEFAULT_RENDER_WORKERS
+        self.start_method = 'spawn'
+        self.timeout = DEFAULT_RENDER_TIMEOUT
+        self.max_bytes = DEFAULT_RENDER_CACHE_MAX_BYTES
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        """Lee REPORT_RENDER_FOLDER, REPORT_RENDER_WORKERS, REPORT_RENDER_TIMEOUT y REPORT_RENDER_CACHE_MAX_BYTES."""
+        self.cache_dir = Path(app.config.get('REPORT_RENDER_FOLDER') or Path(app.instance_path) / RENDER_CACHE_DIRNAME)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_workers = int(app.config.get('REPORT_RENDER_WORKERS', DEFAULT_RENDER_WORKERS))
+        self.start_method = app.config.get('JOB_START_METHOD', 'spawn')
+        self.timeout = float(app.config.get('REPORT_RENDER_TIMEOUT', DEFAULT_RENDER_TIMEOUT))
+        self.max_bytes = int(app.config.get('REPORT_RENDER_CACHE_MAX_BYTES', DEFAULT_RENDER_CACHE_MAX_BYTES))
+        app.extensions['chart_renderer'] = self
+        logger.info(f"ChartRenderer inicializado: {self.max_workers} renderizador(es), caché en '{self.cache_dir}'"
+                    f"{'' if self.available() else ' (plotly/kaleido no instalados: renderizado deshabilitado)'}.")
+
+    # --- API pública ---
+
+    @staticmethod
+    def available() -> bool:
+        """True si plotly y kaleido están instalados."""
+        return all(importlib.util.find_spec(name) is not None for name in ('plotly', 'kaleido'))
+
+    def render(self, figure: Dict[str, Any], fmt: str = 'png', width: int = DEFAULT_IMAGE_WIDTH,
+               height: int = DEFAULT_IMAGE_HEIGHT, scale: float = DEFAULT_IMAGE_SCALE) -> bytes:
+        """Imagen de una figura (ver render_many)."""
+        return self.render_many([figure], fmt=fmt, width=width, height=height, scale=scale)[0]
+
+    def render_many(self, figures: List[Dict[str, Any]], fmt: str = 'png', width: int = DEFAULT_IMAGE_WIDTH,
+                    height: int = DEFAULT_IMAGE_HEIGHT, scale: float = DEFAULT_IMAGE_SCALE) -> List[bytes]:
+        """
+        Renderiza un lote de figuras en el pool; las ya renderizadas salen de la caché
+        y las repetidas dentro del lote se renderizan una vez. Devuelve los bytes en
+        el mismo orden que `figures`.
+
+        Raises:
+            ValueError: Formato no soportado.
+            RuntimeError: plotly/kaleido no instalados, renderer sin inicializar o lote fuera de tiempo.
+        """
+        if fmt not in IMAGE_FORMATS:
+            raise ValueError(f"Formato de imagen no soportado: '{fmt}'. Opciones: {', '.join(IMAGE_FORMATS)}.")
+        if self.cache_dir is None:
+            raise RuntimeError("ChartRenderer no inicializado. Llama a init_app(app) primero.")
+        if not self.available():
+            raise RuntimeError("Se necesitan 'plotly' y 'kaleido' para renderizar gráficos (`pip install plotly kaleido`).")
+
+        payloads = [_canonical_json(figure) for figure in figures]
+        keys = [_render_key(payload, fmt, width, height, scale) for payload in payloads]
+        rendered: Dict[str, bytes] = {}
+        for key in set(keys):
+            cached = self._read_cached(key, fmt)
+            if cached is not None:
+                rendered[key] = cached
+
+        misses = {key: payload for key, payload in zip(keys, payloads) if key not in rendered}
+        if misses:
+            executor = self._get_executor()
+            futures = {executor.submit(_render_figure, payload, fmt, width, height, scale): key
+                       for key, payload in misses.items()}
+            done, not_done = wait_futures(futures, timeout=self.timeout)
+            for future in not_done:
+                future.cancel()
+            if not_done:
+                raise RuntimeError(f"El renderizado de {len(not_done)} gráfico(s) superó {self.timeout:.0f} s.")
+            for future in done:
+                key = futures[future]
+                try:
+                    rendered[key] = future.result()
+                except Exception as e:
+                    raise RuntimeError(f"No se pudo renderizar el gráfico: {type(e).__name__}: {e}") from e
+                self._write_cached(key, fmt, rendered[key])
+            self._evict()
+            logger.info(f"Renderizados {len(misses)} gráfico(s) {fmt.upper()} "
+                        f"({len(set(keys)) - len(misses)} desde caché).")
+        return [rendered[key] for key in keys]
+
+    def build_pdf_report(self, figures: List[Dict[str, Any]], width: int = DEFAULT_IMAGE_WIDTH,
+                         height: int = DEFAULT_IMAGE_HEIGHT) -> bytes:
+        """
+        Informe PDF con una página (vectorial) por figura.
+
+        Raises:
+            ValueError: Si no hay figuras.
+            RuntimeError: Faltan dependencias (plotly/kaleido/pypdf) o falla el renderizado.
+        """
+        if not figures:
+            raise ValueError("El resultado no contiene gráficos para el informe.")
+        if PdfWriter is None:
+            raise RuntimeError("La librería 'pypdf' es necesaria para el informe PDF multipágina (`pip install pypdf`).")
+        pages = self.render_many(figures, fmt='pdf', width=width, height=height, scale=1.0)
+        writer = PdfWriter()
+        for page_pdf in pages:
+            for page in PdfReader(io.BytesIO(page_pdf)).pages:
+                writer.add_page(page)
+        output = io.BytesIO()
+        writer.write(output)
+        return output.getvalue()
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Cierra el pool de renderizadores (llamado al terminar el proceso)."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait, cancel_futures=not wait)
+                self._executor = None
+
+    # --- Internos ---
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Crea el pool de forma diferida; cada worker arranca kaleido una vez en el initializer."""
+        with self._lock:
+            if self._executor is None:
+                context = multiprocessing.get_context(self.start_method)
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context,
+                                                     initializer=_init_render_worker)
+                logger.info(f"Pool de renderizado creado ({self.max_workers} workers, método '{self.start_method}').")
+            return self._executor
+
+    def _cache_path(self, key: str, fmt: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.{fmt}"
+
+    def _read_cached(self, key: str, fmt: str) -> Optional[bytes]:
+        path = self._cache_path(key, fmt)
+        try:
+            data = path.read_bytes()
+            os.utime(path)  # Marca de uso reciente para el desalojo LRU
+            return data
+        except OSError:
+            return None
+
+    def _write_cached(self, key: str, fmt: str, data: bytes) -> None:
+        path = self._cache_path(key, fmt)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{key[:12]}.")
+            with os.fdopen(fd, 'wb') as fh:
+                fh.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"No se pudo guardar el gráfico renderizado '{key[:12]}' en caché: {e}")
+
+    def _evict(self) -> None:
+        """Borra los renderizados menos usados recientemente hasta quedar bajo max_bytes."""
+        entries = []
+        for path in self.cache_dir.glob('*/*.*'):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries, key=lambda item: item[0]):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+
+# Instancia global (inicialización diferida con init_app)
+chart_renderer = ChartRenderer()
+
+
+# --- Funciones Auxiliares ---
+
+def _canonical_json(figure: Dict[str, Any]) -> str:
+    """JSON estable de la figura (misma figura -> mismo hash)."""
+    return json.dumps(figure, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+
+def _render_key(payload: str, fmt: str, width: int, height: int, scale: float) -> str:
+    material = f"{RENDER_FORMAT_VERSION}|{fmt}|{width}x{height}@{scale}|{payload}"
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+# --- Funciones del proceso renderizador ---
+
+def _init_render_worker() -> None:
+    """Initializer del pool: importa plotly, desactiva MathJax (sin red) y arranca kaleido con una figura mínima."""
+    try:
+        import plotly.io as pio
+        scope = getattr(getattr(pio, 'kaleido', None), 'scope', None)
+        if scope is not None and hasattr(scope, 'mathjax'):
+            scope.mathjax = None
+        pio.to_image(_WARMUP_FIGURE, format='png', width=16, height=16)
+    except Exception as e:  # Un fallo aquí no debe romper el pool; el error real saldrá al renderizar
+        logger.warning(f"Calentamiento del renderizador falló (pid {os.getpid()}): {e}")
+
+def _render_figure(payload: str, fmt: str, width: int, height: int, scale: float) -> bytes:
+    import plotly.io as pio
+    return pio.to_image(json.loads(payload), format=fmt, width=width, height=height, scale=scale, validate=False)
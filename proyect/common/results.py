@@ -0,0 +1,113 @@
+# pricing_dashboard/proyect/common/results.py
+# -*- coding: utf-8 -*-
+"""
+Resolución de resultados de análisis a partir de una referencia.
+
+Las páginas de resultados, la exportación y la API JSON identifican un
+resultado por `source_ref`: el id de un análisis (job_id, también clave del
+catálogo) o la clave de la caché de resultados. El resultado de una referencia
+no cambia nunca (un trabajo terminado es inmutable y la clave de caché es el
+hash del contenido), lo que permite cachearlo en el navegador sin revalidar.
+
+Las páginas de resultados solo necesitan el índice (load_analysis_index); la
+API y la exportación cargan el resultado completo (load_analysis_results).
+"""
+
+import logging
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from flask import url_for
+
+from proyect.common.cache import result_cache
+from proyect.common.catalog import analysis_catalog
+from proyect.common.export import result_index
+from proyect.common.jobs import jobs, JOB_DONE
+
+logger = logging.getLogger(__name__)
+
+# --- Constantes y Configuraciones ---
+# Campos de la ejecución (estado del trabajo / fila del catálogo) que no se copian al meta de la caché
+_RUN_FIELDS = frozenset({'job_id', 'id', 'status', 'error', 'traceback', 'pid', 'server_pid', 'rss_bytes', 'progress',
+                         'created_at', 'started_at', 'finished_at', 'queue_seconds', 'run_seconds',
+                         'artifact_path', 'artifact_bytes', 'input_hash', 'cache_key'})
+
+
+def load_analysis_results(source_ref: str, analysis_type: Optional[str] = None
+                          ) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """
+    (resultados, meta) de `source_ref`, o None si no existe, no ha terminado, no
+    es del tipo `analysis_type` (si se indica) o su resultado no se puede leer.
+    Orden: caché de resultados, artefactos del catálogo, resultado del trabajo
+    (lo leído de estos dos se guarda en la caché). `meta` lleva analysis_type,
+    filename, cache_key y los parámetros del análisis (p.ej. price_metric_col).
+    """
+    entry = analysis_catalog.get(source_ref) or jobs.get_status(source_ref)
+    if entry is not None:
+        meta = _entry_meta(entry, analysis_type)
+        if meta is None:
+            return None
+        cached = result_cache.get(meta.get('cache_key')) if meta.get('cache_key') else None
+        if cached is not None:
+            return cached[0], meta
+        results = analysis_catalog.load_results(source_ref)
+        if results is None:
+            try:
+                results = jobs.load_result(source_ref)
+            except KeyError:
+                return None
+            except Exception as e:  # Sin result.pkl (caducado o ya en el catálogo) o ilegible
+                logger.warning(f"Resultado del análisis {source_ref} no disponible: {e}")
+                return None
+        result_cache.put(meta.get('cache_key'), results,
+                         meta={key: value for key, value in meta.items() if key not in _RUN_FIELDS})
+        return results, meta
+
+    cached = result_cache.get(source_ref)
+    if cached is None or (analysis_type and cached[1].get('analysis_type') != analysis_type):
+        return None
+    return cached[0], dict(cached[1], cache_key=source_ref)
+
+def load_analysis_index(source_ref: str, analysis_type: Optional[str] = None
+                        ) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """
+    (índice, meta) de `source_ref` para las páginas de resultados: nombres de
+    tablas y gráficos e insights (proyect.common.export.result_index). Se lee del
+    manifest del catálogo o de la caché sin deserializar el resultado; solo si no
+    hay manifest con índice se carga el resultado (load_analysis_results).
+    """
+    entry = analysis_catalog.get(source_ref) or jobs.get_status(source_ref)
+    if entry is not None:
+        meta = _entry_meta(entry, analysis_type)
+        if meta is None:
+            return None
+        index = analysis_catalog.load_index(source_ref)
+        if index is None:
+            cached = result_cache.get_index(meta.get('cache_key'))
+            index = cached[0] if cached is not None else None
+        if index is not None:
+            return index, meta
+    else:
+        cached = result_cache.get_index(source_ref)
+        if cached is not None:
+            if analysis_type and cached[1].get('analysis_type') != analysis_type:
+                return None
+            return cached[0], dict(cached[1], cache_key=source_ref)
+    loaded = load_analysis_results(source_ref, analysis_type)
+    return (result_index(loaded[0]), loaded[1]) if loaded is not None else None
+
+def figure_urls(source_ref: str, names: Iterable[str]) -> Dict[str, str]:
+    """URLs de la API (/api/v1) de cada figura (nombres del índice), para las páginas de resultados."""
+    return {name: url_for('api.figure', source_ref=source_ref, name=name) for name in names}
+
+def table_urls(source_ref: str, names: Iterable[str]) -> Dict[str, str]:
+    """URLs de la API de cada tabla (nombres del índice; páginas con scroll virtual, ver common.tables)."""
+    return {name: url_for('api.table', source_ref=source_ref, name=name) for name in names}
+
+
+# --- Funciones Auxiliares ---
+
+def _entry_meta(entry: Dict[str, Any], analysis_type: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Meta de un análisis del catálogo o de un trabajo; None si no ha terminado o no es de `analysis_type`."""
+    if entry.get('status') != JOB_DONE or (analysis_type and entry.get('analysis_type') != analysis_type):
+        return None
+    return {key: value for key, value in entry.items() if key not in ('params', 'created_date')}
@@ -0,0 +1,116 @@
+# pricing_dashboard/proyect/common/streaming.py
+# -*- coding: utf-8 -*-
+"""
+Renderizado de plantillas en streaming.
+
+`render_template` construye la página completa en memoria antes de enviar el
+primer byte. `render_streamed` envía el HTML a medida que Jinja lo genera
+(`Template.generate` dentro de `stream_with_context`): el layout, la cabecera y
+los contenedores de los gráficos llegan al navegador de inmediato, y los
+fragmentos pesados (tablas) se envían según se producen.
+
+- La salida se agrupa en bloques de STREAM_BUFFER_BYTES; `{{ stream_flush() }}`
+  en una plantilla fuerza el envío de lo acumulado hasta ese punto.
+- Las cabeceras (y la cookie de sesión) salen antes de renderizar, así que los
+  mensajes flash y el token CSRF se materializan antes de empezar.
+- Con STREAM_TEMPLATES=False se usa el render_template de siempre.
+
+Uso en una vista:
+    return render_streamed('moca/results_moca.html', filename=filename, ...)
+"""
+
+import html
+import logging
+from typing import Any, Iterable, Iterator, Optional
+
+import pandas as pd
+from flask import (Response, current_app, g, get_flashed_messages, render_template,
+                   stream_with_context)
+from flask_wtf.csrf import generate_csrf
+from markupsafe import Markup
+
+logger = logging.getLogger(__name__)
+
+# --- Constantes y Configuraciones ---
+STREAM_FLUSH_MARKER = '<!--stream-flush-->'
+DEFAULT_STREAM_BUFFER_BYTES = 16 * 1024
+STREAM_ERROR_HTML = ('<div class="alert alert-danger m-3" role="alert">'
+                     'Error al generar la página. Recárgala o inténtalo más tarde.</div>')
+
+
+def render_streamed(template_name: str, **context: Any):
+    """Respuesta HTML generada en streaming (o render_template si STREAM_TEMPLATES está desactivado)."""
+    app = current_app._get_current_object()
+    if not app.config.get('STREAM_TEMPLATES', True):
+        return render_template(template_name, **context)
+
+    # La plantilla no puede modificar la sesión una vez enviadas las cabeceras
+    get_flashed_messages(with_categories=True)
+    if 'csrf' in app.extensions:
+        generate_csrf()
+
+    g._stream_template = True
+    app.update_template_context(context)
+    template = app.jinja_env.get_or_select_template(template_name)
+    buffer_bytes = int(app.config.get('STREAM_BUFFER_BYTES', DEFAULT_STREAM_BUFFER_BYTES))
+    chunks = _buffered(template.generate(context), buffer_bytes, template_name)
+    response = Response(stream_with_context(chunks), mimetype='text/html')
+    response.headers['X-Accel-Buffering'] = 'no'  # Nginx: no acumular la respuesta
+    return response
+
+def stream_flush() -> Markup:
+    """Global Jinja: punto de envío en una plantilla servida con render_streamed (vacío en otro caso)."""
+    return Markup(STREAM_FLUSH_MARKER) if g.get('_stream_template') else Markup('')
+
+def iter_html_table(frames: Iterable[pd.DataFrame], classes: str = 'table table-sm',
+                    max_rows: Optional[int] = None) -> Iterator[Markup]:
+    """
+    Tabla HTML por fragmentos (cabecera y luego las filas de cada DataFrame de `frames`),
+    para pintarla con `{% for fragment in tabla %}{{ fragment }}{% endfor %}` sin
+    construir el HTML completo en memoria. Los valores se escapan; los nulos quedan vacíos.
+    """
+    remaining = max_rows
+    header_sent = False
+    for frame in frames:
+        if not header_sent:
+            header = ''.join(f'<th>{html.escape(str(col))}</th>' for col in frame.columns)
+            yield Markup(f'<table class="{html.escape(classes)}"><thead><tr>{header}</tr></thead><tbody>')
+            header_sent = True
+        if remaining is not None:
+            frame = frame.iloc[:remaining]
+            remaining -= len(frame)
+        rows = []
+        for values in frame.itertuples(index=False, name=None):
+            cells = ''.join(f'<td>{"" if pd.isna(value) else html.escape(str(value))}</td>' for value in values)
+            rows.append(f'<tr>{cells}</tr>')
+        yield Markup(''.join(rows))
+        if remaining is not None and remaining <= 0:
+            break
+    if header_sent:
+        yield Markup('</tbody></table>')
+
+
+# --- Funciones Auxiliares ---
+
+def _buffered(fragments: Iterator[str], buffer_bytes: int, template_name: str) -> Iterator[bytes]:
+    """Agrupa los fragmentos de Jinja en bloques; envía al llegar a STREAM_FLUSH_MARKER o al tamaño de buffer."""
+    buffer, size = [], 0
+    try:
+        for fragment in fragments:
+            if STREAM_FLUSH_MARKER in fragment:
+                before, _, after = fragment.partition(STREAM_FLUSH_MARKER)
+                buffer.append(before)
+                yield ''.join(buffer).encode('utf-8')
+                buffer, size = [after.replace(STREAM_FLUSH_MARKER, '')], len(after)
+                continue
+            buffer.append(fragment)
+            size += len(fragment)
+            if size >= buffer_bytes:
+                yield ''.join(buffer).encode('utf-8')
+                buffer, size = [], 0
+    except Exception as e:
+        # Las cabeceras ya se enviaron (200): se cierra la página con un aviso en lugar de cortarla
+        logger.error(f"Error generando la plantilla '{template_name}' en streaming: {e}", exc_info=True)
+        buffer.append(STREAM_ERROR_HTML)
+    if buffer:
+        yield ''.join(buffer).encode('utf-8')
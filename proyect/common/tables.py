@@ -0,0 +1,221 @@
+# pricing_dashboard/proyect/common/tables.py
+# -*- coding: utf-8 -*-
+"""
+Servicio de tablas: páginas de un DataFrame de resultados con orden, filtro y
+búsqueda en el servidor.
+
+Las páginas de resultados ya no incrustan la tabla completa (DataFrame.to_html);
+una tabla con scroll virtual pide a la API solo las filas visibles. Por tabla
+(source_ref, nombre) se guarda en una LRU un índice con:
+- El orden de cada columna (argsort estable, nulos al final), calculado la
+  primera vez que se ordena por ella y reutilizado en ambos sentidos.
+- El texto de búsqueda por fila (todas las columnas en minúsculas).
+- Las últimas vistas (orden + filtros + búsqueda -> posiciones de fila), de modo
+  que recorrer una vista filtrada cuesta O(tamaño de página) por petición.
+
+Filtros por columna (`filters`: {columna: expresión}):
+- Columnas numéricas: comparación '>=10', '<5', '=3', '!=0' (sin operador: igualdad).
+- Resto: contiene el texto (sin distinguir mayúsculas).
+
+Uso (igual que otras extensiones Flask):
+    table_service = TableService()          # instancia global (este módulo)
+    table_service.init_app(app)             # en initialize_extensions
+    page = table_service.page((source_ref, name), loader, offset=0, limit=100, sort='Score', order='desc')
+"""
+
+import json
+import logging
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# --- Constantes y Configuraciones ---
+DEFAULT_TABLE_INDEX_ITEMS = 16       # Tablas indexadas en memoria por proceso
+DEFAULT_PAGE_ROWS = 100              # Filas por página si no se indica 'limit'
+DEFAULT_PAGE_MAX_ROWS = 1000         # Tope de 'limit'
+VIEWS_PER_TABLE = 8                  # Vistas (orden + filtros) recordadas por tabla
+SORT_ORDERS = ('asc', 'desc')
+SEARCH_SEPARATOR = '\x1f'            # Separa columnas en el texto de búsqueda (no aparece en los datos)
+_NUMERIC_FILTER_RE = re.compile(r'^\s*(>=|<=|!=|>|<|=)?\s*(-?\d+(?:[.,]\d+)?)\s*$')
+
+
+class _TableIndex:
+    """DataFrame de una tabla con sus índices de orden, texto de búsqueda y vistas recientes."""
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df.reset_index(drop=True)
+        self.columns = [str(col) for col in self.df.columns]
+        self.df.columns = self.columns
+        self._orders: Dict[Tuple[str, str], np.ndarray] = {}
+        self._search_text: Optional[pd.Series] = None
+        self._views: 'OrderedDict[Tuple, np.ndarray]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def column_types(self) -> List[Dict[str, str]]:
+        """[{'name', 'type'}] con type 'number', 'bool' o 'text' (para alinear y filtrar en el cliente)."""
+        return [{'name': col, 'type': _column_type(self.df[col])} for col in self.columns]
+
+    def view(self, sort: Optional[str], order: str, search: str, filters: Dict[str, str]) -> Optional[np.ndarray]:
+        """Posiciones de fila de la vista, o None si es la tabla completa sin ordenar."""
+        key = (sort, order, search, tuple(sorted(filters.items())))
+        with self._lock:
+            cached = self._views.get(key)
+            if cached is not None:
+                self._views.move_to_end(key)
+                return cached
+        positions = self.sort_order(sort, order) if sort else None
+        mask = self._mask(search, filters)
+        if mask is not None:
+            positions = np.flatnonzero(mask) if positions is None else positions[mask[positions]]
+        if positions is not None:
+            with self._lock:
+                self._views[key] = positions
+                while len(self._views) > VIEWS_PER_TABLE:
+                    self._views.popitem(last=False)
+        return positions
+
+    def sort_order(self, column: str, order: str) -> np.ndarray:
+        """Posiciones de fila ordenadas por `column` (nulos al final); se calcula una vez por columna."""
+        cached = self._orders.get((column, order))
+        if cached is not None:
+            return cached
+        series = self.df[column]
+        nulls = series.isna().to_numpy()
+        valid = np.flatnonzero(~nulls)
+        values = series[~nulls]
+        if not pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_datetime64_any_dtype(values):
+            values = values.astype(str).str.lower()
+        ascending = valid[np.argsort(values.to_numpy(), kind='stable')]
+        null_rows = np.flatnonzero(nulls)
+        orders = {'asc': np.concatenate([ascending, null_rows]),
+                  'desc': np.concatenate([ascending[::-1], null_rows])}
+        with self._lock:
+            self._orders[(column, 'asc')] = orders['asc']
+            self._orders[(column, 'desc')] = orders['desc']
+        return orders[order]
+
+    def _mask(self, search: str, filters: Dict[str, str]) -> Optional[np.ndarray]:
+        mask = None
+        if search:
+            mask = self._search_series().str.contains(search.lower(), regex=False).to_numpy()
+        for column, expression in filters.items():
+            matched = _filter_mask(self.df[column], expression)
+            mask = matched if mask is None else (mask & matched)
+        return mask
+
+    def _search_series(self) -> pd.Series:
+        if self._search_text is None:
+            text = pd.Series('', index=self.df.index)
+            for col in self.columns:
+                text = text + self.df[col].astype(str).str.lower() + SEARCH_SEPARATOR
+            self._search_text = text
+        return self._search_text
+
+
+class TableService:
+    """Páginas de tablas de resultados con índices de orden cacheados (LRU por proceso)."""
+
+    def __init__(self, app=None):
+        self.index_items = DEFAULT_TABLE_INDEX_ITEMS
+        self.page_max_rows = DEFAULT_PAGE_MAX_ROWS
+        self._indexes: 'OrderedDict[Hashable, _TableIndex]' = OrderedDict()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        """Lee la configuración (TABLE_INDEX_ITEMS, TABLE_PAGE_MAX_ROWS)."""
+        self.index_items = int(app.config.get('TABLE_INDEX_ITEMS', DEFAULT_TABLE_INDEX_ITEMS))
+        self.page_max_rows = int(app.config.get('TABLE_PAGE_MAX_ROWS', DEFAULT_PAGE_MAX_ROWS))
+        app.extensions['table_service'] = self
+        logger.info(f"TableService inicializado: {self.index_items} tablas indexadas, "
+                    f"máx. {self.page_max_rows} filas por página.")
+
+    def page(self, key: Hashable, loader: Callable[[], pd.DataFrame], offset: int = 0,
+             limit: int = DEFAULT_PAGE_ROWS, sort: Optional[str] = None, order: str = 'asc',
+             search: str = '', filters: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """
+        Página de la tabla `key` ({columns, total, filtered, offset, limit, sort, order, data}).
+        `loader` solo se llama si la tabla no está indexada. Lanza ValueError si los
+        parámetros no son válidos (columna inexistente, orden o límites fuera de rango).
+        """
+        filters = {str(col): str(expr) for col, expr in (filters or {}).items() if str(expr).strip()}
+        if offset < 0:
+            raise ValueError("'offset' no puede ser negativo.")
+        if not 1 <= limit <= self.page_max_rows:
+            raise ValueError(f"'limit' debe estar entre 1 y {self.page_max_rows}.")
+        if order not in SORT_ORDERS:
+            raise ValueError(f"'order' debe ser uno de {', '.join(SORT_ORDERS)}.")
+
+        index = self._index(key, loader)
+        for column in ([sort] if sort else []) + list(filters):
+            if column not in index.columns:
+                raise ValueError(f"Columna '{column}' no encontrada en la tabla.")
+
+        positions = index.view(sort, order, search.strip(), filters)
+        filtered = len(index.df) if positions is None else len(positions)
+        if positions is None:
+            rows = index.df.iloc[offset:offset + limit]
+        else:
+            rows = index.df.iloc[positions[offset:offset + limit]]
+        return {
+            'columns': index.column_types(),
+            'total': int(len(index.df)),
+            'filtered': int(filtered),
+            'offset': offset,
+            'limit': limit,
+            'sort': sort,
+            'order': order,
+            'data': json.loads(rows.to_json(orient='values', date_format='iso', force_ascii=False)),
+        }
+
+    def invalidate(self, key: Hashable) -> None:
+        """Olvida el índice de una tabla (p.ej. si su resultado se ha eliminado)."""
+        with self._lock:
+            self._indexes.pop(key, None)
+
+    def _index(self, key: Hashable, loader: Callable[[], pd.DataFrame]) -> _TableIndex:
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is not None:
+                self._indexes.move_to_end(key)
+                return index
+        index = _TableIndex(loader())
+        with self._lock:
+            self._indexes[key] = index
+            while len(self._indexes) > self.index_items:
+                self._indexes.popitem(last=False)
+        return index
+
+
+# Instancia global (inicialización diferida con init_app)
+table_service = TableService()
+
+
+# --- Funciones Auxiliares ---
+
+def _column_type(series: pd.Series) -> str:
+    if pd.api.types.is_bool_dtype(series):
+        return 'bool'
+    if pd.api.types.is_numeric_dtype(series):
+        return 'number'
+    return 'text'
+
+def _filter_mask(series: pd.Series, expression: str) -> np.ndarray:
+    """Máscara de filas que cumplen `expression` (comparación numérica o 'contiene')."""
+    match = _NUMERIC_FILTER_RE.match(expression)
+    if match and pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        operator, number = match.group(1) or '=', float(match.group(2).replace(',', '.'))
+        values = series.to_numpy(dtype=float, na_value=np.nan)
+        with np.errstate(invalid='ignore'):
+            result = {'>=': values >= number, '<=': values <= number, '>': values > number,
+                      '<': values < number, '=': values == number, '!=': values != number}[operator]
+        return result & ~np.isnan(values)
+    return series.astype(str).str.lower().str.contains(expression.strip().lower(), regex=False).to_numpy()
+
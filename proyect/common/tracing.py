@@ -0,0 +1,263 @@
+# pricing_dashboard/proyect/common/tracing.py
+# -*- coding: utf-8 -*-
+"""
+Trazas de peticiones lentas por muestreo continuo de pilas.
+
+Complementa al perfilado bajo demanda (proyect.common.profiling): siempre activo y
+con coste bajo, para capturar los casos raros (el archivo patológico) sin perfilar
+cada petición.
+
+- Cada petición se registra con el identificador de su hilo.
+- Un hilo de fondo toma cada SLOW_TRACE_INTERVAL segundos la pila de los hilos
+  con peticiones en curso (`sys._current_frames`) y la acumula por petición como
+  pila plegada ("raíz;...;hoja" -> nº de muestras).
+- Al cerrar la respuesta, si la petición superó SLOW_TRACE_THRESHOLD segundos se
+  guardan sus muestras en SLOW_TRACE_FOLDER (por defecto instance/slow_requests):
+  <id>.json (endpoint, duración, tamaño de la subida, filas y bytes del archivo
+  leído, pilas más frecuentes) y <id>.folded (formato "collapsed stack": speedscope,
+  flamegraph.pl). Las peticiones rápidas solo descartan su registro.
+- Respuestas en streaming: cuenta el tiempo hasta el primer bloque del cuerpo
+  (no hasta el cierre, que depende del cliente) y se deja de muestrear ahí.
+- No se trazan los endpoints de larga duración por diseño (SSE, long-poll):
+  SLOW_TRACE_EXEMPT_ENDPOINTS y cualquier respuesta text/event-stream.
+
+read_data_file informa filas y bytes del archivo con `annotate_request_input`.
+
+Uso (igual que otras extensiones Flask):
+    slow_tracer = SlowRequestTracer()       # instancia global (este módulo)
+    slow_tracer.init_app(app)               # en initialize_extensions
+"""
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Iterator, Optional
+
+from flask import request
+
+logger = logging.getLogger(__name__)
+
+# --- Constantes y Configuraciones ---
+DEFAULT_SLOW_TRACE_THRESHOLD = 5.0   # Segundos a partir de los que se guarda la traza
+DEFAULT_SLOW_TRACE_INTERVAL = 0.05   # Segundos entre muestras
+DEFAULT_SLOW_TRACE_KEEP = 100        # Trazas conservadas (se borran las más antiguas)
+SLOW_TRACES_DIRNAME = 'slow_requests'
+MAX_STACK_DEPTH = 64                 # Marcos por muestra (desde la hoja)
+MAX_STACKS_PER_REQUEST = 2000        # Pilas distintas por petición (acota la memoria)
+TOP_STACKS_IN_SUMMARY = 20
+DEFAULT_SLOW_TRACE_EXEMPT_ENDPOINTS = ('jobs.events',)  # Progreso de trabajos por SSE
+EVENT_STREAM_MIMETYPE = 'text/event-stream'
+
+
+class _RequestTrace:
+    """Muestras acumuladas de una petición en curso."""
+
+    __slots__ = ('endpoint', 'method', 'path', 'upload_bytes', 'started', 'stacks', 'samples', 'input')
+
+    def __init__(self, endpoint: Optional[str], method: str, path: str, upload_bytes: Optional[int]):
+        self.endpoint = endpoint
+        self.method = method
+        self.path = path
+        self.upload_bytes = upload_bytes
+        self.started = time.perf_counter()
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.input: Dict[str, Any] = {}
+
+
+class SlowRequestTracer:
+    """Muestreo de pilas de las peticiones en curso y persistencia de las lentas (extensión Flask)."""
+
+    def __init__(self, app=None):
+        self.enabled = True
+        self.threshold = DEFAULT_SLOW_TRACE_THRESHOLD
+        self.interval = DEFAULT_SLOW_TRACE_INTERVAL
+        self.keep = DEFAULT_SLOW_TRACE_KEEP
+        self.folder: Optional[Path] = None
+        self.exempt_endpoints: FrozenSet[str] = frozenset(DEFAULT_SLOW_TRACE_EXEMPT_ENDPOINTS)
+        self._active: Dict[int, _RequestTrace] = {}
+        self._lock = threading.Lock()
+        self._sampler_pid: Optional[int] = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        """Lee la configuración (SLOW_TRACE_ENABLED, SLOW_TRACE_THRESHOLD, SLOW_TRACE_INTERVAL, SLOW_TRACE_KEEP,
+        SLOW_TRACE_FOLDER, SLOW_TRACE_EXEMPT_ENDPOINTS)."""
+        self.enabled = bool(app.config.get('SLOW_TRACE_ENABLED', True))
+        self.threshold = float(app.config.get('SLOW_TRACE_THRESHOLD', DEFAULT_SLOW_TRACE_THRESHOLD))
+        self.interval = float(app.config.get('SLOW_TRACE_INTERVAL', DEFAULT_SLOW_TRACE_INTERVAL))
+        self.keep = int(app.config.get('SLOW_TRACE_KEEP', DEFAULT_SLOW_TRACE_KEEP))
+        self.folder = Path(app.config.get('SLOW_TRACE_FOLDER') or Path(app.instance_path) / SLOW_TRACES_DIRNAME)
+        self.exempt_endpoints = frozenset(app.config.get('SLOW_TRACE_EXEMPT_ENDPOINTS', DEFAULT_SLOW_TRACE_EXEMPT_ENDPOINTS))
+        app.extensions['slow_tracer'] = self
+        if not self.enabled:
+            logger.info("SlowRequestTracer desactivado (SLOW_TRACE_ENABLED=False).")
+            return
+        self.folder.mkdir(parents=True, exist_ok=True)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        logger.info(f"SlowRequestTracer inicializado: umbral {self.threshold:g} s, muestra cada "
+                    f"{self.interval * 1000:g} ms, trazas en '{self.folder}'.")
+
+    def annotate(self, **fields: Any) -> None:
+        """Añade datos de entrada (p.ej. rows, file_bytes) a la petición del hilo actual, si se está trazando."""
+        trace = self._active.get(threading.get_ident())
+        if trace is not None:
+            trace.input.update(fields)
+
+    # --- Hooks ---
+
+    def _before_request(self) -> None:
+        if request.endpoint in self.exempt_endpoints:
+            return
+        self._ensure_sampler()
+        upload_bytes = request.content_length if request.mimetype == 'multipart/form-data' else None
+        trace = _RequestTrace(request.endpoint, request.method, request.path, upload_bytes)
+        with self._lock:
+            self._active[threading.get_ident()] = trace
+
+    def _after_request(self, response):
+        ident = threading.get_ident()
+        trace = self._active.get(ident)
+        if trace is None:
+            return response
+        if response.mimetype == EVENT_STREAM_MIMETYPE:  # Abierta mientras el cliente escuche: no es lentitud
+            self._release(ident, trace)
+            return response
+        status = response.status_code
+        if response.is_streamed and not response.direct_passthrough:
+            # Cuenta hasta el primer bloque; el resto del cuerpo depende del ritmo del cliente
+            response.response = self._on_first_chunk(response.response, lambda: self._finish(ident, trace, status))
+        # Sin referencia a `response`: no crear un ciclo respuesta -> callback
+        response.call_on_close(lambda: self._finish(ident, trace, status))
+        return response
+
+    def _finish(self, ident: int, trace: _RequestTrace, status: int) -> None:
+        """Deja de muestrear la petición y la persiste si superó el umbral (solo la primera vez)."""
+        if not self._release(ident, trace):
+            return
+        duration = time.perf_counter() - trace.started
+        if duration >= self.threshold:
+            self._persist(trace, status, duration)
+
+    def _release(self, ident: int, trace: _RequestTrace) -> bool:
+        """Quita la traza de las peticiones en curso; False si ya se había quitado."""
+        with self._lock:
+            if self._active.get(ident) is not trace:
+                return False
+            del self._active[ident]
+            return True
+
+    @staticmethod
+    def _on_first_chunk(body: Iterable, callback: Callable[[], None]) -> Iterator:
+        """Itera `body` llamando a `callback` antes de entregar el primer bloque."""
+        try:
+            iterator = iter(body)
+            first = next(iterator, None)
+            callback()
+            if first is not None:
+                yield first
+                yield from iterator
+        finally:
+            close = getattr(body, 'close', None)
+            if close is not None:
+                close()
+
+    # --- Muestreo ---
+
+    def _ensure_sampler(self) -> None:
+        """Arranca el hilo de muestreo en este proceso (los hilos no sobreviven al fork de los workers)."""
+        pid = os.getpid()
+        if self._sampler_pid == pid:
+            return
+        with self._lock:
+            if self._sampler_pid == pid:
+                return
+            self._active.clear()
+            thread = threading.Thread(target=self._sample_loop, name='slow-request-sampler', daemon=True)
+            thread.start()
+            self._sampler_pid = pid
+
+    def _sample_loop(self) -> None:
+        own_ident = threading.get_ident()
+        while True:
+            time.sleep(self.interval)
+            if not self._active:
+                continue
+            # Con el lock: una petición que termina no se persiste mientras se le añaden muestras
+            with self._lock:
+                frames = sys._current_frames()
+                try:
+                    for ident, trace in self._active.items():
+                        frame = frames.get(ident)
+                        if frame is None or ident == own_ident:
+                            continue
+                        stack = _fold_stack(frame)
+                        if stack in trace.stacks or len(trace.stacks) < MAX_STACKS_PER_REQUEST:
+                            trace.stacks[stack] += 1
+                        trace.samples += 1
+                except Exception as e:  # El muestreo nunca debe detener el hilo
+                    logger.error(f"Error muestreando pilas de peticiones: {e}", exc_info=True)
+                finally:
+                    frame = frames = None  # No retener marcos (y sus variables locales) hasta la siguiente muestra
+
+    def _persist(self, trace: _RequestTrace, status: int, duration: float) -> None:
+        trace_id = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+        summary = {
+            'id': trace_id, 'endpoint': trace.endpoint, 'method': trace.method, 'path': trace.path,
+            'status': status, 'duration_ms': round(duration * 1000, 1), 'created_at': time.time(),
+            'upload_bytes': trace.upload_bytes, 'input': trace.input,
+            'interval_ms': self.interval * 1000, 'samples': trace.samples,
+            'top_stacks': [{'stack': stack, 'samples': count}
+                           for stack, count in trace.stacks.most_common(TOP_STACKS_IN_SUMMARY)],
+        }
+        try:
+            folded = ''.join(f"{stack} {count}\n" for stack, count in trace.stacks.items())
+            (self.folder / f"{trace_id}.folded").write_text(folded, encoding='utf-8')
+            (self.folder / f"{trace_id}.json").write_text(json.dumps(summary, ensure_ascii=False, default=str),
+                                                           encoding='utf-8')
+            _prune(self.folder, self.keep)
+        except OSError as e:
+            logger.error(f"No se pudo guardar la traza de petición lenta '{trace_id}': {e}")
+            return
+        logger.warning(f"Petición lenta: {trace.method} {trace.path} -> {status} en {duration:.1f} s "
+                       f"({trace.samples} muestras, entrada {trace.input or '-'}). Traza '{trace_id}'.")
+
+
+# Instancia global (inicialización diferida con init_app)
+slow_tracer = SlowRequestTracer()
+
+
+def annotate_request_input(**fields: Any) -> None:
+    """Datos de entrada de la petición en curso para su traza (sin efecto fuera de una petición trazada)."""
+    slow_tracer.annotate(**fields)
+
+
+# --- Funciones Auxiliares ---
+
+def _fold_stack(frame) -> str:
+    """Pila plegada 'raíz;...;hoja' con 'función (archivo:línea)' por marco."""
+    parts = []
+    while frame is not None and len(parts) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ';'.join(reversed(parts))
+
+def _prune(folder: Path, keep: int) -> None:
+    """Borra las trazas más antiguas por encima de `keep`."""
+    ids = sorted({path.name.split('.', 1)[0] for path in folder.glob('*.json')})
+    for trace_id in ids[:max(len(ids) - keep, 0)]:
+        for path in folder.glob(f"{trace_id}.*"):
+            try:
+                path.unlink()
+            except OSError:
+                pass
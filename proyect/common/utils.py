@@ -5,18 +5,30 @@ Helpers compartidos para el dashboard de pricing.
 Contiene funciones reutilizables en todos los módulos (MaxDiff, ComStrat, Main).
 """
 
+import codecs
 import logging
+import time
 from pathlib import Path
-from typing import Union
+from typing import Iterator, Optional, Union
 import pandas as pd
 from flask import session
 
+from proyect.common.history import set_history_status
+from proyect.common.metrics import observe_file_read
+from proyect.common.tracing import annotate_request_input
+
 logger = logging.getLogger(__name__)
 
 # --- Funciones Requeridas por main/routes.py ---
 
 # Extensiones permitidas
 ALLOWED_EXTENSIONS = {'xlsx', 'xls', 'csv'}
+# Filas por bloque en la lectura por streaming (iter_data_file_chunks)
+DEFAULT_CHUNK_ROWS = 50_000
+# Filas mostradas en las vistas previas (solo se lee el primer bloque del archivo)
+PREVIEW_ROWS = 5
+# Bloque de lectura al comprobar si un CSV es UTF-8 válido (_detect_csv_encoding)
+ENCODING_PROBE_BLOCK_BYTES = 1024 * 1024
 
 def allowed_file(filename: str) -> bool:
     """
@@ -27,9 +39,10 @@ def allowed_file(filename: str) -> bool:
         filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
     )
 
-def read_data_file(filepath: Union[str, Path]) -> pd.DataFrame:
+def read_data_file(filepath: Union[str, Path], sheet_name: Optional[str] = None) -> pd.DataFrame:
     """
     Lee un archivo Excel (.xlsx, .xls) o CSV y devuelve un pandas.DataFrame limpio.
+    `sheet_name` selecciona una hoja concreta de un Excel (por defecto, la primera).
     """
     path = Path(filepath)
     if not path.exists():
@@ -38,10 +51,12 @@ def read_data_file(filepath: Union[str, Path]) -> pd.DataFrame:
 
     suffix = path.suffix.lower()
     df = None
+    started = time.perf_counter()
 
     try:
         if suffix in ('.xlsx', '.xls'):
-            df = pd.read_excel(path, engine='openpyxl' if suffix == '.xlsx' else None)
+            df = pd.read_excel(path, sheet_name=sheet_name if sheet_name is not None else 0,
+                               engine='openpyxl' if suffix == '.xlsx' else None)
         elif suffix == '.csv':
             try:
                 df = pd.read_csv(path, sep=None, engine='python', encoding='utf-8-sig')
@@ -70,6 +85,9 @@ def read_data_file(filepath: Union[str, Path]) -> pd.DataFrame:
             raise ValueError("El archivo está vacío o no contiene datos legibles después de la limpieza inicial.")
 
         logger.info(f"Archivo '{path.name}' leído y limpiado exitosamente. Dimensiones finales: {df.shape}.")
+        file_bytes = path.stat().st_size
+        observe_file_read(suffix.lstrip('.'), time.perf_counter() - started, len(df), file_bytes)
+        annotate_request_input(file=path.name, rows=len(df), file_bytes=file_bytes)  # Traza si la petición resulta lenta
         return df
 
     except FileNotFoundError:
@@ -80,6 +98,100 @@ def read_data_file(filepath: Union[str, Path]) -> pd.DataFrame:
         logger.error(f"Error inesperado leyendo el archivo '{path.name}': {e}", exc_info=True)
         raise ValueError(f"Ocurrió un error inesperado al procesar el archivo: {e}") from e
 
+def iter_data_file_chunks(filepath: Union[str, Path], chunksize: int = DEFAULT_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """
+    Lee un archivo CSV o Excel por bloques de `chunksize` filas (memoria acotada).
+
+    - CSV: `pd.read_csv(chunksize=...)`, con el mismo fallback UTF-8 -> latin-1 que read_data_file
+      (decidido con una pasada por bytes del archivo entero, antes del primer bloque).
+    - XLSX: openpyxl en modo `read_only`, iterando filas sin cargar el libro completo.
+    - XLS: no admite lectura incremental; se lee entero y se trocea.
+
+    Las filas completamente vacías se eliminan en cada bloque. A diferencia de
+    read_data_file, no se eliminan columnas vacías (requeriría ver todo el archivo).
+    """
+    path = Path(filepath)
+    if not path.exists():
+        logger.error(f"Archivo no encontrado al intentar leer por bloques: {filepath}")
+        raise FileNotFoundError(f"El archivo {filepath} no existe o no se puede acceder.")
+    if chunksize <= 0:
+        raise ValueError("chunksize debe ser positivo.")
+
+    suffix = path.suffix.lower()
+    if suffix == '.csv':
+        chunk_iter = _iter_csv_chunks(path, chunksize)
+    elif suffix == '.xlsx':
+        chunk_iter = _iter_xlsx_chunks(path, chunksize)
+    elif suffix == '.xls':
+        df = read_data_file(path)
+        chunk_iter = (df.iloc[start:start + chunksize] for start in range(0, len(df), chunksize))
+    else:
+        logger.error(f"Intento de leer por bloques archivo con extensión no soportada: {suffix} en {filepath}")
+        raise ValueError(f"Extensión no soportada: {suffix}. Permitidas: {', '.join(ALLOWED_EXTENSIONS)}")
+
+    total_rows = 0
+    n_chunks = 0
+    for chunk in chunk_iter:
+        chunk = chunk.dropna(axis=0, how='all')
+        if chunk.empty:
+            continue
+        total_rows += len(chunk)
+        n_chunks += 1
+        yield chunk
+    logger.info(f"Archivo '{path.name}' leído por bloques: {n_chunks} bloque(s), {total_rows} filas.")
+
+def _iter_csv_chunks(path: Path, chunksize: int) -> Iterator[pd.DataFrame]:
+    """Bloques de un CSV, con la codificación decidida antes del primer bloque (_detect_csv_encoding)."""
+    encoding = _detect_csv_encoding(path)
+    reader = pd.read_csv(path, sep=None, engine='python', encoding=encoding, chunksize=chunksize)
+    with reader:
+        try:
+            yield from reader
+        except pd.errors.ParserError as pe:
+            logger.error(f"Error de parsing leyendo CSV '{path.name}': {pe}")
+            raise ValueError(f"Error al interpretar el archivo CSV: {pe}") from pe
+        except UnicodeDecodeError as ue:
+            logger.error(f"Error de codificación leyendo CSV '{path.name}' ({encoding}): {ue}")
+            raise ValueError(f"No se pudo decodificar el archivo CSV '{path.name}'.") from ue
+
+def _detect_csv_encoding(path: Path) -> str:
+    """'utf-8-sig' si todo el archivo es UTF-8 válido (pasada por bytes, sin parsear); si no, 'latin-1'."""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    try:
+        with open(path, 'rb') as fh:
+            for block in iter(lambda: fh.read(ENCODING_PROBE_BLOCK_BYTES), b''):
+                decoder.decode(block)
+            decoder.decode(b'', final=True)
+    except UnicodeDecodeError:
+        logger.warning(f"CSV '{path.name}' no es UTF-8 válido; se lee con latin-1.")
+        return 'latin-1'
+    return 'utf-8-sig'
+
+def _iter_xlsx_chunks(path: Path, chunksize: int) -> Iterator[pd.DataFrame]:
+    """Bloques de la primera hoja de un XLSX usando openpyxl en modo read_only."""
+    from openpyxl import load_workbook  # Import diferido: solo necesario para XLSX
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        # Columnas sin encabezado se descartan (equivalente a dropna(axis=1) para columnas vacías)
+        keep_idx = [i for i, name in enumerate(header) if name is not None and str(name).strip() != '']
+        columns = [str(header[i]).strip() for i in keep_idx]
+
+        buffer = []
+        for row in rows:
+            buffer.append([row[i] if i < len(row) else None for i in keep_idx])
+            if len(buffer) >= chunksize:
+                yield pd.DataFrame(buffer, columns=columns)
+                buffer = []
+        if buffer:
+            yield pd.DataFrame(buffer, columns=columns)
+    finally:
+        workbook.close()
+
 # --- Validación de DataFrame ---
 
 def validate_dataframe(df: pd.DataFrame) -> bool:
@@ -108,22 +220,14 @@ def validate_dataframe(df: pd.DataFrame) -> bool:
 
 # --- Otras Funciones Auxiliares ---
 
-def update_history_status(filename: str, status: str) -> None:
+def update_history_status(filename: str, status: str, results_url: Optional[str] = None) -> None:
     """
-    Actualiza el estado de un archivo en el historial de uploads guardado en session.
+    Actualiza el estado de un archivo en el historial de uploads (SQLite, ver
+    proyect.common.history); si no hay entrada previa se crea con el tipo de
+    análisis de la sesión. Si se indica `results_url` (p.ej. resultados en
+    caché), el dashboard enlaza a él.
     """
     try:
-        history = session.get('upload_history', [])
-        found = False
-        for entry in reversed(history):
-            if entry.get('filename') == filename:
-                entry['status'] = status
-                found = True
-                break
-        if found:
-            session.modified = True
-            logger.debug(f"Historial actualizado para '{filename}' con estado '{status}'.")
-        else:
-            logger.warning(f"No se encontró la entrada para '{filename}' en el historial para actualizar estado a '{status}'.")
+        set_history_status(filename, status, results_url=results_url, analysis_type=session.get('analysis_type'))
     except Exception as e:
         logger.error(f"Error al actualizar el historial para '{filename}': {e}", exc_info=True)
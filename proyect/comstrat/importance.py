@@ -0,0 +1,212 @@
+# pricing_dashboard/proyect/comstrat/importance.py
+# -*- coding: utf-8 -*-
+"""
+Importancia Derivada para ComStrat.
+
+Deriva el 'Importance_Score' de cada atributo a partir de ratings de encuestados
+frente a una variable de resultado (satisfacción global, intención de compra...),
+en lugar de exigir que el usuario lo proporcione. Métodos disponibles:
+
+- Pesos relativos de Johnson (relative_weights): una única descomposición en
+  autovalores de la matriz de correlaciones entre drivers.
+- Descomposición exacta de Shapley del R² (shapley): R² de los 2^k subconjuntos
+  calculado desde la matriz de correlaciones cacheada (memoizado en un array
+  indexado por máscara de bits, resuelto por lotes). Por encima de
+  SHAPLEY_PARALLEL_MIN_DRIVERS drivers los lotes se reparten entre procesos.
+
+Ambos métodos reparten el R² total entre los drivers; el score se expresa como
+porcentaje del R² (suma 100), en la misma escala que usa la matriz MOCA.
+"""
+
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from math import factorial
+from typing import List, Optional
+import pandas as pd
+import numpy as np
+
+from proyect.comstrat.utils import COL_ATTRIBUTE, COL_IMPORTANCE
+
+logger = logging.getLogger(__name__)
+
+# --- Constantes y Configuraciones ---
+METHOD_RELATIVE_WEIGHTS = 'relative_weights'
+METHOD_SHAPLEY = 'shapley'
+IMPORTANCE_METHODS = (METHOD_RELATIVE_WEIGHTS, METHOD_SHAPLEY)
+
+COL_RAW_WEIGHT = 'Raw_Weight' # Parte del R² atribuida a cada driver
+SHAPLEY_MAX_DRIVERS = 22           # 2^22 subconjuntos (~4M) es el límite razonable
+SHAPLEY_PARALLEL_MIN_DRIVERS = 15  # A partir de aquí se usan procesos en paralelo
+SHAPLEY_BATCH_SIZE = 20_000        # Subconjuntos por lote (acota memoria de la resolución por lotes)
+_POPCOUNT_BYTE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8) # Bits activos de cada byte
+MIN_RESPONDENTS = 10
+
+
+# --- Funciones Principales ---
+
+def derive_importance(ratings_df: pd.DataFrame, driver_cols: List[str], outcome_col: str,
+                      method: str = METHOD_RELATIVE_WEIGHTS, max_workers: Optional[int] = None) -> pd.DataFrame:
+    """
+    Calcula la importancia derivada de cada driver frente a `outcome_col`.
+
+    Args:
+        ratings_df (pd.DataFrame): Ratings a nivel encuestado (una columna por driver).
+        driver_cols (List[str]): Columnas de drivers (atributos).
+        outcome_col (str): Columna de resultado (p.ej. satisfacción global).
+        method (str): METHOD_RELATIVE_WEIGHTS o METHOD_SHAPLEY.
+        max_workers (Optional[int]): Procesos para Shapley con muchos drivers (None = CPUs;
+            en los trabajos, SHAPLEY_MAX_WORKERS). 1 = sin procesos adicionales.
+
+    Returns:
+        pd.DataFrame: Columnas [COL_ATTRIBUTE, COL_IMPORTANCE (% del R²), COL_RAW_WEIGHT],
+                      ordenado por importancia descendente. El R² total está en `df.attrs['r2']`.
+
+    Raises:
+        ValueError: Si el método no existe, faltan columnas o los datos son insuficientes.
+    """
+    if method not in IMPORTANCE_METHODS:
+        raise ValueError(f"Método de importancia derivada no soportado: '{method}'. Opciones: {', '.join(IMPORTANCE_METHODS)}")
+    missing_cols = [col for col in list(driver_cols) + [outcome_col] if col not in ratings_df.columns]
+    if missing_cols:
+        raise ValueError(f"Faltan columnas para la importancia derivada: {', '.join(map(str, missing_cols))}")
+    if len(driver_cols) < 2:
+        raise ValueError("Se requieren al menos 2 drivers para derivar importancia.")
+    if method == METHOD_SHAPLEY and len(driver_cols) > SHAPLEY_MAX_DRIVERS:
+        raise ValueError(f"Shapley exacto admite hasta {SHAPLEY_MAX_DRIVERS} drivers (recibidos {len(driver_cols)}). Usa '{METHOD_RELATIVE_WEIGHTS}'.")
+
+    corr = _correlation_matrix(ratings_df, list(driver_cols), outcome_col)
+    rxx, rxy = corr[:-1, :-1], corr[:-1, -1]
+
+    logger.info(f"Derivando importancia ({method}) para {len(driver_cols)} drivers frente a '{outcome_col}'.")
+    if method == METHOD_RELATIVE_WEIGHTS:
+        raw_weights = _relative_weights(rxx, rxy)
+    else:
+        raw_weights = _shapley_r2(rxx, rxy, max_workers)
+
+    r2 = float(raw_weights.sum())
+    scores = raw_weights / r2 * 100 if r2 > 0 else np.full(len(raw_weights), 100.0 / len(raw_weights))
+    importance_df = pd.DataFrame({
+        COL_ATTRIBUTE: list(driver_cols),
+        COL_IMPORTANCE: scores,
+        COL_RAW_WEIGHT: raw_weights,
+    }).sort_values(COL_IMPORTANCE, ascending=False).reset_index(drop=True)
+    importance_df.attrs['r2'] = r2
+    importance_df.attrs['method'] = method
+    logger.info(f"Importancia derivada calculada. R² total = {r2:.3f}.")
+    return importance_df
+
+
+def apply_derived_importance(attribute_df: pd.DataFrame, ratings_df: pd.DataFrame, outcome_col: str,
+                             method: str = METHOD_RELATIVE_WEIGHTS, max_workers: Optional[int] = None) -> pd.DataFrame:
+    """
+    Etapa previa a run_comstrat_analysis: sustituye COL_IMPORTANCE por la importancia derivada.
+
+    Los drivers son los atributos de `attribute_df` que existen como columna en
+    `ratings_df`. Atributos sin ratings conservan su COL_IMPORTANCE original (o NaN).
+    """
+    if COL_ATTRIBUTE not in attribute_df.columns:
+        raise ValueError(f"Falta la columna '{COL_ATTRIBUTE}' en los datos de atributos.")
+    attributes = attribute_df[COL_ATTRIBUTE].astype(str).str.strip()
+    driver_cols = [attr for attr in pd.unique(attributes) if attr in ratings_df.columns and attr != outcome_col]
+    skipped = sorted(set(attributes) - set(driver_cols))
+    if skipped:
+        logger.warning(f"Atributos sin columna de ratings (se mantiene su importancia original): {', '.join(skipped)}")
+
+    importance_df = derive_importance(ratings_df, driver_cols, outcome_col, method, max_workers)
+    derived = importance_df.set_index(COL_ATTRIBUTE)[COL_IMPORTANCE]
+
+    result_df = attribute_df.copy()
+    original = result_df[COL_IMPORTANCE] if COL_IMPORTANCE in result_df.columns else pd.Series(np.nan, index=result_df.index)
+    result_df[COL_IMPORTANCE] = attributes.map(derived).fillna(original)
+    result_df.attrs['importance_r2'] = importance_df.attrs['r2']
+    result_df.attrs['importance_method'] = method
+    return result_df
+
+
+# --- Funciones Auxiliares ---
+
+def _correlation_matrix(ratings_df: pd.DataFrame, driver_cols: List[str], outcome_col: str) -> np.ndarray:
+    """Matriz de correlaciones (drivers + resultado al final) con eliminación por lista."""
+    data = ratings_df[driver_cols + [outcome_col]].apply(pd.to_numeric, errors='coerce').dropna()
+    if len(data) < MIN_RESPONDENTS:
+        raise ValueError(f"Datos insuficientes para importancia derivada: {len(data)} encuestados completos (mínimo {MIN_RESPONDENTS}).")
+    constant = [col for col in data.columns if data[col].nunique() <= 1]
+    if constant:
+        raise ValueError(f"Columnas sin variación para importancia derivada: {', '.join(map(str, constant))}")
+    return np.corrcoef(data.to_numpy(dtype='float64'), rowvar=False)
+
+
+def _relative_weights(rxx: np.ndarray, rxy: np.ndarray) -> np.ndarray:
+    """Pesos relativos de Johnson (2000): una eigendescomposición de R_xx."""
+    eigvals, eigvecs = np.linalg.eigh(rxx)
+    eigvals = np.clip(eigvals, 0.0, None)
+    lam = eigvecs @ np.diag(np.sqrt(eigvals)) @ eigvecs.T # Correlación drivers <-> variables ortogonales
+    beta = np.linalg.lstsq(lam, rxy, rcond=None)[0]        # Regresión del resultado sobre las ortogonales
+    return (lam ** 2) @ (beta ** 2)
+
+
+def _shapley_r2(rxx: np.ndarray, rxy: np.ndarray, max_workers: Optional[int]) -> np.ndarray:
+    """Valores de Shapley del R²: cada R²(S) se calcula una única vez (memo por máscara)."""
+    k = len(rxy)
+    r2_by_mask = _all_subset_r2(rxx, rxy, max_workers)
+
+    masks = np.arange(1 << k, dtype=np.int64)
+    sizes = _popcount(masks, k)  # uint8: 1 byte por subconjunto
+    # Peso de Shapley |S|! (k - |S| - 1)! / k! por tamaño de coalición
+    weights = np.array([factorial(m) * factorial(k - m - 1) / factorial(k) for m in range(k)])
+
+    shapley = np.empty(k)
+    for j in range(k):
+        bit = np.int64(1) << j
+        without_j = masks[(masks & bit) == 0]
+        marginal = r2_by_mask[without_j | bit] - r2_by_mask[without_j]
+        shapley[j] = float(np.dot(weights[sizes[without_j]], marginal))
+    return shapley
+
+
+def _all_subset_r2(rxx: np.ndarray, rxy: np.ndarray, max_workers: Optional[int]) -> np.ndarray:
+    """R² de todos los subconjuntos, R²(S) = r_S' R_SS^-1 r_S, indexado por máscara de bits."""
+    k = len(rxy)
+    masks = np.arange(1, 1 << k, dtype=np.int64)
+    batches = [masks[i:i + SHAPLEY_BATCH_SIZE] for i in range(0, len(masks), SHAPLEY_BATCH_SIZE)]
+
+    r2_by_mask = np.zeros(1 << k)
+    workers = min(len(batches), max_workers or os.cpu_count() or 1)
+    if k > SHAPLEY_PARALLEL_MIN_DRIVERS and workers > 1:
+        logger.info(f"Shapley: {len(masks)} subconjuntos en {len(batches)} lotes con {workers} procesos.")
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for batch, values in zip(batches, executor.map(_subset_r2_batch, [rxx] * len(batches), [rxy] * len(batches), batches)):
+                r2_by_mask[batch] = values
+    else:
+        for batch in batches:
+            r2_by_mask[batch] = _subset_r2_batch(rxx, rxy, batch)
+    return r2_by_mask
+
+
+def _subset_r2_batch(rxx: np.ndarray, rxy: np.ndarray, masks: np.ndarray) -> np.ndarray:
+    """R² de un lote de subconjuntos, agrupados por tamaño y resueltos con np.linalg.solve por lotes."""
+    k = len(rxy)
+    sizes = _popcount(masks, k)
+    bits = ((masks[:, None] >> np.arange(k)) & 1).astype(bool)
+    result = np.empty(len(masks))
+    for size in np.unique(sizes):
+        rows = np.nonzero(sizes == size)[0]
+        # Índices de los drivers de cada subconjunto: (n_subsets, size)
+        idx = np.nonzero(bits[rows])[1].reshape(len(rows), size)
+        r_ss = rxx[idx[:, :, None], idx[:, None, :]]
+        r_s = rxy[idx]
+        try:
+            coef = np.linalg.solve(r_ss, r_s[:, :, None])[:, :, 0]
+        except np.linalg.LinAlgError:
+            coef = np.einsum('nij,nj->ni', np.linalg.pinv(r_ss), r_s)
+        result[rows] = np.einsum('ni,ni->n', r_s, coef)
+    return result
+
+
+def _popcount(masks: np.ndarray, k: int) -> np.ndarray:
+    """Número de bits activos de cada máscara (tamaño del subconjunto), por tabla de bytes y en uint8."""
+    sizes = np.zeros(len(masks), dtype=np.uint8)
+    for shift in range(0, k, 8):
+        sizes += _POPCOUNT_BYTE[(masks >> shift) & 0xFF]
+    return sizes
@@ -1,6 +1,7 @@
 # proyect/comstrat/routes.py (FINAL - Pulido con comentarios finales)
 
 from pathlib import Path
+from typing import Optional
 from flask import (
     Blueprint, render_template, request, redirect,
     url_for, flash, session, current_app
@@ -11,9 +12,16 @@ from werkzeug.exceptions import RequestEntityTooLarge
 # import pandas as pd # Descomenta si es necesario
 
 # Importaciones de utilidades
-from proyect.common.utils import allowed_file, read_data_file, update_history_status
-# Asume que existe la función run_comstrat en el utils de este módulo
-from proyect.comstrat.utils import run_comstrat
+from proyect.common.utils import allowed_file, read_data_file, update_history_status, PREVIEW_ROWS
+from proyect.common.streaming import iter_html_table, render_streamed
+# El análisis se ejecuta en segundo plano (process_comstrat_file en un worker)
+from proyect.common.jobs import jobs, JobQueueFullError, JOB_DONE, JOB_FAILED
+from proyect.common.admission import admission # 429/503 con Retry-After si no hay presupuesto
+from proyect.common.cache import result_cache
+from proyect.common.catalog import analysis_catalog
+from proyect.common.results import figure_urls, load_analysis_index, table_urls
+from proyect.common.compression import check_not_modified
+from proyect.comstrat.utils import process_comstrat_file, COL_ATTRIBUTE, COL_IMPORTANCE, PERFORMANCE_PREFIX
 
 # --- Definición única de Blueprint con prefijo y nombre consistente ---
 bp = Blueprint('comstrat', __name__, url_prefix='/comstrat')
@@ -89,13 +97,18 @@ def preview():
          return redirect(url_for('comstrat.upload'))
 
     try:
+        # Se lee el archivo completo: la vista previa muestra sus dimensiones
         df = read_data_file(filepath)
-        table_html = df.head().to_html(
-            classes='table table-striped table-hover table-sm',
-            border=0, index=False
-        )
+        # Candidatas a métrica de precio para el PVM: columnas que no son de MOCA
+        price_metric_options = [col for col in df.columns
+                                if col not in (COL_ATTRIBUTE, COL_IMPORTANCE)
+                                and not str(col).startswith(PERFORMANCE_PREFIX)]
         # Asegúrate que preview.html tenga enlace/botón a href="{{ url_for('comstrat.process') }}"
-        return render_template('preview.html', table_html=table_html, analysis_type='comstrat')
+        return render_streamed('preview.html', analysis_type='comstrat',
+                               dataframe_head=iter_html_table([df], classes='table table-striped table-hover table-sm',
+                                                              max_rows=PREVIEW_ROWS),
+                               dataframe_shape=df.shape, filename=session.get('original_filename'),
+                               price_metric_options=price_metric_options)
 
     except FileNotFoundError:
          current_app.logger.error(f"Archivo '{filepath}' no encontrado para preview de ComStrat.")
@@ -122,8 +135,8 @@ def preview():
 @bp.route('/process', endpoint='process', methods=['GET'])
 def process():
     """
-    Procesa los datos para ComStrat y muestra resultados.
-    Limpia la sesión relacionada con el archivo tras procesar con éxito.
+    Envía el análisis ComStrat a la cola de trabajos y redirige a la página de espera.
+    El cálculo se ejecuta en un proceso worker (proyect.common.jobs).
     Accesible en /comstrat/process
     """
     filepath = session.get('uploaded_file_path')
@@ -138,49 +151,108 @@ def process():
          flash(f'Se esperaba procesar ComStrat pero el tipo en sesión es {analysis_type}.', 'danger')
          return redirect(url_for('comstrat.upload'))
 
+    # Métrica de precio para el PVM (opcional): ?price_metric_col=...
+    price_metric_col = request.args.get('price_metric_col') or None
+    # Importancia derivada (opcional): ?outcome_col=...&importance_method=relative_weights|shapley
+    outcome_col = request.args.get('outcome_col') or None
+    importance_method = request.args.get('importance_method') or None
+    params = {'price_metric_col': price_metric_col, 'outcome_col': outcome_col, 'importance_method': importance_method}
+
+    # Mismo archivo (por contenido) y parámetros ya analizados: resultados desde la caché
+    cache_key = result_cache.key_for_file(filepath, 'comstrat', params)
+    if result_cache.contains(cache_key):
+        cached_url = url_for('comstrat.cached_results', cache_key=cache_key)
+        update_history_status(filename, 'Procesado (ComStrat)', results_url=cached_url)
+        current_app.logger.info(f"Resultados ComStrat para {filename} servidos desde caché ({cache_key[:12]}).")
+        return redirect(cached_url)
+
     try:
-        current_app.logger.info(f"Iniciando procesamiento ComStrat para archivo: {filename}")
-        df = read_data_file(filepath)
-        results = run_comstrat(df) # Llama a la lógica de análisis
+        job_id = admission.submit('comstrat', process_comstrat_file, filepath, filename=filename,
+                                  price_metric_col=price_metric_col, outcome_col=outcome_col,
+                                  importance_method=importance_method,
+                                  shapley_max_workers=current_app.config.get('SHAPLEY_MAX_WORKERS'),
+                                  meta={'price_metric_col': price_metric_col, 'cache_key': cache_key})
+    except JobQueueFullError as e:
+        current_app.logger.warning(f"Cola de análisis llena al enviar ComStrat para '{filename}': {e}")
+        flash(str(e), 'warning')
+        return redirect(url_for('comstrat.preview'))
 
-        update_history_status(filename, 'Procesado (ComStrat)') # Actualiza historial
-        current_app.logger.info(f"Procesamiento ComStrat para {filename} completado con éxito.")
+    analysis_catalog.record_submission(job_id, 'comstrat', filename, filepath, params=params, cache_key=cache_key)
+    session['job_id'] = job_id
+    update_history_status(filename, 'En cola (ComStrat)') # Actualiza historial
+    current_app.logger.info(f"Procesamiento ComStrat para {filename} enviado como trabajo {job_id}.")
+    return redirect(url_for('jobs.status_page', job_id=job_id))
 
-        # Limpieza de sesión tras éxito
-        session.pop('uploaded_file_path', None)
-        session.pop('original_filename', None)
-        session.pop('analysis_type', None)
 
-        # --- Pasar claves explícitas a la plantilla ---
-        # (Ajusta 'comstrat_table_df' y 'chart_json' según lo que devuelva run_comstrat)
-        comstrat_table_df = results.get('comstrat_table_df')
-        comstrat_table_html = (comstrat_table_df.to_html(classes='table table-hover table-sm', border=0, index=False)
-                               if comstrat_table_df is not None and not comstrat_table_df.empty
-                               else "<p>No hay datos de tabla ComStrat para mostrar.</p>")
-
-        # Asegúrate que results_comstrat.html espera 'filename', 'comstrat_table', 'comstrat_chart_json'
-        return render_template(
-            'results_comstrat.html',
-            filename=filename,
-            comstrat_table=comstrat_table_html,
-            comstrat_chart_json=results.get('chart_json', '{}')
-        )
-
-    # Manejo de Errores
-    except FileNotFoundError:
-        current_app.logger.error(f"Archivo '{filepath}' no encontrado durante el procesamiento ComStrat.")
-        flash('Error crítico: El archivo a procesar no se encuentra.', 'danger')
-        update_history_status(filename, 'Error - Archivo no encontrado (ComStrat)')
-        session.pop('uploaded_file_path', None); session.pop('original_filename', None); session.pop('analysis_type', None)
+@bp.route('/results/<job_id>', endpoint='results', methods=['GET'])
+def results(job_id):
+    """
+    Muestra los resultados de un trabajo ComStrat terminado.
+    Limpia la sesión relacionada con el archivo tras un procesamiento con éxito.
+    Accesible en /comstrat/results/<job_id>
+    """
+    # Si el estado del trabajo ya no existe, el catálogo tiene los mismos metadatos
+    status = jobs.get_status(job_id) or analysis_catalog.get(job_id)
+    if status is None or status.get('analysis_type') != 'comstrat':
+        flash('No se encontró el análisis ComStrat solicitado.', 'warning')
         return redirect(url_for('comstrat.upload'))
-    except KeyError as e:
-        current_app.logger.error(f"Error procesando ComStrat para '{filename}': Falta columna o clave esperada {e}", exc_info=True)
-        flash(f'Error en los datos de entrada para ComStrat: Falta la columna o clave {e}. Revisa el archivo.', 'danger')
-        update_history_status(filename, 'Error - Datos inválidos (ComStrat)')
-        return redirect(url_for('comstrat.preview'))
-    except Exception as e:
-        current_app.logger.error(f"Error inesperado procesando ComStrat para '{filename}': {e}", exc_info=True)
-        flash('Ocurrió un error inesperado durante el procesamiento de ComStrat. Consulta los logs.', 'danger')
+    filename = status.get('filename')
+
+    if status.get('status') == JOB_FAILED:
+        current_app.logger.error(f"Trabajo ComStrat {job_id} para '{filename}' falló: {status.get('error')}")
+        flash(f"Ocurrió un error durante el procesamiento de ComStrat: {status.get('error')}", 'danger')
         update_history_status(filename, 'Error - Procesamiento (ComStrat)')
-        session.pop('uploaded_file_path', None); session.pop('original_filename', None); session.pop('analysis_type', None)
         return redirect(url_for('comstrat.upload'))
+    if status.get('status') != JOB_DONE:
+        return redirect(url_for('jobs.status_page', job_id=job_id))
+
+    cache_key = status.get('cache_key')
+    results_url = url_for('comstrat.cached_results', cache_key=cache_key) if cache_key else None
+    update_history_status(filename, 'Procesado (ComStrat)', results_url=results_url) # Actualiza historial
+
+    # Limpieza de sesión tras éxito
+    session.pop('uploaded_file_path', None)
+    session.pop('original_filename', None)
+    session.pop('analysis_type', None)
+
+    # La página de un trabajo terminado no cambia: 304 sin cargar el resultado si el navegador ya la tiene
+    not_modified = check_not_modified('comstrat', job_id, last_modified=status.get('finished_at'))
+    if not_modified is not None:
+        return not_modified
+    loaded = load_analysis_index(job_id, 'comstrat')
+    if loaded is None:
+        flash('Los resultados de este análisis ya no están disponibles. Vuelve a procesar el archivo.', 'warning')
+        return redirect(url_for('comstrat.upload'))
+    index, meta = loaded
+    return _render_results(filename, job_id, meta.get('price_metric_col'), index)
+
+
+@bp.route('/results/cached/<cache_key>', endpoint='cached_results', methods=['GET'])
+def cached_results(cache_key):
+    """
+    Muestra resultados ComStrat desde la caché, sin recalcular (enlace del historial).
+    Accesible en /comstrat/results/cached/<cache_key>
+    """
+    loaded = load_analysis_index(cache_key, 'comstrat')
+    if loaded is None:
+        flash('Los resultados ya no están en caché. Vuelve a procesar el archivo.', 'warning')
+        return redirect(url_for('comstrat.upload'))
+    not_modified = check_not_modified('comstrat', cache_key)
+    if not_modified is not None:
+        return not_modified
+    index, meta = loaded
+    return _render_results(meta.get('filename'), cache_key, meta.get('price_metric_col'), index)
+
+
+def _render_results(filename: str, source_ref: str, price_metric_col: Optional[str], index: dict):
+    """Plantilla de resultados ComStrat (común a trabajos terminados y caché)."""
+    # MOCA y PVM salen del mismo pase de validación; ambos gráficos van a la plantilla
+    return render_streamed(
+        'comstrat/results_comstrat.html',
+        filename=filename,
+        source_ref=source_ref, # job_id o clave de caché, para la exportación
+        price_metric_col=price_metric_col,
+        table_urls=table_urls(source_ref, index['tables']), # Tablas paginadas por la API (scroll virtual)
+        figure_urls=figure_urls(source_ref, index['charts']), # Figuras servidas por la API (/api/v1), cargadas tras el primer pintado
+        insights=index['insights'].get('insights')
+    )
@@ -8,15 +8,24 @@ Proporciona funciones para procesar datos combinados de importancia y desempeño
 calcular métricas para MOCA y PVM, y preparar datos (JSON, DataFrames)
 listos para ser consumidos por las rutas y plantillas.
 
+Admite cualquier número de competidores: cada columna 'Performance_<Nombre>'
+(distinta de COL_PERFORMANCE_US) es un competidor. La matriz de ventajas
+atributo x competidor se calcula en una única operación vectorizada.
+
 Importación en routes.py: from .utils import run_comstrat
 """
 
 import logging
-# Se quita Tuple ya que no se usa explícitamente aquí
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 import pandas as pd  # Asegúrate de tener pandas en requirements.txt
 import numpy as np   # Asegúrate de tener numpy en requirements.txt
 
+from proyect.common.charts import build_point_traces, select_render_mode, RENDER_SVG
+from proyect.common.metrics import StageTimer
+from proyect.common.progress import (ProgressCallback, report_progress, STAGE_READ, STAGE_VALIDATE,
+                                     STAGE_COMPUTE, STAGE_CHART, STAGE_HINTS)
+from proyect.common.utils import read_data_file
+
 logger = logging.getLogger(__name__)
 
 # --- Constantes y Configuraciones ---
@@ -26,13 +35,27 @@ logger = logging.getLogger(__name__)
 COL_ATTRIBUTE = 'Attribute'
 COL_IMPORTANCE = 'Importance_Score'
 COL_PERFORMANCE_US = 'Performance_Us'
-COL_PERFORMANCE_COMPETITOR = 'Performance_Competitor'
+COL_PERFORMANCE_COMPETITOR = 'Performance_Competitor' # Caso clásico de un único competidor
+PERFORMANCE_PREFIX = 'Performance_' # Cualquier 'Performance_<Nombre>' distinto de Us es un competidor
+COL_ADVANTAGE = 'Competitive_Advantage' # Ventaja frente al mejor competidor
+COL_BEST_COMPETITOR = 'Best_Competitor'
+COL_QUADRANT = 'Quadrant'
+QUADRANT_NAMES = ['Fortaleza Clave', 'Debilidad Clave', 'Fortaleza Secundaria', 'Baja Prioridad']
+QUADRANT_COLORS = {
+    'Fortaleza Clave': '#2ca02c',
+    'Debilidad Clave': '#d62728',
+    'Fortaleza Secundaria': '#1f77b4',
+    'Baja Prioridad': '#7f7f7f',
+}
+# Hoja opcional (solo Excel) con ratings por encuestado para la importancia derivada
+RATINGS_SHEET = 'Ratings'
 # COL_PRICE_METRIC = 'Price_Metric' # Si tienes una métrica de precio por atributo,
                                    # descomenta y ajusta este nombre.
 
 # --- Funciones Principales de Análisis ---
 
-def run_comstrat_analysis(df: pd.DataFrame, price_metric_col: Optional[str] = None) -> Dict[str, Any]:
+def run_comstrat_analysis(df: pd.DataFrame, price_metric_col: Optional[str] = None,
+                          progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
     """
     Orquesta el pipeline completo de análisis ComStrat (MOCA y PVM).
     (Función interna detallada).
@@ -44,10 +67,12 @@ def run_comstrat_analysis(df: pd.DataFrame, price_metric_col: Optional[str] = No
                                            Es sensible a mayúsculas/minúsculas.
                                            Si es None o la columna no existe, el PVM
                                            no se generará.
+        progress (Optional[ProgressCallback]): Callback de progreso por etapa (ver proyect.common.progress).
 
     Returns:
         Dict[str, Any]: Diccionario con resultados detallados.
-            (moca_df, pvm_df, moca_scatter_json, pvm_scatter_json, interpretation_hints)
+            (moca_df, pvm_df, advantage_df, comstrat_table_df, moca_scatter_json,
+             moca_facets_json, pvm_scatter_json, interpretation_hints)
 
     Raises:
         ValueError: Si faltan columnas requeridas o no son numéricas.
@@ -58,50 +83,56 @@ def run_comstrat_analysis(df: pd.DataFrame, price_metric_col: Optional[str] = No
     results = {
         'moca_df': pd.DataFrame(),
         'pvm_df': pd.DataFrame(),
+        'advantage_df': pd.DataFrame(),
+        'comstrat_table_df': pd.DataFrame(),
         'moca_scatter_json': _prepare_empty_scatter("MOCA - Sin Datos"),
+        'moca_facets_json': _prepare_empty_scatter("MOCA por Competidor - Sin Datos"),
         'pvm_scatter_json': _prepare_empty_scatter("PVM - Sin Datos o Métrica de Precio"),
         'interpretation_hints': {"general": "Análisis no pudo completarse."}
     }
+    progress = StageTimer('comstrat', progress)  # Duración por etapa (proyect.common.metrics)
     try:
-        required_moca_cols = [COL_ATTRIBUTE, COL_IMPORTANCE, COL_PERFORMANCE_US, COL_PERFORMANCE_COMPETITOR]
-        _validate_input_df(df, required_moca_cols, "MOCA")
-        logger.debug("Validación inicial para MOCA completada.")
-
-        moca_df = _calculate_moca_data(df.copy(), required_moca_cols)
+        # Una única pasada de validación/coerción sobre la unión de columnas MOCA + PVM
+        report_progress(progress, STAGE_VALIDATE)
+        data, competitor_cols, pvm_price_col, pvm_error = _prepare_input_df(df, price_metric_col)
+        required_moca_cols = [COL_ATTRIBUTE, COL_IMPORTANCE, COL_PERFORMANCE_US] + competitor_cols
+        logger.debug(f"Validación común MOCA/PVM completada ({len(competitor_cols)} competidor(es)).")
+
+        report_progress(progress, STAGE_COMPUTE)
+        moca_df, advantage_df = _calculate_moca_data(data, required_moca_cols, competitor_cols)
         results['moca_df'] = moca_df
+        results['advantage_df'] = advantage_df
+        results['comstrat_table_df'] = _build_comstrat_table(moca_df, advantage_df)
         logger.info("Datos para MOCA calculados.")
 
+        report_progress(progress, STAGE_CHART)
         moca_scatter_json = _prepare_moca_scatter_json(moca_df)
         results['moca_scatter_json'] = moca_scatter_json
-        logger.info("Datos para gráfico MOCA (scatter) generados.")
+        results['moca_facets_json'] = _prepare_moca_facets_json(moca_df, advantage_df)
+        logger.info("Datos para gráficos MOCA (scatter y facetas por competidor) generados.")
 
-        pvm_scatter_json = _prepare_empty_scatter("PVM - Métrica de Precio no proporcionada")
         pvm_df = pd.DataFrame()
-        if price_metric_col and price_metric_col in df.columns:
-            logger.info(f"Intentando generar PVM usando la columna '{price_metric_col}'.")
-            required_pvm_cols = [COL_ATTRIBUTE, COL_IMPORTANCE, price_metric_col]
+        if pvm_price_col:
+            logger.info(f"Generando PVM usando la columna '{pvm_price_col}'.")
             try:
-                _validate_input_df(df, required_pvm_cols, "PVM")
-                pvm_df = _calculate_pvm_data(df.copy(), required_pvm_cols, price_metric_col)
+                pvm_df = _calculate_pvm_data(data, pvm_price_col)
                 results['pvm_df'] = pvm_df
                 logger.info("Datos para PVM extraídos/calculados.")
 
-                pvm_scatter_json = _prepare_pvm_scatter_json(pvm_df, price_metric_col)
+                pvm_scatter_json = _prepare_pvm_scatter_json(pvm_df, pvm_price_col)
                 results['pvm_scatter_json'] = pvm_scatter_json
                 logger.info("Datos para gráfico PVM (scatter) generados.")
-            except ValueError as pvm_ve:
-                logger.warning(f"No se pudo generar PVM: {pvm_ve}", exc_info=False)
-                results['pvm_scatter_json'] = _prepare_empty_scatter(f"PVM - Error: {pvm_ve}")
             except Exception as pvm_e:
                  logger.error(f"Error inesperado durante el cálculo de PVM: {pvm_e}", exc_info=True)
                  results['pvm_scatter_json'] = _prepare_empty_scatter("PVM - Error Interno")
-        elif price_metric_col:
-             logger.warning(f"Columna de métrica de precio '{price_metric_col}' no encontrada en el DataFrame. PVM no se generará.")
-             results['pvm_scatter_json'] = _prepare_empty_scatter(f"PVM - Columna '{price_metric_col}' no encontrada")
+        elif pvm_error:
+             logger.warning(f"No se pudo generar PVM: {pvm_error}")
+             results['pvm_scatter_json'] = _prepare_empty_scatter(f"PVM - Error: {pvm_error}")
         else:
             logger.warning("No se proporcionó columna de métrica de precio. PVM no se generará.")
             results['pvm_scatter_json'] = _prepare_empty_scatter("PVM - Métrica de Precio no definida")
 
+        report_progress(progress, STAGE_HINTS)
         pvm_was_attempted = bool(price_metric_col)
         results['interpretation_hints'] = _generate_comstrat_insights(moca_df, pvm_df, pvm_was_attempted)
         logger.info("Pistas de interpretación generadas.")
@@ -117,43 +148,145 @@ def run_comstrat_analysis(df: pd.DataFrame, price_metric_col: Optional[str] = No
         logger.error(f"Error inesperado durante el análisis ComStrat: {e}", exc_info=True)
         results['interpretation_hints']["general"] = f"Error inesperado: {e}"
         return results
+    finally:
+        progress.finish()
 
 
 # --- Funciones Auxiliares de Cálculo y Preparación ---
 
-def _validate_input_df(df: pd.DataFrame, required_columns: List[str], analysis_type: str):
-    """Valida que el DataFrame tenga las columnas necesarias y tipos correctos."""
-    # (Implementación sin cambios respecto a la versión anterior)
+def _prepare_input_df(df: pd.DataFrame, price_metric_col: Optional[str]) -> Tuple[pd.DataFrame, List[str], Optional[str], Optional[str]]:
+    """
+    Valida y convierte a numérico, en una sola pasada, las columnas que usan MOCA y PVM.
+
+    Solo se materializa la unión de columnas necesarias; el DataFrame original no se
+    modifica. MOCA y PVM se derivan después como vistas de columnas de este resultado.
+    Un problema con la columna de precio no invalida MOCA: se devuelve como mensaje.
+
+    Returns:
+        Tuple: (datos, columnas de competidores, columna de precio utilizable o None,
+                mensaje de error de PVM o None).
+
+    Raises:
+        ValueError: Si faltan columnas MOCA o no son numéricas.
+    """
     if df.empty:
-        raise ValueError(f"El DataFrame de entrada para {analysis_type} está vacío.")
-    missing_cols = [col for col in required_columns if col not in df.columns]
+        raise ValueError("El DataFrame de entrada para ComStrat está vacío.")
+    competitor_cols = _detect_competitor_columns(df)
+    required_cols = [COL_ATTRIBUTE, COL_IMPORTANCE, COL_PERFORMANCE_US] + competitor_cols
+    missing_cols = [col for col in required_cols if col not in df.columns]
     if missing_cols:
-        raise ValueError(f"Faltan columnas requeridas para {analysis_type}: {', '.join(missing_cols)}")
-
-    numeric_cols = [col for col in required_columns if col != COL_ATTRIBUTE]
-    for col in numeric_cols:
-        if not pd.api.types.is_numeric_dtype(df[col]):
-             try:
-                 df[col] = pd.to_numeric(df[col])
-                 logger.warning(f"Columna '{col}' fue convertida a tipo numérico para {analysis_type}.")
-             except (ValueError, TypeError) as convert_error:
-                 raise ValueError(f"La columna '{col}' requerida para {analysis_type} no es numérica y no pudo ser convertida. Error: {convert_error}") from convert_error
-
-def _calculate_moca_data(df: pd.DataFrame, cols: List[str]) -> pd.DataFrame:
-    """Calcula la ventaja competitiva y prepara el DataFrame para MOCA."""
-    # (Implementación sin cambios respecto a la versión anterior)
-    moca_df = df[cols].copy()
-    moca_df['Competitive_Advantage'] = moca_df[COL_PERFORMANCE_US] - moca_df[COL_PERFORMANCE_COMPETITOR]
-    moca_df = moca_df.dropna(subset=[COL_IMPORTANCE, 'Competitive_Advantage', COL_ATTRIBUTE]).reset_index(drop=True)
-    return moca_df
+        raise ValueError(f"Faltan columnas requeridas para MOCA: {', '.join(missing_cols)}")
+
+    pvm_error = None
+    if price_metric_col and price_metric_col not in df.columns:
+        pvm_error = f"Columna '{price_metric_col}' no encontrada"
+        price_metric_col = None
+    # Si la métrica de precio ya es una columna MOCA (p.ej. un Performance_*), se reutiliza
+    columns = required_cols + ([price_metric_col] if price_metric_col and price_metric_col not in required_cols else [])
+
+    data = {}
+    for col in columns:
+        series = df[col]
+        if col != COL_ATTRIBUTE and not pd.api.types.is_numeric_dtype(series):
+            try:
+                series = pd.to_numeric(series)
+                logger.warning(f"Columna '{col}' fue convertida a tipo numérico para ComStrat.")
+            except (ValueError, TypeError) as convert_error:
+                if col in required_cols:
+                    raise ValueError(f"La columna '{col}' requerida para MOCA no es numérica y no pudo ser convertida. Error: {convert_error}") from convert_error
+                pvm_error = f"La columna '{col}' no es numérica"
+                price_metric_col = None
+                continue
+        data[col] = series
+    return pd.DataFrame(data, copy=False), competitor_cols, price_metric_col, pvm_error
+
+def _detect_competitor_columns(df: pd.DataFrame) -> List[str]:
+    """Columnas 'Performance_<Nombre>' distintas de COL_PERFORMANCE_US, en orden de aparición."""
+    competitor_cols = [col for col in df.columns
+                       if isinstance(col, str) and col.startswith(PERFORMANCE_PREFIX) and col != COL_PERFORMANCE_US]
+    if not competitor_cols:
+        raise ValueError(f"No se encontraron columnas de competidores ('{PERFORMANCE_PREFIX}<Nombre>', p.ej. '{COL_PERFORMANCE_COMPETITOR}').")
+    return competitor_cols
+
+def _competitor_name(col: str) -> str:
+    """'Performance_MarcaX' -> 'MarcaX'."""
+    return col[len(PERFORMANCE_PREFIX):]
+
+def _classify_quadrants(importance: np.ndarray, advantage: np.ndarray) -> np.ndarray:
+    """
+    Clasifica en cuadrantes MOCA (importancia vs mediana, ventaja vs 0).
+    `advantage` puede ser 1D (n,) o 2D (n, k): la importancia se difunde por columnas.
+    """
+    median_importance = np.nanmedian(importance)
+    high_importance = importance >= median_importance
+    if advantage.ndim == 2:
+        high_importance = high_importance[:, None]
+    has_advantage = advantage >= 0
+    return np.select(
+        [high_importance & has_advantage, high_importance & ~has_advantage & ~np.isnan(advantage),
+         ~high_importance & has_advantage, ~high_importance & ~has_advantage & ~np.isnan(advantage)],
+        QUADRANT_NAMES, default='Indeterminado'
+    )
 
-def _calculate_pvm_data(df: pd.DataFrame, cols: List[str], price_col: str) -> pd.DataFrame:
-    """Extrae los datos necesarios para el PVM."""
-    # (Implementación sin cambios respecto a la versión anterior)
-    pvm_df = df[cols].copy()
-    pvm_df = pvm_df.rename(columns={COL_IMPORTANCE: 'Value_Score', price_col: 'Price_Score'})
-    pvm_df = pvm_df.dropna(subset=['Value_Score', 'Price_Score', COL_ATTRIBUTE]).reset_index(drop=True)
-    return pvm_df
+def _calculate_moca_data(df: pd.DataFrame, cols: List[str], competitor_cols: List[str]) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Calcula la matriz de ventajas atributo x competidor y prepara el DataFrame para MOCA.
+
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame]:
+            - moca_df: columnas de entrada + COL_ADVANTAGE (vs mejor competidor),
+              COL_BEST_COMPETITOR y COL_QUADRANT (vs mejor competidor).
+            - advantage_df: ventaja de 'Us' frente a cada competidor (atributos x competidores).
+    """
+    moca_df = df[cols].dropna(subset=[COL_IMPORTANCE, COL_ATTRIBUTE, COL_PERFORMANCE_US]).reset_index(drop=True)
+    names = [_competitor_name(col) for col in competitor_cols]
+
+    us = moca_df[COL_PERFORMANCE_US].to_numpy(dtype='float64')
+    competitors = moca_df[competitor_cols].to_numpy(dtype='float64') # (n, k)
+    advantage = us[:, None] - competitors                             # Broadcast: (n, k)
+
+    # Mejor competidor por atributo (ignorando NaN; filas sin ningún dato quedan en NaN)
+    filled = np.where(np.isnan(competitors), -np.inf, competitors)
+    best_idx = filled.argmax(axis=1)
+    best_perf = filled[np.arange(len(filled)), best_idx]
+    has_any = np.isfinite(best_perf)
+    moca_df[COL_ADVANTAGE] = np.where(has_any, us - best_perf, np.nan)
+    moca_df[COL_BEST_COMPETITOR] = np.where(has_any, np.asarray(names, dtype=object)[best_idx], None)
+
+    moca_df = moca_df[has_any].reset_index(drop=True)
+    advantage = advantage[has_any]
+    moca_df[COL_QUADRANT] = _classify_quadrants(moca_df[COL_IMPORTANCE].to_numpy(dtype='float64'), moca_df[COL_ADVANTAGE].to_numpy())
+
+    advantage_df = pd.DataFrame(advantage, columns=names, index=moca_df[COL_ATTRIBUTE].to_numpy())
+    advantage_df.index.name = COL_ATTRIBUTE
+    advantage_df.columns.name = 'Competitor'
+    return moca_df, advantage_df
+
+def _build_comstrat_table(moca_df: pd.DataFrame, advantage_df: pd.DataFrame) -> pd.DataFrame:
+    """Tabla combinada: ventaja y cuadrante frente a cada competidor y frente al mejor."""
+    if moca_df.empty:
+        return pd.DataFrame()
+    quadrants = _classify_quadrants(moca_df[COL_IMPORTANCE].to_numpy(dtype='float64'), advantage_df.to_numpy())
+    table = moca_df[[COL_ATTRIBUTE, COL_IMPORTANCE, COL_PERFORMANCE_US]].copy()
+    for j, name in enumerate(advantage_df.columns):
+        table[f'Advantage_vs_{name}'] = advantage_df.iloc[:, j].to_numpy()
+        table[f'Quadrant_vs_{name}'] = quadrants[:, j]
+    table[COL_BEST_COMPETITOR] = moca_df[COL_BEST_COMPETITOR].to_numpy()
+    table['Advantage_vs_Best'] = moca_df[COL_ADVANTAGE].to_numpy()
+    table['Quadrant_vs_Best'] = moca_df[COL_QUADRANT].to_numpy()
+    return table
+
+def _calculate_pvm_data(data: pd.DataFrame, price_col: str) -> pd.DataFrame:
+    """Deriva los datos del PVM como vista de columnas de los datos ya validados (sin copia)."""
+    pvm_df = pd.DataFrame({
+        COL_ATTRIBUTE: data[COL_ATTRIBUTE],
+        'Value_Score': data[COL_IMPORTANCE],
+        'Price_Score': data[price_col],
+    }, copy=False)
+    complete = pvm_df.notna().all(axis=1)
+    if not complete.all():
+        pvm_df = pvm_df[complete]
+    return pvm_df.reset_index(drop=True)
 
 # Añadido tipo de retorno Dict[str, Any]
 def _prepare_moca_scatter_json(moca_df: pd.DataFrame) -> Dict[str, Any]:
@@ -162,10 +295,11 @@ def _prepare_moca_scatter_json(moca_df: pd.DataFrame) -> Dict[str, Any]:
     if moca_df.empty:
         return _prepare_empty_scatter("MOCA - Sin datos válidos")
 
-    avg_importance = moca_df[COL_IMPORTANCE].median()
+    # float(): escalares de numpy no son serializables con tojson
+    avg_importance = float(moca_df[COL_IMPORTANCE].median())
     zero_advantage = 0
-    min_y, max_y = moca_df[COL_IMPORTANCE].min(), moca_df[COL_IMPORTANCE].max()
-    min_x, max_x = moca_df['Competitive_Advantage'].min(), moca_df['Competitive_Advantage'].max()
+    min_y, max_y = float(moca_df[COL_IMPORTANCE].min()), float(moca_df[COL_IMPORTANCE].max())
+    min_x, max_x = float(moca_df[COL_ADVANTAGE].min()), float(moca_df[COL_ADVANTAGE].max())
 
     y_range = max_y - min_y
     x_range = max_x - min_x
@@ -174,7 +308,7 @@ def _prepare_moca_scatter_json(moca_df: pd.DataFrame) -> Dict[str, Any]:
 
     data = [{
         'type': 'scatter', 'mode': 'markers+text',
-        'x': moca_df['Competitive_Advantage'].round(2).tolist(),
+        'x': moca_df[COL_ADVANTAGE].round(2).tolist(),
         'y': moca_df[COL_IMPORTANCE].round(2).tolist(),
         'text': moca_df[COL_ATTRIBUTE].tolist(),
         'textposition': 'top right', 'marker': {'size': 10, 'color': '#1f77b4'},
@@ -199,6 +333,65 @@ def _prepare_moca_scatter_json(moca_df: pd.DataFrame) -> Dict[str, Any]:
     }
     return {'data': data, 'layout': layout}
 
+def _prepare_moca_facets_json(moca_df: pd.DataFrame, advantage_df: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Gráfico MOCA facetado: un panel por competidor más uno frente al mejor competidor.
+    Cada panel usa su propio par de ejes (grid 'independent') y colorea por cuadrante.
+    """
+    if moca_df.empty:
+        return _prepare_empty_scatter("MOCA por Competidor - Sin datos válidos")
+
+    importance = moca_df[COL_IMPORTANCE].to_numpy(dtype='float64')
+    labels = moca_df[COL_ATTRIBUTE].tolist()
+    facets = [(f'vs {name}', advantage_df[name].to_numpy()) for name in advantage_df.columns]
+    facets.append(('vs Mejor Competidor', moca_df[COL_ADVANTAGE].to_numpy()))
+
+    advantages = np.column_stack([adv for _, adv in facets])
+    quadrants = _classify_quadrants(importance, advantages)
+    # Redondeo vectorizado una sola vez; el eje y es el mismo array en todos los paneles
+    advantages_rounded = np.round(advantages.astype('float64'), 2)
+    importance_rounded = np.round(importance, 2).tolist()
+    colors = np.vectorize(lambda q: QUADRANT_COLORS.get(q, '#7f7f7f'), otypes=[object])(quadrants)
+    median_importance = float(np.nanmedian(importance))
+    labelled = select_render_mode(len(moca_df)) == RENDER_SVG
+
+    n_facets = len(facets)
+    n_cols = min(3, n_facets)
+    n_rows = int(np.ceil(n_facets / n_cols))
+    data, shapes, annotations = [], [], []
+    layout: Dict[str, Any] = {
+        'title': 'Matriz de Ventajas Competitivas por Competidor (MOCA)',
+        'grid': {'rows': n_rows, 'columns': n_cols, 'pattern': 'independent'},
+        'showlegend': False, 'hovermode': 'closest',
+        'height': max(450, 350 * n_rows),
+        'margin': {'l': 50, 'r': 20, 't': 70, 'b': 50},
+    }
+    for i, (title, _) in enumerate(facets, start=1):
+        suffix = '' if i == 1 else str(i)
+        trace = {
+            'type': 'scatter' if labelled else 'scattergl',
+            'mode': 'markers+text' if labelled else 'markers',
+            'x': advantages_rounded[:, i - 1].tolist(), 'y': importance_rounded,
+            'marker': {'size': 8, 'color': colors[:, i - 1].tolist()},
+            'xaxis': f'x{suffix}', 'yaxis': f'y{suffix}', 'name': title,
+        }
+        if labelled:
+            trace.update({'text': labels, 'textposition': 'top right', 'textfont': {'size': 9}})
+        else:
+            trace.update({'hovertext': labels, 'hoverinfo': 'text+x+y'})
+        data.append(trace)
+        layout[f'xaxis{suffix}'] = {'title': {'text': f'Ventaja {title}', 'font': {'size': 11}}, 'zeroline': False}
+        layout[f'yaxis{suffix}'] = {'title': {'text': COL_IMPORTANCE if (i - 1) % n_cols == 0 else '', 'font': {'size': 11}}}
+        shapes.append({'type': 'line', 'xref': f'x{suffix}', 'yref': f'y{suffix} domain', 'x0': 0, 'x1': 0, 'y0': 0, 'y1': 1,
+                       'line': {'color': 'grey', 'width': 1, 'dash': 'dash'}})
+        shapes.append({'type': 'line', 'xref': f'x{suffix} domain', 'yref': f'y{suffix}', 'x0': 0, 'x1': 1,
+                       'y0': median_importance, 'y1': median_importance, 'line': {'color': 'grey', 'width': 1, 'dash': 'dash'}})
+        annotations.append({'text': f'<b>{title}</b>', 'xref': f'x{suffix} domain', 'yref': f'y{suffix} domain',
+                            'x': 0.5, 'y': 1.08, 'showarrow': False, 'font': {'size': 12}})
+    layout['shapes'] = shapes
+    layout['annotations'] = annotations
+    return {'data': data, 'layout': layout}
+
 # Añadido tipo de retorno Dict[str, Any]
 def _prepare_pvm_scatter_json(pvm_df: pd.DataFrame, price_col_name: str) -> Dict[str, Any]:
     """Prepara datos JSON para un gráfico scatter Plotly (PVM)."""
@@ -206,26 +399,27 @@ def _prepare_pvm_scatter_json(pvm_df: pd.DataFrame, price_col_name: str) -> Dict
     if pvm_df.empty:
         return _prepare_empty_scatter("PVM - Sin datos válidos")
 
-    avg_value = pvm_df['Value_Score'].median()
-    avg_price = pvm_df['Price_Score'].median()
-    min_y, max_y = pvm_df['Value_Score'].min(), pvm_df['Value_Score'].max()
-    min_x, max_x = pvm_df['Price_Score'].min(), pvm_df['Price_Score'].max()
+    # float(): escalares de numpy no son serializables con tojson
+    avg_value = float(pvm_df['Value_Score'].median())
+    avg_price = float(pvm_df['Price_Score'].median())
+    min_y, max_y = float(pvm_df['Value_Score'].min()), float(pvm_df['Value_Score'].max())
+    min_x, max_x = float(pvm_df['Price_Score'].min()), float(pvm_df['Price_Score'].max())
 
     y_range = max_y - min_y
     x_range = max_x - min_x
     y_margin = y_range * 0.05 if y_range > 0 else 1
     x_margin = x_range * 0.05 if x_range > 0 else 1
 
-    data = [{
-        'type': 'scatter', 'mode': 'markers+text',
-        'x': pvm_df['Price_Score'].round(2).tolist(),
-        'y': pvm_df['Value_Score'].round(2).tolist(),
-        'text': pvm_df[COL_ATTRIBUTE].tolist(),
-        'textposition': 'top right', 'marker': {'size': 10, 'color': '#2ca02c'},
-        'name': 'Atributos'
-    }]
+    # SVG etiquetado, WebGL o densidad según el número de atributos.
+    # Outliers: mayor desviación del valor respecto a la mediana.
+    data, render_mode = build_point_traces(
+        pvm_df['Price_Score'].round(2), pvm_df['Value_Score'].round(2), pvm_df[COL_ATTRIBUTE],
+        pvm_df['Value_Score'] - avg_value, np.full(len(pvm_df), 'Atributos', dtype=object),
+        {'Atributos': '#2ca02c'}
+    )
     layout = {
         'title': f'Mapa Precio-Valor (PVM - Atributos)',
+        'meta': {'render_mode': render_mode, 'n_points': len(pvm_df)},
         'xaxis': {'title': f'{price_col_name} (Métrica Precio/Costo)', 'range': [min_x - x_margin, max_x + x_margin]},
         'yaxis': {'title': f'{COL_IMPORTANCE} (Valor Percibido)', 'range': [min_y - y_margin, max_y + y_margin]},
         'hovermode': 'closest',
@@ -258,28 +452,26 @@ def _generate_comstrat_insights(moca_df: pd.DataFrame, pvm_df: pd.DataFrame, pvm
         hints["general"] = "No hay datos MOCA válidos para generar insights."
         return hints
 
-    avg_importance = moca_df[COL_IMPORTANCE].median()
-    moca_df['Quadrant'] = np.select(
-        [
-            (moca_df[COL_IMPORTANCE] >= avg_importance) & (moca_df['Competitive_Advantage'] >= 0),
-            (moca_df[COL_IMPORTANCE] >= avg_importance) & (moca_df['Competitive_Advantage'] < 0),
-            (moca_df[COL_IMPORTANCE] < avg_importance) & (moca_df['Competitive_Advantage'] >= 0),
-            (moca_df[COL_IMPORTANCE] < avg_importance) & (moca_df['Competitive_Advantage'] < 0)
-        ],
-        ['Fortaleza Clave', 'Debilidad Clave', 'Fortaleza Secundaria', 'Baja Prioridad'],
-        default='Indeterminado'
-    )
+    # Cuadrante frente al mejor competidor (calculado en _calculate_moca_data)
+    if COL_QUADRANT not in moca_df.columns:
+        moca_df[COL_QUADRANT] = _classify_quadrants(moca_df[COL_IMPORTANCE].to_numpy(dtype='float64'), moca_df[COL_ADVANTAGE].to_numpy(dtype='float64'))
 
-    strengths = moca_df[moca_df['Quadrant'] == 'Fortaleza Clave'][COL_ATTRIBUTE].tolist()
-    weaknesses = moca_df[moca_df['Quadrant'] == 'Debilidad Clave'][COL_ATTRIBUTE].tolist()
-    secondary_strengths = moca_df[moca_df['Quadrant'] == 'Fortaleza Secundaria'][COL_ATTRIBUTE].tolist()
-    low_priority = moca_df[moca_df['Quadrant'] == 'Baja Prioridad'][COL_ATTRIBUTE].tolist()
+    strengths = moca_df[moca_df[COL_QUADRANT] == 'Fortaleza Clave'][COL_ATTRIBUTE].tolist()
+    weaknesses = moca_df[moca_df[COL_QUADRANT] == 'Debilidad Clave'][COL_ATTRIBUTE].tolist()
+    secondary_strengths = moca_df[moca_df[COL_QUADRANT] == 'Fortaleza Secundaria'][COL_ATTRIBUTE].tolist()
+    low_priority = moca_df[moca_df[COL_QUADRANT] == 'Baja Prioridad'][COL_ATTRIBUTE].tolist()
 
     hints['moca_strengths'] = f"**Fortalezas Clave (Alto Imp, Ventaja ≥ 0):** {', '.join(strengths) if strengths else 'Ninguna.'} -> CAPITALIZAR."
     hints['moca_weaknesses'] = f"**Debilidades Clave (Alto Imp, Ventaja < 0):** {', '.join(weaknesses) if weaknesses else 'Ninguna.'} -> MEJORA PRIORITARIA."
     hints['moca_secondary'] = f"**Fortalezas Secundarias (Bajo Imp, Ventaja ≥ 0):** {', '.join(secondary_strengths) if secondary_strengths else 'Ninguna.'} -> MANTENER EFICIENCIA."
     hints['moca_low_priority'] = f"**Baja Prioridad (Bajo Imp, Ventaja < 0):** {', '.join(low_priority) if low_priority else 'Ninguna.'} -> EVITAR SOBREINVERSIÓN."
 
+    if COL_BEST_COMPETITOR in moca_df.columns and moca_df[COL_BEST_COMPETITOR].nunique() > 1:
+        leaders = moca_df[COL_BEST_COMPETITOR].value_counts()
+        hints['moca_competitors'] = ("**Mejor Competidor por Atributo:** "
+                                     + ", ".join(f"{name} ({count})" for name, count in leaders.items())
+                                     + ". La ventaja y los cuadrantes se calculan frente al mejor competidor de cada atributo.")
+
     if not pvm_df.empty:
         hints['pvm_summary'] = ("**PVM:** El mapa Precio-Valor muestra la relación entre el valor percibido (importancia) y la métrica de precio/costo asociada a cada atributo. "
                               "Identifica atributos en la zona de 'Oportunidad' (Alto Valor, Bajo Precio/Costo) y gestiona los que caen en 'Peligro' (Bajo Valor, Alto Precio/Costo).")
@@ -296,7 +488,10 @@ def _generate_comstrat_insights(moca_df: pd.DataFrame, pvm_df: pd.DataFrame, pvm
 # --- Capa de Compatibilidad (Wrapper) ---
 
 # Tipo de retorno ya era correcto (Dict[str, Any])
-def run_comstrat(df: pd.DataFrame, price_metric_col: Optional[str] = None) -> Dict[str, Any]:
+def run_comstrat(df: pd.DataFrame, price_metric_col: Optional[str] = None,
+                 ratings_df: Optional[pd.DataFrame] = None, outcome_col: Optional[str] = None,
+                 importance_method: Optional[str] = None, shapley_max_workers: Optional[int] = None,
+                 progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
     """
     Wrapper público para ser llamado desde las rutas del blueprint 'comstrat'.
     Ejecuta el análisis ComStrat y devuelve un diccionario simplificado
@@ -305,23 +500,56 @@ def run_comstrat(df: pd.DataFrame, price_metric_col: Optional[str] = None) -> Di
     Args:
         df (pd.DataFrame): DataFrame con los datos combinados.
         price_metric_col (Optional[str]): Nombre de la columna de métrica de precio.
+        ratings_df (Optional[pd.DataFrame]): Ratings a nivel encuestado. Si se indica junto
+            con `outcome_col`, el Importance_Score se deriva de ellos (ver importance.py).
+        outcome_col (Optional[str]): Columna de resultado en `ratings_df`.
+        importance_method (Optional[str]): 'relative_weights' (defecto) o 'shapley'.
+        shapley_max_workers (Optional[int]): Procesos para Shapley con muchos drivers
+            (SHAPLEY_MAX_WORKERS: el trabajo ya ocupa uno de los JOB_MAX_WORKERS).
+        progress (Optional[ProgressCallback]): Callback de progreso por etapa.
 
     Returns:
-        Dict[str, Any]: Diccionario con llaves: 'moca_json', 'pvm_json',
-                        'moca_df', 'insights'.
+        Dict[str, Any]: Diccionario con llaves: 'moca_json', 'moca_facets_json',
+                        'pvm_json', 'moca_df', 'comstrat_table_df', 'insights'.
     """
     logger.info(f"Ejecutando wrapper 'run_comstrat' para blueprint (Price Metric Col: {price_metric_col})...")
-    full_analysis_results = run_comstrat_analysis(df, price_metric_col)
+    if ratings_df is not None and outcome_col:
+        # Import diferido: importance.py importa constantes de este módulo
+        from proyect.comstrat.importance import METHOD_RELATIVE_WEIGHTS, apply_derived_importance
+        df = apply_derived_importance(df, ratings_df, outcome_col, importance_method or METHOD_RELATIVE_WEIGHTS,
+                                      max_workers=shapley_max_workers)
+    full_analysis_results = run_comstrat_analysis(df, price_metric_col, progress)
 
     compatible_results = {
         'moca_json': full_analysis_results['moca_scatter_json'],
+        'moca_facets_json': full_analysis_results['moca_facets_json'],
         'pvm_json': full_analysis_results['pvm_scatter_json'],
         'moca_df': full_analysis_results['moca_df'], # DataFrame para tabla HTML
+        'comstrat_table_df': full_analysis_results['comstrat_table_df'], # Tabla combinada por competidor
         'insights': full_analysis_results['interpretation_hints']
     }
     logger.info("Resultados ComStrat listos para pasar a la plantilla.")
     return compatible_results
 
+# --- Punto de Entrada para Trabajos en Segundo Plano ---
+
+def process_comstrat_file(filepath: str, price_metric_col: Optional[str] = None,
+                          outcome_col: Optional[str] = None, importance_method: Optional[str] = None,
+                          shapley_max_workers: Optional[int] = None,
+                          progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+    """
+    Lee el archivo (y la hoja RATINGS_SHEET si se pide importancia derivada) y
+    ejecuta run_comstrat. Se ejecuta en un proceso worker (ver proyect.common.jobs).
+    """
+    report_progress(progress, STAGE_READ)
+    df = read_data_file(filepath)
+    if outcome_col:
+        report_progress(progress, STAGE_READ, 0.5)
+    ratings_df = read_data_file(filepath, sheet_name=RATINGS_SHEET) if outcome_col else None
+    return run_comstrat(df, price_metric_col=price_metric_col, ratings_df=ratings_df,
+                        outcome_col=outcome_col, importance_method=importance_method,
+                        shapley_max_workers=shapley_max_workers, progress=progress)
+
 # --- Bloque de Ejemplo para Pruebas Directas ---
 # Comentado por defecto, ya que no es necesario cuando se importa como módulo.
 # Descomenta si necesitas probar este archivo de forma aislada.
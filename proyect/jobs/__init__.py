@@ -0,0 +1,11 @@
+# proyect/jobs/__init__.py
+"""
+Inicialización del Blueprint 'jobs'.
+Importa el objeto Blueprint desde routes.py para su registro.
+"""
+
+# Importa únicamente el objeto Blueprint definido en routes.py
+from .routes import bp
+
+# Controla qué se exporta con "from proyect.jobs import *"
+__all__ = ['bp']
@@ -0,0 +1,108 @@
+# proyect/jobs/routes.py
+"""
+Rutas de seguimiento de trabajos en segundo plano (ver proyect.common.jobs).
+
+- /jobs/<job_id>          Página de espera; redirige a los resultados al terminar.
+- /jobs/<job_id>/status   Estado en JSON (consulta puntual / respaldo sin SSE).
+- /jobs/<job_id>/events   Flujo Server-Sent Events con el progreso del trabajo.
+"""
+
+import json
+import time
+from typing import Iterator, Optional
+
+from flask import Blueprint, render_template, redirect, url_for, flash, jsonify, abort, Response, stream_with_context
+
+from proyect.common.jobs import jobs, JOB_DONE, JOB_FAILED, JOB_FINAL_STATES
+
+# --- Constantes y Configuraciones ---
+SSE_POLL_INTERVAL = 0.5        # Segundos entre comprobaciones del archivo de estado (stat)
+SSE_HEARTBEAT_INTERVAL = 15.0  # Comentario keep-alive para proxies con timeout de inactividad
+# Flujo corto: cada cliente ocupa un hilo del worker web mientras está abierto. Al cerrarse,
+# EventSource reconecta tras SSE_RETRY_MS y recibe de nuevo el estado actual.
+SSE_MAX_DURATION = 25.0        # Segundos por conexión
+SSE_RETRY_MS = 2000            # Espera de reconexión sugerida a EventSource
+
+# --- Definición única de Blueprint con prefijo y nombre consistente ---
+bp = Blueprint('jobs', __name__, url_prefix='/jobs')
+
+
+@bp.route('/<job_id>', endpoint='status_page')
+def status_page(job_id: str):
+    """Página de espera mientras el análisis se ejecuta."""
+    status = jobs.get_status(job_id)
+    if status is None:
+        flash('El análisis solicitado no existe o ha caducado.', 'warning')
+        return redirect(url_for('main.dashboard'))
+    if status.get('status') == JOB_DONE:
+        return redirect(_results_url(status))
+    return render_template('job_status.html', job=status)
+
+
+@bp.route('/<job_id>/status', endpoint='status')
+def status(job_id: str):
+    """Estado del trabajo en JSON: status, progreso, tiempos, error y URL de resultados."""
+    job_status = jobs.get_status(job_id)
+    if job_status is None:
+        abort(404)
+    return jsonify(_status_payload(job_status))
+
+
+@bp.route('/<job_id>/events', endpoint='events')
+def events(job_id: str):
+    """
+    Progreso del trabajo como Server-Sent Events.
+
+    Eventos: 'progress' (etapa, porcentaje, ETA), 'done' (con results_url) y
+    'failed' (con error). Solo se emite cuando cambia el archivo de estado.
+    """
+    if jobs.get_status(job_id) is None:
+        abort(404)
+    response = Response(stream_with_context(_job_event_stream(job_id)), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Nginx: no acumular el flujo en buffer
+    return response
+
+
+def _job_event_stream(job_id: str) -> Iterator[str]:
+    """Generador SSE: vigila el mtime del estado y emite un evento por cada cambio."""
+    yield f"retry: {SSE_RETRY_MS}\n\n"
+    started = last_sent = time.monotonic()
+    last_mtime: Optional[int] = None
+    while time.monotonic() - started < SSE_MAX_DURATION:
+        mtime = jobs.status_mtime(job_id)
+        if mtime is not None and mtime != last_mtime:
+            last_mtime = mtime
+            job_status = jobs.get_status(job_id)
+            if job_status is not None:
+                payload = _status_payload(job_status)
+                state = job_status.get('status')
+                event = state if state in JOB_FINAL_STATES else 'progress'
+                yield _sse_message(event, payload)
+                last_sent = time.monotonic()
+                if state in JOB_FINAL_STATES:
+                    return
+        if time.monotonic() - last_sent >= SSE_HEARTBEAT_INTERVAL:
+            yield ": keep-alive\n\n"
+            last_sent = time.monotonic()
+        time.sleep(SSE_POLL_INTERVAL)
+
+
+def _sse_message(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+def _status_payload(job_status: dict) -> dict:
+    """Campos públicos del estado (sin traceback ni pid)."""
+    payload = {key: job_status.get(key) for key in
+               ('job_id', 'analysis_type', 'filename', 'status', 'created_at', 'started_at', 'finished_at', 'progress')}
+    if job_status.get('status') == JOB_DONE:
+        payload['results_url'] = _results_url(job_status)
+    elif job_status.get('status') == JOB_FAILED:
+        payload['error'] = job_status.get('error')
+    return payload
+
+
+def _results_url(job_status: dict) -> str:
+    """Cada blueprint de análisis expone '<tipo>.results' con el job_id."""
+    return url_for(f"{job_status['analysis_type']}.results", job_id=job_status['job_id'])
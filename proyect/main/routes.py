@@ -1,15 +1,29 @@
 # proyect/main/routes.py
 
 from flask import (
-    render_template, request, redirect,
-    url_for, flash, session, current_app
+    render_template, request, redirect, Response,
+    url_for, flash, session, current_app, jsonify, stream_with_context
 )
 from werkzeug.utils import secure_filename
 from werkzeug.exceptions import RequestEntityTooLarge
+import itertools
+from datetime import datetime, timedelta
 from pathlib import Path
+from typing import Any, Dict, Optional
+import pandas as pd
 
 # Helpers comunes
-from proyect.common.utils import allowed_file, read_data_file
+from proyect.common.utils import allowed_file, iter_data_file_chunks, PREVIEW_ROWS
+from proyect.common.streaming import iter_html_table, render_streamed
+from proyect.common.history import add_history_entry, get_history_page, get_history_stats
+from proyect.common.db import DEFAULT_PER_PAGE
+from proyect.common.catalog import analysis_catalog
+from proyect.common.results import load_analysis_results
+from proyect.common.export import (
+    EXPORT_FORMATS, EXPORT_MIMETYPES, FORMAT_CSV, FORMAT_PARQUET, FORMAT_XLSX, FORMAT_ZIP,
+    export_filename, iter_export, iter_files_zip, result_charts
+)
+from proyect.common.rendering import IMAGE_FORMATS, IMAGE_MIMETYPES, chart_renderer
 
 # Importamos el Blueprint definido en __init__.py
 from proyect.main import bp
@@ -23,9 +37,70 @@ def index():
 
 @bp.route('/dashboard', methods=['GET'], endpoint='dashboard')
 def dashboard():
-    """Muestra el historial de cargas y acceso al dashboard."""
-    upload_history = session.get('upload_history', [])
-    return render_template('dashboard.html', history=upload_history)
+    """Muestra el historial de cargas (paginado, desde SQLite) y acceso al dashboard."""
+    page = request.args.get('page', 1, type=int)
+    pagination = get_history_page(page=page, per_page=DEFAULT_PER_PAGE)
+    # Catálogo de análisis: filtros propios (?a_type=&a_status=&a_from=&a_to=&apage=)
+    analysis_filters = _catalog_filters(prefix='a_')
+    analyses = analysis_catalog.query(page=request.args.get('apage', 1, type=int), **_catalog_query_args(analysis_filters))
+    return render_template('dashboard.html', uploaded_files=pagination.items,
+                           pagination=pagination, stats=get_history_stats(),
+                           analyses=analyses, analysis_filters=analysis_filters)
+
+
+@bp.route('/history', methods=['GET'], endpoint='history')
+def history():
+    """Historial paginado en JSON: ?page=&per_page=&analysis_type=."""
+    pagination = get_history_page(
+        page=request.args.get('page', 1, type=int),
+        per_page=request.args.get('per_page', DEFAULT_PER_PAGE, type=int),
+        analysis_type=request.args.get('analysis_type') or None,
+    )
+    return jsonify(pagination.to_dict(
+        lambda entry: dict(entry, upload_date=entry['upload_date'].isoformat(timespec='seconds'))))
+
+
+@bp.route('/analyses', methods=['GET'], endpoint='analyses')
+def analyses():
+    """Catálogo de análisis paginado en JSON: ?page=&per_page=&type=&status=&from=YYYY-MM-DD&to=YYYY-MM-DD."""
+    pagination = analysis_catalog.query(
+        page=request.args.get('page', 1, type=int),
+        per_page=request.args.get('per_page', DEFAULT_PER_PAGE, type=int),
+        **_catalog_query_args(_catalog_filters(prefix='')),
+    )
+    return jsonify(pagination.to_dict(_serialize_catalog_entry))
+
+
+def _catalog_filters(prefix: str) -> Dict[str, str]:
+    """Filtros del catálogo tal como vienen en la query string (para repintar el formulario)."""
+    return {name: request.args.get(f"{prefix}{name}", '').strip() for name in ('type', 'status', 'from', 'to')}
+
+
+def _catalog_query_args(filters: Dict[str, str]) -> Dict[str, Any]:
+    """Convierte los filtros a argumentos de analysis_catalog.query ('to' es inclusivo)."""
+    date_to = _parse_date(filters['to'])
+    return {
+        'analysis_type': filters['type'] or None,
+        'status': filters['status'] or None,
+        'date_from': _parse_date(filters['from']),
+        'date_to': date_to + timedelta(days=1) if date_to else None,
+    }
+
+
+def _parse_date(value: str) -> Optional[datetime]:
+    try:
+        return datetime.strptime(value, '%Y-%m-%d') if value else None
+    except ValueError:
+        return None
+
+
+def _serialize_catalog_entry(entry: Dict[str, Any]) -> Dict[str, Any]:
+    keys = ('id', 'analysis_type', 'filename', 'input_hash', 'params', 'status', 'error', 'created_at',
+            'started_at', 'finished_at', 'queue_seconds', 'run_seconds', 'artifact_bytes')
+    data = {key: entry.get(key) for key in keys}
+    data['results_url'] = (url_for(f"{entry['analysis_type']}.results", job_id=entry['id'])
+                           if entry.get('status') == 'done' else None)
+    return data
 
 
 @bp.route('/upload', methods=['GET', 'POST'], endpoint='upload_file')
@@ -55,13 +130,7 @@ def upload_file():
             session['original_filename']    = filename
             session['analysis_type']        = request.form.get('analysis_type', 'maxdiff')
 
-            history = session.get('upload_history', [])
-            history.append({
-                'filename': filename,
-                'analysis_type': session['analysis_type'],
-                'status': 'Subido'
-            })
-            session['upload_history'] = history
+            add_history_entry(filename, session['analysis_type'], 'Subido')
 
             flash(f"Archivo '{filename}' subido correctamente.", 'success')
             return redirect(url_for('main.preview_file'))
@@ -94,14 +163,11 @@ def preview_file():
         return redirect(url_for('main.upload_file'))
 
     try:
-        df = read_data_file(filepath)
-        table_html = df.head().to_html(
-            classes="table table-sm table-striped table-hover table-preview",
-            index=False, border=0, escape=True
-        )
-        return render_template(
+        # Solo se lee el primer bloque; la tabla se envía en streaming tras el layout
+        df = next(iter_data_file_chunks(filepath, chunksize=PREVIEW_ROWS), pd.DataFrame())
+        return render_streamed(
             'preview.html',
-            table_html=table_html,
+            dataframe_head=iter_html_table([df], classes="table table-sm table-striped table-hover table-preview"),
             filename=filename,
             analysis_type=analysis_type
         )
@@ -136,17 +202,57 @@ def export_options():
 
 @bp.route('/export', methods=['GET'], endpoint='export_file')
 def export_file():
-    """Genera y envía el archivo resultante (placeholder)."""
+    """
+    Genera y envía el archivo resultante en streaming (memoria constante).
+    ?analysis_type=&source_ref=<job_id o clave de caché>&format=xlsx|csv|json|parquet|zip|pdf|png|svg[&table=]
+    pdf es el informe de gráficos (una página por figura); png/svg, un ZIP con una imagen por gráfico.
+    """
     analysis_type = request.args.get('analysis_type')
     source_ref    = request.args.get('source_ref')
-    fmt           = request.args.get('format', 'xlsx')
+    fmt           = request.args.get('format', FORMAT_XLSX).lower()
+    table         = request.args.get('table') or None
 
     if not analysis_type or not source_ref:
         flash("Faltan parámetros para exportar.", "warning")
         return redirect(url_for('main.dashboard'))
+    if fmt not in EXPORT_FORMATS + IMAGE_FORMATS:
+        flash(f"La exportación como {fmt.upper()} no está disponible. "
+              f"Formatos: {', '.join(EXPORT_FORMATS + IMAGE_FORMATS)}.", 'info')
+        return redirect(url_for('main.export_options', analysis_type=analysis_type, source_ref=source_ref))
 
-    current_app.logger.info(
-        f"Export: tipo={analysis_type}, ref={source_ref}, fmt={fmt} (pendiente)"
-    )
-    flash(f'Exportación {analysis_type} como {fmt} aún no implementada.', 'info')
-    return redirect(url_for('main.dashboard'))
+    loaded = load_analysis_results(source_ref, analysis_type)
+    if loaded is None:
+        flash('No se encontraron los resultados a exportar. Vuelve a procesar el archivo.', 'warning')
+        return redirect(url_for('main.dashboard'))
+    results, meta = loaded
+    filename = meta.get('filename')
+
+    try:
+        if fmt in IMAGE_FORMATS:
+            chunks, mimetype, extension = _render_chart_export(results, fmt)
+        else:
+            chunks, mimetype, extension = iter_export(results, fmt, table=table), EXPORT_MIMETYPES[fmt], fmt
+        first_chunk = next(chunks, b'')  # Los errores de validación/dependencias saltan antes de empezar a enviar
+    except (ValueError, RuntimeError) as e:
+        flash(f"No se pudo exportar: {e}", 'warning')
+        return redirect(url_for('main.export_options', analysis_type=analysis_type, source_ref=source_ref))
+
+    download_name = export_filename(f"{analysis_type}_{Path(filename or source_ref).stem}", extension,
+                                    table if fmt in (FORMAT_CSV, FORMAT_PARQUET) else None)
+    current_app.logger.info(f"Export: tipo={analysis_type}, ref={source_ref}, fmt={fmt} -> {download_name}")
+    response = Response(stream_with_context(itertools.chain([first_chunk], chunks)), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{download_name}"'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _render_chart_export(results: Dict[str, Any], fmt: str):
+    """(chunks, mimetype, extensión) de los gráficos renderizados offline en el pool de chart_renderer."""
+    charts = result_charts(results)
+    if fmt == 'pdf':
+        return iter([chart_renderer.build_pdf_report(list(charts.values()))]), IMAGE_MIMETYPES['pdf'], 'pdf'
+    if not charts:
+        raise ValueError("El resultado no contiene gráficos para exportar.")
+    images = chart_renderer.render_many(list(charts.values()), fmt=fmt)
+    files = {f"{name}.{fmt}": image for name, image in zip(charts, images)}
+    return iter_files_zip(files), EXPORT_MIMETYPES[FORMAT_ZIP], FORMAT_ZIP
@@ -1,6 +1,7 @@
 # proyect/maxdiff/routes.py (FINAL - con índice y mejoras previas)
 
 from pathlib import Path
+import pandas as pd
 from flask import (
     Blueprint, render_template, request, redirect,
     url_for, flash, session, current_app
@@ -9,8 +10,15 @@ from werkzeug.utils import secure_filename
 from werkzeug.exceptions import RequestEntityTooLarge
 
 # Importaciones de utilidades
-from proyect.common.utils import allowed_file, read_data_file, update_history_status
-from proyect.maxdiff.utils import run_maxdiff
+from proyect.common.utils import allowed_file, iter_data_file_chunks, update_history_status, PREVIEW_ROWS
+from proyect.common.streaming import iter_html_table, render_streamed
+from proyect.common.jobs import jobs, JobQueueFullError, JOB_DONE, JOB_FAILED
+from proyect.common.admission import admission # 429/503 con Retry-After si no hay presupuesto
+from proyect.common.cache import result_cache
+from proyect.common.catalog import analysis_catalog
+from proyect.common.results import figure_urls, load_analysis_index, table_urls
+from proyect.common.compression import check_not_modified
+from proyect.maxdiff.utils import process_maxdiff_file
 
 # Definición del Blueprint con prefijo /maxdiff
 bp = Blueprint('maxdiff', __name__, url_prefix='/maxdiff')
@@ -93,14 +101,12 @@ def preview():
          return redirect(url_for('maxdiff.upload'))
 
     try:
-        df = read_data_file(filepath)
-        table_html = df.head().to_html(
-            classes='table table-striped table-hover table-sm',
-            border=0, index=False
-        )
+        # Solo se lee el primer bloque; la tabla se envía en streaming tras el layout
+        df = next(iter_data_file_chunks(filepath, chunksize=PREVIEW_ROWS), pd.DataFrame())
         # Asegúrate que 'preview.html' tenga un enlace/botón que apunte a
         # href="{{ url_for('maxdiff.process') }}"
-        return render_template('preview.html', table_html=table_html, analysis_type='maxdiff')
+        return render_streamed('preview.html', analysis_type='maxdiff', filename=session.get('original_filename'),
+                               dataframe_head=iter_html_table([df], classes='table table-striped table-hover table-sm'))
 
     except FileNotFoundError:
          current_app.logger.error(f"Archivo '{filepath}' no encontrado para preview de MaxDiff.")
@@ -123,8 +129,8 @@ def preview():
 @bp.route('/process', endpoint='process', methods=['GET'])
 def process():
     """
-    Procesa los datos de MaxDiff y muestra resultados.
-    Limpia la sesión relacionada con el archivo tras procesar con éxito.
+    Envía el análisis MaxDiff a la cola de trabajos y redirige a la página de espera.
+    El cálculo se ejecuta en un proceso worker (proyect.common.jobs).
     Accesible en /maxdiff/process
     """
     filepath = session.get('uploaded_file_path')
@@ -138,52 +144,94 @@ def process():
          flash(f'Se esperaba procesar MaxDiff pero el tipo en sesión es {analysis_type}.', 'danger')
          return redirect(url_for('maxdiff.upload'))
 
+    # Mismo archivo (por contenido) ya analizado con esta versión: resultados desde la caché
+    cache_key = result_cache.key_for_file(filepath, 'maxdiff')
+    if result_cache.contains(cache_key):
+        cached_url = url_for('maxdiff.cached_results', cache_key=cache_key)
+        update_history_status(filename, 'Procesado (MaxDiff)', results_url=cached_url)
+        current_app.logger.info(f"Resultados MaxDiff para {filename} servidos desde caché ({cache_key[:12]}).")
+        return redirect(cached_url)
+
     try:
-        current_app.logger.info(f"Iniciando procesamiento MaxDiff para archivo: {filename}")
-        df = read_data_file(filepath)
-        results = run_maxdiff(df)
+        job_id = admission.submit('maxdiff', process_maxdiff_file, filepath, filename=filename,
+                                  meta={'cache_key': cache_key})
+    except JobQueueFullError as e:
+        current_app.logger.warning(f"Cola de análisis llena al enviar MaxDiff para '{filename}': {e}")
+        flash(str(e), 'warning')
+        return redirect(url_for('maxdiff.preview'))
 
-        update_history_status(filename, 'Procesado (MaxDiff)')
-        current_app.logger.info(f"Procesamiento MaxDiff para {filename} completado con éxito.")
+    analysis_catalog.record_submission(job_id, 'maxdiff', filename, filepath, cache_key=cache_key)
+    session['job_id'] = job_id
+    update_history_status(filename, 'En cola (MaxDiff)')
+    current_app.logger.info(f"Procesamiento MaxDiff para {filename} enviado como trabajo {job_id}.")
+    return redirect(url_for('jobs.status_page', job_id=job_id))
 
-        # --- Limpiar sesión después de procesar ---
-        session.pop('uploaded_file_path', None)
-        session.pop('original_filename', None)
-        session.pop('analysis_type', None)
 
-        return render_template(
-            'results_maxdiff.html',
-            filename=filename,
-            avg_table=results['avg_df'].to_html(
-                classes='table table-hover table-sm', border=0, index=False, float_format='%.2f'
-            ),
-            tmb_table=results['tmb_df'].to_html(
-                classes='table table-hover table-sm', border=0, index=False
-            ),
-            bar_json=results['bar_json'],
-            stacked_json=results['stacked_json']
-        )
-
-    # Manejo de Errores Específico
-    except FileNotFoundError:
-        current_app.logger.error(f"Archivo '{filepath}' no encontrado durante el procesamiento MaxDiff.")
-        flash('Error crítico: El archivo a procesar no se encuentra. Pudo ser borrado.', 'danger')
-        update_history_status(filename, 'Error - Archivo no encontrado (MaxDiff)')
-        session.pop('uploaded_file_path', None)
-        session.pop('original_filename', None)
-        session.pop('analysis_type', None)
+@bp.route('/results/<job_id>', endpoint='results', methods=['GET'])
+def results(job_id):
+    """
+    Muestra los resultados de un trabajo MaxDiff terminado.
+    Limpia la sesión relacionada con el archivo tras un procesamiento con éxito.
+    Accesible en /maxdiff/results/<job_id>
+    """
+    # Si el estado del trabajo ya no existe, el catálogo tiene los mismos metadatos
+    status = jobs.get_status(job_id) or analysis_catalog.get(job_id)
+    if status is None or status.get('analysis_type') != 'maxdiff':
+        flash('No se encontró el análisis MaxDiff solicitado.', 'warning')
         return redirect(url_for('maxdiff.upload'))
-    except KeyError as e:
-        current_app.logger.error(f"Error procesando MaxDiff para '{filename}': Falta columna o clave esperada {e}", exc_info=True)
-        flash(f'Error en los datos de entrada para MaxDiff: Falta la columna o clave {e}. Revisa el archivo de entrada.', 'danger')
-        update_history_status(filename, 'Error - Datos inválidos (MaxDiff)')
-        # Redirigir a preview puede ser útil para reintentar si fue un error de datos
-        return redirect(url_for('maxdiff.preview'))
-    except Exception as e:
-        current_app.logger.error(f"Error inesperado procesando MaxDiff para '{filename}': {e}", exc_info=True)
-        flash('Ocurrió un error inesperado durante el procesamiento de MaxDiff. Consulta los logs del servidor.', 'danger')
+    filename = status.get('filename')
+
+    if status.get('status') == JOB_FAILED:
+        current_app.logger.error(f"Trabajo MaxDiff {job_id} para '{filename}' falló: {status.get('error')}")
+        flash(f"Ocurrió un error durante el procesamiento de MaxDiff: {status.get('error')}", 'danger')
         update_history_status(filename, 'Error - Procesamiento (MaxDiff)')
-        session.pop('uploaded_file_path', None)
-        session.pop('original_filename', None)
-        session.pop('analysis_type', None)
         return redirect(url_for('maxdiff.upload'))
+    if status.get('status') != JOB_DONE:
+        return redirect(url_for('jobs.status_page', job_id=job_id))
+
+    cache_key = status.get('cache_key')
+    results_url = url_for('maxdiff.cached_results', cache_key=cache_key) if cache_key else None
+    update_history_status(filename, 'Procesado (MaxDiff)', results_url=results_url)
+
+    # --- Limpiar sesión después de procesar ---
+    session.pop('uploaded_file_path', None)
+    session.pop('original_filename', None)
+    session.pop('analysis_type', None)
+
+    # La página de un trabajo terminado no cambia: 304 sin cargar el resultado si el navegador ya la tiene
+    not_modified = check_not_modified('maxdiff', job_id, last_modified=status.get('finished_at'))
+    if not_modified is not None:
+        return not_modified
+    loaded = load_analysis_index(job_id, 'maxdiff')
+    if loaded is None:
+        flash('Los resultados de este análisis ya no están disponibles. Vuelve a procesar el archivo.', 'warning')
+        return redirect(url_for('maxdiff.upload'))
+    return _render_results(filename, job_id, loaded[0])
+
+
+@bp.route('/results/cached/<cache_key>', endpoint='cached_results', methods=['GET'])
+def cached_results(cache_key):
+    """
+    Muestra resultados MaxDiff desde la caché, sin recalcular (enlace del historial).
+    Accesible en /maxdiff/results/cached/<cache_key>
+    """
+    loaded = load_analysis_index(cache_key, 'maxdiff')
+    if loaded is None:
+        flash('Los resultados ya no están en caché. Vuelve a procesar el archivo.', 'warning')
+        return redirect(url_for('maxdiff.upload'))
+    not_modified = check_not_modified('maxdiff', cache_key)
+    if not_modified is not None:
+        return not_modified
+    index, meta = loaded
+    return _render_results(meta.get('filename'), cache_key, index)
+
+
+def _render_results(filename: str, source_ref: str, index: dict):
+    """Plantilla de resultados MaxDiff (común a trabajos terminados y caché)."""
+    return render_streamed(
+        'maxdiff/results_maxdiff.html',
+        filename=filename,
+        source_ref=source_ref, # job_id o clave de caché, para la exportación
+        table_urls=table_urls(source_ref, index['tables']), # Tablas paginadas por la API (scroll virtual)
+        figure_urls=figure_urls(source_ref, index['charts']) # Figuras servidas por la API (/api/v1), cargadas tras el primer pintado
+    )
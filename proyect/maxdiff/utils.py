@@ -12,10 +12,15 @@ con Plotly, enfocado en insights estratégicos para pricing.
 """
 
 import logging
-from typing import Dict, Tuple, List, Any
+from typing import Dict, Tuple, List, Any, Optional
 import pandas as pd
 import numpy as np
 
+from proyect.common.metrics import StageTimer
+from proyect.common.progress import (ProgressCallback, report_progress, STAGE_READ, STAGE_VALIDATE,
+                                     STAGE_COMPUTE, STAGE_CHART, STAGE_HINTS)
+from proyect.common.utils import read_data_file
+
 logger = logging.getLogger(__name__)
 
 # --- Constantes y Configuraciones ---
@@ -26,13 +31,14 @@ COL_WORST_ATTR = 'Attribute_Worst'
 
 # --- Funciones Principales de Análisis ---
 
-def run_maxdiff_analysis(df: pd.DataFrame) -> Dict[str, Any]:
+def run_maxdiff_analysis(df: pd.DataFrame, progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
     """
     Orquesta el pipeline completo de análisis MaxDiff agregado basado en conteos.
     (Función interna detallada).
 
     Args:
         df (pd.DataFrame): DataFrame con los datos crudos de MaxDiff.
+        progress (Optional[ProgressCallback]): Callback de progreso por etapa (ver proyect.common.progress).
 
     Returns:
         Dict[str, Any]: Un diccionario conteniendo los resultados clave detallados.
@@ -43,8 +49,10 @@ def run_maxdiff_analysis(df: pd.DataFrame) -> Dict[str, Any]:
         Exception: Para cualquier otro error durante el procesamiento.
     """
     logger.info(f"Iniciando análisis MaxDiff detallado (run_maxdiff_analysis) en DataFrame con {df.shape[0]} filas.")
+    progress = StageTimer('maxdiff', progress)  # Duración por etapa (proyect.common.metrics)
     try:
         # 1. Validación de Entrada
+        report_progress(progress, STAGE_VALIDATE)
         _validate_input_df(df)
         logger.debug("Validación de DataFrame de entrada completada.")
 
@@ -53,19 +61,23 @@ def run_maxdiff_analysis(df: pd.DataFrame) -> Dict[str, Any]:
         logger.debug(f"Atributos únicos identificados: {len(attributes)}")
 
         # 3. Calcular Utilidades Agregadas (Método de Conteos)
+        report_progress(progress, STAGE_COMPUTE)
         utilities_df, raw_counts_df = _calculate_aggregated_counts_utilities(df, attributes)
         logger.info("Utilidades agregadas calculadas y escaladas.")
 
         # 4. Calcular Scores Top/Middle/Bottom (TMB) - Basado en Utilidades Agregadas
+        report_progress(progress, STAGE_COMPUTE, 0.6)
         tmb_df = _calculate_tmb_scores_from_aggregated(utilities_df)
         logger.info("Scores Top/Middle/Bottom calculados.")
 
         # 5. Preparar Datos para Gráficos Plotly
+        report_progress(progress, STAGE_CHART)
         bar_chart_json = _prepare_bar_chart_json(utilities_df)
         stacked_bar_json = _prepare_stacked_bar_json(tmb_df)
         logger.info("Datos para gráficos Plotly generados.")
 
         # 6. Generar Pistas de Interpretación (Nivel Consultor)
+        report_progress(progress, STAGE_HINTS)
         interpretation_hints = _generate_interpretation_hints(utilities_df, tmb_df)
         logger.info("Pistas de interpretación generadas.")
 
@@ -88,6 +100,8 @@ def run_maxdiff_analysis(df: pd.DataFrame) -> Dict[str, Any]:
     except Exception as e:
         logger.error(f"Error inesperado durante el análisis MaxDiff detallado: {e}", exc_info=True)
         raise
+    finally:
+        progress.finish()
 
 # --- Funciones Auxiliares de Cálculo y Preparación (Sin cambios) ---
 
@@ -175,9 +189,10 @@ def _prepare_bar_chart_json(utilities_df: pd.DataFrame) -> Dict[str, Any]:
         return {"data": [], "layout": {"title": "Utilidad Promedio de Atributos (MaxDiff) - Sin Datos"}}
 
     df_sorted = utilities_df.sort_values(by='Avg_Utility_Score', ascending=False)
+    scores = df_sorted['Avg_Utility_Score'].round(1).tolist()  # Redondeo único para barras y etiquetas
     data = [{'type': 'bar', 'x': df_sorted['Attribute'].tolist(),
-             'y': df_sorted['Avg_Utility_Score'].round(1).tolist(),
-             'text': df_sorted['Avg_Utility_Score'].round(1).tolist(),
+             'y': scores,
+             'text': scores,
              'textposition': 'auto', 'marker': {'color': '#1f77b4'},
              'name': 'Utilidad Promedio'}]
     layout = {'title': 'Importancia Relativa de Atributos (MaxDiff - Scores Promedio)',
@@ -237,7 +252,7 @@ def _generate_interpretation_hints(utilities_df: pd.DataFrame, tmb_df: pd.DataFr
 
 # --- Capa de Compatibilidad (Wrapper) ---
 
-def run_maxdiff(df: pd.DataFrame) -> Dict[str, Any]:
+def run_maxdiff(df: pd.DataFrame, progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
     """
     Wrapper para run_maxdiff_analysis que devuelve un diccionario
     compatible con las expectativas del blueprint/rutas originales.
@@ -245,6 +260,7 @@ def run_maxdiff(df: pd.DataFrame) -> Dict[str, Any]:
 
     Args:
         df (pd.DataFrame): DataFrame con los datos crudos de MaxDiff.
+        progress (Optional[ProgressCallback]): Callback de progreso por etapa.
 
     Returns:
         Dict[str, Any]: Diccionario con las llaves esperadas por las rutas:
@@ -255,7 +271,7 @@ def run_maxdiff(df: pd.DataFrame) -> Dict[str, Any]:
     """
     logger.info("Ejecutando wrapper de compatibilidad 'run_maxdiff'...")
     # 1. Llamar a la función de análisis detallada
-    full_analysis_results = run_maxdiff_analysis(df)
+    full_analysis_results = run_maxdiff_analysis(df, progress)
 
     # 2. Crear el diccionario de resultados compatible, mapeando las llaves
     compatible_results = {
@@ -271,6 +287,17 @@ def run_maxdiff(df: pd.DataFrame) -> Dict[str, Any]:
     # 3. Devolver el diccionario con las llaves esperadas
     return compatible_results
 
+# --- Punto de Entrada para Trabajos en Segundo Plano ---
+
+def process_maxdiff_file(filepath: str, progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+    """
+    Lee el archivo y ejecuta run_maxdiff. Se ejecuta en un proceso worker
+    (ver proyect.common.jobs), por eso recibe la ruta y no un DataFrame.
+    """
+    report_progress(progress, STAGE_READ)
+    df = read_data_file(filepath)
+    return run_maxdiff(df, progress)
+
 # --- Ejemplo de uso (si se ejecuta el script directamente) ---
 if __name__ == '__main__':
     print("Ejecutando módulo maxdiff_utils.py como script...")
@@ -9,11 +9,18 @@ la Línea de Valor Justo, generar una Matriz MOCA, preparar datos para
 visualización con Plotly (Price-Value Map - PVM), y ofrecer insights
 estratégicos enfocados en oportunidad y consistencia.
 
+Admite dos modos de entrada:
+- Nivel entidad: una fila por entidad (COL_ENTITY, COL_PRICE, COL_VALUE).
+- Nivel encuestado: filas encuestado x entidad (con COL_RESPONDENT). Se agregan a
+  medias, conteos y varianzas por entidad en una única pasada agrupada y
+  combinable por bloques (ver aggregate_respondent_ratings / load_moca_input).
+
 **Incluye wrapper de compatibilidad 'run_moca' para rutas existentes.**
 """
 
 import logging
-from typing import Dict, Any, Tuple, List, Optional
+from pathlib import Path
+from typing import Dict, Any, Tuple, List, Optional, Iterable, Union
 import pandas as pd
 import numpy as np
 # Usaremos sklearn para la regresión lineal (Línea de Valor Justo)
@@ -23,6 +30,11 @@ try:
 except ImportError:
     LinearRegression = None # Marcar como no disponible si falta sklearn
 
+from proyect.common.charts import build_point_traces, top_k_outlier_mask, RENDER_SVG
+from proyect.common.metrics import StageTimer
+from proyect.common.progress import (ProgressCallback, report_progress, STAGE_READ, STAGE_VALIDATE,
+                                     STAGE_COMPUTE, STAGE_CHART, STAGE_HINTS)
+
 logger = logging.getLogger(__name__)
 
 # --- Constantes y Configuraciones ---
@@ -30,10 +42,28 @@ logger = logging.getLogger(__name__)
 COL_ENTITY = 'EntityName' # Nombre genérico (Producto, Marca, Competidor)
 COL_PRICE = 'PriceMetric'
 COL_VALUE = 'ValueMetric'
+COL_RESPONDENT = 'RespondentID' # Presente solo en archivos a nivel encuestado
+
+# Columnas añadidas al agregar ratings de encuestados a nivel entidad
+COL_N_RATINGS = 'N_Ratings'
+COL_PRICE_VAR = 'PriceMetric_Var'
+COL_VALUE_VAR = 'ValueMetric_Var'
+RATING_STATS_COLUMNS = [COL_N_RATINGS, COL_PRICE_VAR, COL_VALUE_VAR]
+
+# Columnas de diagnóstico de influencia sobre la Línea de Valor Justo
+COL_LEVERAGE = 'Leverage'
+COL_COOKS_D = 'Cooks_Distance'
+COL_DFBETA_SLOPE = 'DFBETA_Slope'
+COL_INFLUENTIAL = 'Influential'
+COL_ZONE_SHIFT = 'Zone_Change_Without'
+INFLUENCE_COLUMNS = [COL_LEVERAGE, COL_COOKS_D, COL_DFBETA_SLOPE, COL_INFLUENTIAL, COL_ZONE_SHIFT]
+
+# Momentos internos por entidad (combinables entre bloques, algoritmo de Chan et al.)
+_MOMENT_COLUMNS = ['n', 'price_mean', 'price_m2', 'value_mean', 'value_m2']
 
 # --- Funciones Principales de Análisis ---
 
-def run_moca_analysis(df: pd.DataFrame) -> Dict[str, Any]:
+def run_moca_analysis(df: pd.DataFrame, progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
     """
     Orquesta el pipeline completo de análisis MOCA.
     (Función interna detallada).
@@ -41,12 +71,16 @@ def run_moca_analysis(df: pd.DataFrame) -> Dict[str, Any]:
     Args:
         df (pd.DataFrame): DataFrame con los datos crudos, conteniendo al menos
                            las columnas COL_ENTITY, COL_PRICE, COL_VALUE.
+                           Si contiene COL_RESPONDENT se trata como datos a nivel
+                           encuestado y se agrega primero a nivel entidad.
+        progress (Optional[ProgressCallback]): Callback de progreso por etapa (ver proyect.common.progress).
 
     Returns:
         Dict[str, Any]: Un diccionario conteniendo los resultados clave detallados:
             - 'moca_matrix' (pd.DataFrame): Matriz MOCA con clasificación estratégica.
                                           Columnas: [COL_ENTITY, COL_PRICE, COL_VALUE,
-                                                   'Value_Deviation', 'MOCA_Zone']
+                                                   'Value_Deviation', 'MOCA_Zone'] +
+                                          INFLUENCE_COLUMNS (diagnósticos leave-one-out).
             - 'pvm_json' (Dict): Datos JSON para gráfico de dispersión Plotly (Price-Value Map).
             - 'fair_value_line_params' (Dict): Parámetros de la línea de valor justo.
             - 'avg_metrics' (Dict): Métricas promedio (precio, valor).
@@ -63,12 +97,20 @@ def run_moca_analysis(df: pd.DataFrame) -> Dict[str, Any]:
          raise RuntimeError(msg)
 
     logger.info(f"Iniciando análisis MOCA detallado (run_moca_analysis) en DataFrame con {df.shape[0]} filas.")
+    progress = StageTimer('moca', progress)  # Duración por etapa (proyect.common.metrics)
     try:
+        # 0. Datos a nivel encuestado -> agregación a nivel entidad
+        if COL_RESPONDENT in df.columns:
+            logger.info(f"MOCA: Columna '{COL_RESPONDENT}' detectada. Agregando ratings de encuestados a nivel entidad.")
+            df = aggregate_respondent_ratings([df])
+
         # 1. Validación y Preparación de Entrada
+        report_progress(progress, STAGE_VALIDATE)
         validated_df = _validate_and_prepare_moca_df(df)
         logger.debug("Validación y preparación de DataFrame de entrada MOCA completada.")
 
         # 2. Calcular Línea de Valor Justo y Métricas Promedio
+        report_progress(progress, STAGE_COMPUTE)
         fair_value_params, avg_metrics = _calculate_fair_value_line(validated_df)
         logger.info(f"Línea de Valor Justo MOCA calculada: Pendiente={fair_value_params['slope']:.2f}, Intercepto={fair_value_params['intercept']:.2f}")
         logger.info(f"Métricas promedio MOCA: Precio={avg_metrics['avg_price']:.2f}, Valor={avg_metrics['avg_value']:.2f}")
@@ -77,11 +119,19 @@ def run_moca_analysis(df: pd.DataFrame) -> Dict[str, Any]:
         moca_matrix_df = _calculate_moca_zones(validated_df, fair_value_params, avg_metrics)
         logger.info("Clasificación en zonas MOCA completada.")
 
+        # 3.1 Diagnósticos de influencia leave-one-out (forma cerrada, sin reajustes)
+        report_progress(progress, STAGE_COMPUTE, 0.5)
+        moca_matrix_df = _calculate_influence_diagnostics(moca_matrix_df, fair_value_params)
+        n_influential = int(moca_matrix_df[COL_INFLUENTIAL].sum())
+        logger.info(f"Diagnósticos de influencia MOCA calculados: {n_influential} entidad(es) influyente(s).")
+
         # 4. Preparar Datos para Gráfico de Dispersión Plotly (Price-Value Map - PVM)
+        report_progress(progress, STAGE_CHART)
         pvm_json = _prepare_pvm_chart_json(moca_matrix_df, fair_value_params, avg_metrics)
         logger.info("Datos para Price-Value Map (PVM) generados.")
 
         # 5. Generar Pistas de Interpretación Estratégica MOCA
+        report_progress(progress, STAGE_HINTS)
         insights = _generate_moca_interpretation_hints(moca_matrix_df, avg_metrics)
         logger.info("Pistas de interpretación estratégica MOCA generadas.")
 
@@ -102,6 +152,115 @@ def run_moca_analysis(df: pd.DataFrame) -> Dict[str, Any]:
     except Exception as e:
         logger.error(f"Error inesperado durante el análisis MOCA detallado: {e}", exc_info=True)
         raise
+    finally:
+        progress.finish()
+
+# --- Agregación de Ratings a Nivel Encuestado ---
+
+def aggregate_respondent_ratings(chunks: Iterable[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Agrega ratings encuestado x entidad a nivel entidad en una única pasada.
+
+    Cada bloque se reduce a momentos por entidad (n, media, M2) y se combina con
+    el acumulado mediante la fórmula paralela de Chan et al., por lo que la memoria
+    depende del número de entidades y no del número de filas.
+
+    Args:
+        chunks (Iterable[pd.DataFrame]): Bloques con COL_ENTITY, COL_PRICE y COL_VALUE
+                                         (p.ej. iter_data_file_chunks o [df]).
+
+    Returns:
+        pd.DataFrame: Una fila por entidad con COL_ENTITY, COL_PRICE y COL_VALUE (medias),
+                      COL_N_RATINGS, COL_PRICE_VAR y COL_VALUE_VAR (varianza muestral,
+                      NaN con un único rating).
+
+    Raises:
+        ValueError: Si faltan columnas requeridas o no hay ratings válidos.
+    """
+    moments = None
+    total_rows = 0
+    for chunk in chunks:
+        total_rows += len(chunk)
+        chunk_moments = _respondent_chunk_moments(chunk)
+        moments = chunk_moments if moments is None else _merge_rating_moments(moments, chunk_moments)
+
+    if moments is None or moments.empty:
+        raise ValueError("No se encontraron ratings válidos de encuestados para MOCA.")
+
+    n = moments['n']
+    dof = (n - 1).where(n > 1)
+    entity_df = pd.DataFrame({
+        COL_ENTITY: moments.index,
+        COL_PRICE: moments['price_mean'].to_numpy(),
+        COL_VALUE: moments['value_mean'].to_numpy(),
+        COL_N_RATINGS: n.astype('int64').to_numpy(),
+        COL_PRICE_VAR: (moments['price_m2'] / dof).to_numpy(),
+        COL_VALUE_VAR: (moments['value_m2'] / dof).to_numpy(),
+    })
+    logger.info(f"MOCA: {total_rows} filas de encuestados agregadas a {len(entity_df)} entidades.")
+    return entity_df
+
+def load_moca_input(filepath: Union[str, Path], chunksize: Optional[int] = None) -> pd.DataFrame:
+    """
+    Carga la entrada MOCA desde archivo eligiendo el modo según sus columnas.
+
+    Archivos a nivel encuestado (con COL_RESPONDENT) se agregan por streaming sin
+    materializar todas las filas; los archivos a nivel entidad se leen completos.
+    """
+    from proyect.common.utils import iter_data_file_chunks, DEFAULT_CHUNK_ROWS
+
+    chunk_iter = iter_data_file_chunks(filepath, chunksize or DEFAULT_CHUNK_ROWS)
+    first_chunk = next(chunk_iter, None)
+    if first_chunk is None:
+        raise ValueError("El archivo está vacío o no contiene datos legibles después de la limpieza inicial.")
+
+    if COL_RESPONDENT in first_chunk.columns:
+        logger.info(f"MOCA: Archivo a nivel encuestado detectado ('{COL_RESPONDENT}'). Agregando por bloques.")
+        return aggregate_respondent_ratings(_chain_chunks(first_chunk, chunk_iter))
+    return pd.concat(list(_chain_chunks(first_chunk, chunk_iter)), ignore_index=True)
+
+def _chain_chunks(first_chunk: pd.DataFrame, rest: Iterable[pd.DataFrame]) -> Iterable[pd.DataFrame]:
+    """Reinyecta el bloque ya leído (para detectar el modo) delante del resto."""
+    yield first_chunk
+    yield from rest
+
+def _respondent_chunk_moments(chunk: pd.DataFrame) -> pd.DataFrame:
+    """Reduce un bloque de ratings a momentos por entidad (n, media y M2 de precio y valor)."""
+    required_columns = [COL_ENTITY, COL_PRICE, COL_VALUE]
+    missing_cols = [col for col in required_columns if col not in chunk.columns]
+    if missing_cols:
+        raise ValueError(f"Faltan columnas requeridas para MOCA (nivel encuestado): {', '.join(missing_cols)}")
+
+    ratings = pd.DataFrame({
+        COL_ENTITY: chunk[COL_ENTITY].astype(str).str.strip(),
+        COL_PRICE: pd.to_numeric(chunk[COL_PRICE], errors='coerce'),
+        COL_VALUE: pd.to_numeric(chunk[COL_VALUE], errors='coerce'),
+    })
+    valid_mask = ratings[COL_PRICE].notna() & ratings[COL_VALUE].notna() & chunk[COL_ENTITY].notna() & (ratings[COL_ENTITY] != '')
+    ratings = ratings[valid_mask]
+    if ratings.empty:
+        return pd.DataFrame(columns=_MOMENT_COLUMNS, dtype='float64')
+
+    grouped = ratings.groupby(COL_ENTITY, sort=False)
+    stats = grouped.agg(n=(COL_PRICE, 'size'),
+                        price_mean=(COL_PRICE, 'mean'), price_var=(COL_PRICE, 'var'),
+                        value_mean=(COL_VALUE, 'mean'), value_var=(COL_VALUE, 'var'))
+    # var(ddof=1) * (n - 1) = M2; con n == 1 la varianza es NaN y M2 = 0
+    stats['price_m2'] = (stats['price_var'] * (stats['n'] - 1)).fillna(0.0)
+    stats['value_m2'] = (stats['value_var'] * (stats['n'] - 1)).fillna(0.0)
+    return stats[_MOMENT_COLUMNS].astype('float64')
+
+def _merge_rating_moments(left: pd.DataFrame, right: pd.DataFrame) -> pd.DataFrame:
+    """Combina dos conjuntos de momentos por entidad (fórmula paralela de Chan et al.)."""
+    left, right = left.align(right, join='outer', fill_value=0.0)
+    n = left['n'] + right['n']
+    merged = pd.DataFrame({'n': n}, index=n.index)
+    for metric in ('price', 'value'):
+        mean_l, mean_r = left[f'{metric}_mean'], right[f'{metric}_mean']
+        delta = mean_r - mean_l
+        merged[f'{metric}_mean'] = mean_l + delta * right['n'] / n
+        merged[f'{metric}_m2'] = left[f'{metric}_m2'] + right[f'{metric}_m2'] + delta ** 2 * left['n'] * right['n'] / n
+    return merged[_MOMENT_COLUMNS]
 
 # --- Funciones Auxiliares de Cálculo y Preparación (Adaptadas de ComStrat) ---
 
@@ -112,7 +271,9 @@ def _validate_and_prepare_moca_df(df: pd.DataFrame) -> pd.DataFrame:
     if missing_cols:
         raise ValueError(f"Faltan columnas requeridas para MOCA: {', '.join(missing_cols)}")
 
-    df_copy = df[required_columns].copy()
+    # Estadísticos de agregación (modo encuestado) se conservan si existen
+    stats_columns = [col for col in RATING_STATS_COLUMNS if col in df.columns]
+    df_copy = df[required_columns + stats_columns].copy()
     df_copy[COL_PRICE] = pd.to_numeric(df_copy[COL_PRICE], errors='coerce')
     df_copy[COL_VALUE] = pd.to_numeric(df_copy[COL_VALUE], errors='coerce')
 
@@ -165,10 +326,124 @@ def _calculate_moca_zones(df: pd.DataFrame, fv_params: Dict[str, float], avg_met
 
     df_copy['MOCA_Zone'] = np.select(conditions, zone_names, default='Indeterminado')
 
-    moca_result_df = df_copy[[COL_ENTITY, COL_PRICE, COL_VALUE, 'Value_Deviation', 'MOCA_Zone']]
+    stats_columns = [col for col in RATING_STATS_COLUMNS if col in df_copy.columns]
+    moca_result_df = df_copy[[COL_ENTITY, COL_PRICE, COL_VALUE, 'Value_Deviation', 'MOCA_Zone'] + stats_columns]
     moca_result_df = moca_result_df.sort_values(by=['MOCA_Zone', 'Value_Deviation'], ascending=[True, False]).reset_index(drop=True)
     return moca_result_df
 
+def _calculate_influence_diagnostics(moca_df: pd.DataFrame, fv_params: Dict[str, float]) -> pd.DataFrame:
+    """
+    Añade diagnósticos leave-one-out de la Línea de Valor Justo sin reajustar n veces.
+
+    Con un único regresor, la diagonal de la matriz sombrero es
+    h_i = 1/n + (x_i - x̄)² / Sxx, y a partir de ella y del residuo e_i:
+    - Cook's D_i = e_i² h_i / (p s² (1 - h_i)²), con p = 2 y s² = SSE / (n - 2).
+    - DFBETA (pendiente) = β1 - β1(-i) = (x_i - x̄) e_i / (Sxx (1 - h_i)).
+    - Zone_Change_Without: si al excluir la entidad cambiaría la zona MOCA de
+      alguna otra entidad (por el desplazamiento de la línea o del precio medio).
+
+    La zona de la propia entidad no puede cambiar: su residuo eliminado
+    e_i / (1 - h_i) conserva el signo y x_i queda del mismo lado del precio medio.
+    """
+    result_df = moca_df.copy()
+    x = result_df[COL_PRICE].to_numpy(dtype='float64')
+    e = result_df['Value_Deviation'].to_numpy(dtype='float64')
+    n = len(x)
+    x_mean = x.mean()
+    x_centered = x - x_mean
+    sxx = float(np.dot(x_centered, x_centered))
+
+    if n < 3 or sxx == 0:
+        logger.warning("MOCA: Diagnósticos de influencia no calculables (n < 3 o precio constante).")
+        result_df[COL_LEVERAGE] = np.nan
+        result_df[COL_COOKS_D] = np.nan
+        result_df[COL_DFBETA_SLOPE] = np.nan
+        result_df[COL_INFLUENTIAL] = False
+        result_df[COL_ZONE_SHIFT] = False
+        return result_df
+
+    leverage = 1.0 / n + x_centered ** 2 / sxx
+    one_minus_h = 1.0 - leverage
+    s2 = float(np.dot(e, e)) / (n - 2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cooks_d = np.where(s2 > 0, e ** 2 * leverage / (2 * s2 * one_minus_h ** 2), 0.0)
+    deleted_resid = e / one_minus_h
+    dfbeta_slope = x_centered * deleted_resid / sxx
+    dfbeta_intercept = (1.0 / n - x_mean * x_centered / sxx) * deleted_resid
+
+    result_df[COL_LEVERAGE] = leverage
+    result_df[COL_COOKS_D] = cooks_d
+    result_df[COL_DFBETA_SLOPE] = dfbeta_slope
+    result_df[COL_INFLUENTIAL] = cooks_d > 4.0 / n # Umbral convencional 4/n
+    result_df[COL_ZONE_SHIFT] = _zone_shift_without_each(x, e, dfbeta_intercept, dfbeta_slope)
+    return result_df
+
+def _zone_shift_without_each(x: np.ndarray, e: np.ndarray, d_intercept: np.ndarray, d_slope: np.ndarray) -> np.ndarray:
+    """
+    Para cada i, indica si excluirla cambia la zona de alguna otra entidad j.
+
+    Sin i, la desviación de j pasa a e_j + a_i + b_i x_j (a_i, b_i = DFBETAs).
+    Basta con comparar el mínimo entre las desviaciones positivas y el máximo
+    entre las no positivas: min_j (e_j + b x_j) es la función soporte de los
+    puntos (x_j, e_j), que se evalúa sobre su envolvente convexa con búsqueda
+    binaria. El total es O(n log n) en lugar de los O(n²) de reajustar n veces.
+    El término j = i nunca cambia de signo, así que no hace falta excluirlo.
+    """
+    n = len(x)
+    flips = np.zeros(n, dtype=bool)
+
+    positive = e > 0
+    if positive.any():
+        lower_min = _support_function(x[positive], e[positive], d_slope, lower=True)
+        flips |= lower_min + d_intercept <= 0
+    if (~positive).any():
+        upper_max = _support_function(x[~positive], e[~positive], d_slope, lower=False)
+        flips |= upper_max + d_intercept > 0
+
+    # Cambio de lado respecto al precio medio: avg(-i) = (n x̄ - x_i) / (n - 1)
+    x_mean = x.mean()
+    avg_without = (n * x_mean - x) / (n - 1)
+    x_sorted = np.sort(x)
+    lo = np.minimum(avg_without, x_mean)
+    hi = np.maximum(avg_without, x_mean)
+    crossing = np.searchsorted(x_sorted, hi, side='left') - np.searchsorted(x_sorted, lo, side='left')
+    flips |= crossing > 0
+    return flips
+
+def _support_function(px: np.ndarray, py: np.ndarray, slopes: np.ndarray, lower: bool) -> np.ndarray:
+    """Evalúa min_j (py_j + b px_j) (lower=True) o max_j (lower=False) para cada b de `slopes`."""
+    sign = 1.0 if lower else -1.0
+    hull_x, hull_y = _lower_hull(px, sign * py)
+    if len(hull_x) == 1:
+        values = hull_y[0] + slopes * hull_x[0]
+    else:
+        # Pendientes crecientes de la envolvente inferior: el mínimo para b está en
+        # el primer vértice cuya arista siguiente tiene pendiente >= -b.
+        edge_slopes = np.diff(hull_y) / np.diff(hull_x)
+        idx = np.searchsorted(edge_slopes, -sign * slopes, side='left')
+        values = hull_y[idx] + sign * slopes * hull_x[idx]
+    return sign * values
+
+def _lower_hull(px: np.ndarray, py: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Envolvente convexa inferior (monotone chain) ordenada por x."""
+    order = np.lexsort((py, px))
+    xs, ys = px[order], py[order]
+    # Para x repetidas solo interesa el punto más bajo
+    keep = np.ones(len(xs), dtype=bool)
+    keep[1:] = xs[1:] != xs[:-1]
+    xs, ys = xs[keep], ys[keep]
+
+    hull: List[int] = []
+    for k in range(len(xs)):
+        while len(hull) >= 2:
+            i, j = hull[-2], hull[-1]
+            cross = (xs[j] - xs[i]) * (ys[k] - ys[i]) - (ys[j] - ys[i]) * (xs[k] - xs[i])
+            if cross > 0:
+                break
+            hull.pop()
+        hull.append(k)
+    return xs[hull], ys[hull]
+
 def _prepare_pvm_chart_json(moca_df: pd.DataFrame, fv_params: Dict[str, float], avg_metrics: Dict[str, float]) -> Dict[str, Any]:
     """Prepara datos para un gráfico de dispersión Plotly (Price-Value Map - PVM)."""
     # Prácticamente idéntico a ComStrat, solo cambia el título y quizás colores/nombres leyenda
@@ -185,15 +460,27 @@ def _prepare_pvm_chart_json(moca_df: pd.DataFrame, fv_params: Dict[str, float],
         'Indeterminado': '#7f7f7f'               # Gris
     }
 
-    for zone, color in zone_colors.items():
-        zone_df = moca_df[moca_df['MOCA_Zone'] == zone]
-        if not zone_df.empty:
-             traces.append({
-                 'type': 'scatter', 'mode': 'markers+text',
-                 'x': zone_df[COL_PRICE].tolist(), 'y': zone_df[COL_VALUE].tolist(),
-                 'text': zone_df[COL_ENTITY].tolist(), 'textposition': 'top right',
-                 'marker': {'color': color, 'size': 10}, 'name': zone
-             })
+    # Trazas de puntos: SVG etiquetado, WebGL o densidad según el número de entidades
+    point_traces, render_mode = build_point_traces(
+        moca_df[COL_PRICE], moca_df[COL_VALUE], moca_df[COL_ENTITY],
+        moca_df['Value_Deviation'], moca_df['MOCA_Zone'], zone_colors
+    )
+    traces.extend(point_traces)
+
+    # Entidades influyentes sobre la Línea de Valor Justo (Cook's D > 4/n)
+    if COL_INFLUENTIAL in moca_df.columns and moca_df[COL_INFLUENTIAL].any():
+        influential_df = moca_df[moca_df[COL_INFLUENTIAL]]
+        if render_mode != RENDER_SVG:
+            # En mapas grandes solo se resaltan las más influyentes para acotar el payload
+            influential_df = influential_df[top_k_outlier_mask(influential_df[COL_COOKS_D].to_numpy())]
+        traces.append({
+            'type': 'scatter' if render_mode == RENDER_SVG else 'scattergl', 'mode': 'markers',
+            'x': influential_df[COL_PRICE].tolist(), 'y': influential_df[COL_VALUE].tolist(),
+            'text': [f"{name}<br>Cook's D: {d:.2f}" for name, d in zip(influential_df[COL_ENTITY], influential_df[COL_COOKS_D])],
+            'hoverinfo': 'text',
+            'marker': {'symbol': 'circle-open', 'size': 18, 'color': '#000000', 'line': {'width': 2}},
+            'name': 'Influyente en Línea Valor Justo'
+        })
 
     # Línea de Valor Justo (igual)
     min_price=moca_df[COL_PRICE].min()*0.9; max_price=moca_df[COL_PRICE].max()*1.1
@@ -215,6 +502,7 @@ def _prepare_pvm_chart_json(moca_df: pd.DataFrame, fv_params: Dict[str, float],
         'yaxis': {'title': f'{COL_VALUE}'},
         'hovermode': 'closest', 'showlegend': True,
         'legend': {'title': 'Zona Estratégica MOCA'},
+        'meta': {'render_mode': render_mode, 'n_points': len(moca_df)},
         'annotations': [
             {'x':avg_price,'y':y_range[0],'xref':'x','yref':'y','text':'Avg Price','showarrow':False,'yanchor':'bottom'},
             {'x':x_range[0],'y':avg_value,'xref':'x','yref':'y','text':'Avg Value','showarrow':False,'xanchor':'left'}
@@ -261,11 +549,18 @@ def _generate_moca_interpretation_hints(moca_df: pd.DataFrame, avg_metrics: Dict
     hints['fair_value_line'] = (
         f"La Línea de Valor Justo en el PVM representa la relación 'normal' Precio-Valor. Desviarse positivamente (arriba) es favorable; negativamente (abajo) indica inconsistencia o posicionamiento económico."
     )
+    if COL_INFLUENTIAL in moca_df.columns and moca_df[COL_INFLUENTIAL].any():
+        influential = moca_df[moca_df[COL_INFLUENTIAL]].sort_values(COL_COOKS_D, ascending=False)
+        shifting = influential[influential[COL_ZONE_SHIFT]][COL_ENTITY].tolist()
+        hints['influence'] = (
+            f"**Influencia:** {', '.join(influential[COL_ENTITY].astype(str))} condicionan la Línea de Valor Justo (Cook's D > 4/n). "
+            + (f"Sin {', '.join(map(str, shifting))} cambiaría la zona de otras entidades." if shifting else "Ninguna altera por sí sola la zona de otras entidades.")
+        )
     return hints
 
 # --- Capa de Compatibilidad (Wrapper) ---
 
-def run_moca(df: pd.DataFrame) -> Dict[str, Any]:
+def run_moca(df: pd.DataFrame, progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
     """
     Wrapper de compatibilidad para el blueprint de MOCA.
     Llama a run_moca_analysis y devuelve solo lo que la ruta necesita:
@@ -274,6 +569,7 @@ def run_moca(df: pd.DataFrame) -> Dict[str, Any]:
 
     Args:
         df (pd.DataFrame): DataFrame de entrada para MOCA.
+        progress (Optional[ProgressCallback]): Callback de progreso por etapa.
 
     Returns:
         Dict[str, Any]: Diccionario con llaves 'moca_matrix' y 'pvm_json'.
@@ -286,7 +582,7 @@ def run_moca(df: pd.DataFrame) -> Dict[str, Any]:
     """
     logger.info("Ejecutando wrapper 'run_moca' para compatibilidad con el blueprint MOCA...")
     # 1. Llamar a la función de análisis detallada
-    full_analysis_results = run_moca_analysis(df)
+    full_analysis_results = run_moca_analysis(df, progress)
 
     # 2. Validar y extraer las llaves requeridas por el blueprint
     if 'moca_matrix' not in full_analysis_results or 'pvm_json' not in full_analysis_results:
@@ -304,6 +600,17 @@ def run_moca(df: pd.DataFrame) -> Dict[str, Any]:
     logger.info("Resultados MOCA mapeados a formato compatible para las rutas.")
     return compatible_results
 
+# --- Punto de Entrada para Trabajos en Segundo Plano ---
+
+def process_moca_file(filepath: str, progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+    """
+    Carga el archivo (agregando por streaming si es a nivel encuestado) y ejecuta
+    run_moca. Se ejecuta en un proceso worker (ver proyect.common.jobs).
+    """
+    report_progress(progress, STAGE_READ)
+    df = load_moca_input(filepath)
+    return run_moca(df, progress)
+
 
 # --- Ejemplo de uso (si se ejecuta el script directamente) ---
 if __name__ == '__main__':
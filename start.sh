@@ -84,6 +84,10 @@ python -m pip install --upgrade pip --quiet # Usar --quiet para menos verbosidad
 python -m pip install -r "${REQUIREMENTS_FILE}" --quiet # Usar --quiet
 info "Dependencias instaladas/actualizadas."
 
+# 3b. Construir Recursos Estáticos (Bootstrap, Plotly... con huella en static/dist)
+info "Construyendo recursos estáticos..."
+python -m proyect.common.assets || die "No se pudieron construir los recursos estáticos (¿faltan los archivos de assets/vendor/? ver ASSET_BUNDLES en proyect/common/assets.py)."
+
 # 4. Configurar Variables de Entorno para Flask
 info "Configurando variables de entorno de Flask..."
 export FLASK_APP="${FLASK_APP_FILE}"
@@ -0,0 +1,43 @@
+# pricing_dashboard/tests/test_export.py
+# -*- coding: utf-8 -*-
+"""Exportación de resultados (proyect.common.export) con gráficos que contienen arrays numpy."""
+
+import io
+import json
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from proyect.common.export import iter_export
+
+
+def _results_with_ndarray_figure():
+    return {
+        'summary_df': pd.DataFrame({'item': ['a', 'b', 'c'], 'score': [0.5, 0.3, 0.2]}),
+        'scores_chart': {
+            'data': [{'type': 'bar', 'x': np.array(['a', 'b', 'c']), 'y': np.array([0.5, 0.3, 0.2])}],
+            'layout': {'height': np.int64(400)},
+        },
+        'insights': {'top_item': np.str_('a'), 'share': np.float64(0.5)},
+    }
+
+
+def test_json_export_serializes_ndarray_in_figures():
+    document = json.loads(b''.join(iter_export(_results_with_ndarray_figure(), 'json')))
+
+    trace = document['charts']['scores_chart']['data'][0]
+    assert trace['x'] == ['a', 'b', 'c']
+    assert trace['y'] == [0.5, 0.3, 0.2]
+    assert document['charts']['scores_chart']['layout']['height'] == 400
+    assert document['insights']['insights'] == {'top_item': 'a', 'share': 0.5}
+    assert len(document['tables']['summary']) == 3
+
+
+def test_zip_export_serializes_ndarray_in_figures():
+    data = b''.join(iter_export(_results_with_ndarray_figure(), 'zip'))
+
+    with zipfile.ZipFile(io.BytesIO(data)) as bundle:
+        figure = json.loads(bundle.read('charts/scores_chart.json'))
+        assert figure['data'][0]['y'] == [0.5, 0.3, 0.2]
+        assert 'tables/summary.csv' in bundle.namelist()